@@ -1,19 +1,244 @@
+import json
 import logging
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
 
-from flask import Blueprint, request
+import numpy as np
+from flask import Blueprint, Response, current_app, request
 from flask_restful import Api, Resource, abort
+from flask_restful.representations.json import output_json
+from geoalchemy2.shape import to_shape
+from shapely.geometry import Point, shape
 
-from gis_polygon.extensions import db
-from gis_polygon.models import GisPolygon
-from gis_polygon.schemas.polygon import PolygonSchema
+from gis_polygon.conditional import check_version, not_modified_response, version_headers, with_headers
+from gis_polygon.extensions import db, polygon_locator, response_cache, tile_cache
+from gis_polygon.metrics import record_rows, timed
+from gis_polygon.models import CHANGE_DELETED, CHANGE_EDITED, GisPolygon, GisPolygonDeleted
+from gis_polygon.pagination import (
+    decode_change_cursor, decode_cursor, decode_sort_cursor, encode_change_cursor, encode_cursor, encode_sort_cursor
+)
+from gis_polygon.projections import get_transformer
+from gis_polygon.raw_json import dump_raw_polygon, embed_raw, raw_polygon_response, raw_polygons_response
+from gis_polygon.schemas.polygon import (
+    PolygonSchema, get_precision, get_projection, get_projection_names, get_projection_srid
+)
+from gis_polygon.streaming import (
+    GEOJSON_MIMETYPE, RECORD_SEPARATOR, STREAM_MIMETYPES, from_feature, stream_polygons
+)
+from gis_polygon.tiles import MVT_MIMETYPE, geom_bounds, is_valid_tile, pixel_size, tile_bounds
 
 polygon_blueprint = Blueprint('api', __name__, url_prefix='/api')
 api = Api(polygon_blueprint)
 logger = logging.getLogger(__name__)
 
+# колонки, по которым возможна сортировка ?sort=, с "-" - по убыванию
+SORT_ATTRIBUTES = ('id', 'area', 'vertex_count')
+# префикс фильтров по свойствам: ?props.region=north
+PROPS_PREFIX = 'props.'
+# поля, которые можно изменить частично (PATCH)
+PATCH_FIELDS = ('name', 'class_id', 'props', 'geom')
+# поля, которые попадают в тайлы: при их изменении тайлы сбрасываются
+TILE_FIELDS = frozenset(('name', 'class_id', 'geom'))
 
-class PolygonResource(Resource):
+
+@api.representation('application/json')
+def output_timed_json(data, code, headers=None):
+    with timed('encode'):
+        return output_json(data, code, headers)
+
+
+def polygon_cache_key(polygon_id: int, projection=None) -> str:
+    return 'polygon:{0}:{1}'.format(polygon_id, (projection or '').lower())
+
+
+def evict_polygon(polygon_id: int):
+    """
+    Удаляет из кеша ответы с полигоном во всех проекциях.
+    """
+    response_cache.delete(*[
+        polygon_cache_key(polygon_id, projection) for projection in [None] + get_projection_names()
+    ])
+
+
+def invalidate_tiles(*bounds):
+    """
+    Удаляет из кеша тайлы, которые задевают bbox изменённых полигонов (каждый bbox - только свои тайлы).
+    """
+    tile_cache.invalidate(*[bbox for bbox in bounds if bbox is not None])
+
+
+def load_polygon_changes(data) -> tuple:
+    """
+    Проверяет частичное изменение полигона и возвращает (значения колонок, ошибки).
+
+    Проверяются только переданные поля из PATCH_FIELDS: без "geom" геометрия не разбирается.
+    """
+    if not isinstance(data, dict):
+        return None, {'_schema': ['Invalid input type.']}
+    present_fields = tuple(field for field in PATCH_FIELDS if field in data)
+    if not present_fields:
+        return None, {'_schema': ['No fields to update.']}
+
+    # без polygon_id схема не ищет полигон в базе и создаёт несвязанный с сессией объект
+    polygon_validation = PolygonSchema(only=present_fields).load(data, partial=True)
+    if polygon_validation.errors:
+        return None, polygon_validation.errors
+
+    values = {field: getattr(polygon_validation.data, field) for field in present_fields}
+    values['_edited'] = datetime.now()
+    return values, {}
+
+
+def changed_tile_bounds(old_bounds: dict, changes: dict) -> list:
+    """
+    Возвращает bbox до и после изменения полигонов, у которых изменились поля из TILE_FIELDS.
+
+    old_bounds - {id: bbox до изменения}, changes - {id: значения колонок}.
+    """
+    return [
+        bbox
+        for polygon_id, values in changes.items() if TILE_FIELDS.intersection(values)
+        for bbox in (old_bounds.get(polygon_id), geom_bounds(values.get('geom')))
+    ]
+
+
+def last_modified():
+    """
+    Возвращает время последнего изменения или удаления полигонов (None для пустой таблицы).
+
+    Берётся по индексам _edited и _deleted, без обхода выборки.
+    """
+    return max((value for value in locator_version() if value is not None), default=None)
+
+
+def locator_version() -> tuple:
+    """
+    Версия данных для индекса PolygonLocator: время последнего изменения и последнего удаления.
+    """
+    return GisPolygon.query.last_edited(), GisPolygonDeleted.query.last_deleted()
+
+
+def locator_polygons():
+    """
+    Возвращает итератор пар (id, shapely-геометрия) всех полигонов для индекса PolygonLocator.
+    """
+    return _polygon_shapes(GisPolygon.query.only_fields('geom'))
+
+
+def locator_changes(version) -> tuple:
+    """
+    Возвращает изменения после версии снимка индекса PolygonLocator: итератор пар (id, shapely-геометрия)
+    изменённых полигонов и id удалённых.
+    """
+    edited, deleted = version
+    # курсор (время, CHANGE_EDITED, 0) стоит перед всеми изменениями и удалениями с этим временем
+    polygons = GisPolygon.query.only_fields('geom').changed_after((edited, CHANGE_EDITED, 0) if edited else None)
+    deleted = GisPolygonDeleted.query.changed_after((deleted, CHANGE_EDITED, 0) if deleted else None)
+    return _polygon_shapes(polygons), [polygon.polygon_id for polygon in deleted.all()]
+
+
+def _polygon_shapes(query):
+    for polygon in query.stream(current_app.config['STREAM_BATCH_SIZE']):
+        if polygon.geom is not None:
+            yield polygon.id, to_shape(polygon.geom)
+
+
+class PolygonArgsMixin:
+    """
+    Разбор общих аргументов чтения полигонов: ?projection=, ?fields=, ?precision=, ?tolerance=, ?zoom=, ?limit=.
+    """
+
+    def _raw_geometry(self) -> bool:
+        """
+        Геометрия сериализуется базой данных (ST_AsGeoJSON) и вставляется в ответ как есть.
+
+        Не используется, если геометрия не запрошена в ?fields=.
+        """
+        fields = self._get_fields(request.args)
+        return current_app.config['GEOJSON_FROM_DB'] and (fields is None or 'geom' in fields)
+
+    def _get_query_and_schema(self, args, query, load_attributes=()):
+        """
+        Возвращает запрос полигонов с загрузкой геометрии в нужном виде и схему для их сериализации.
+
+        При ?fields= из базы читаются только запрошенные колонки и load_attributes.
+        """
+        fields = self._get_fields(args)
+        precision = get_precision(args)
+        if fields is not None:
+            schema = PolygonSchema(only=fields)
+            attributes = [schema.fields[field].attribute or field for field in fields]
+            query = query.only_fields(*attributes, *load_attributes)
+            if 'geom' not in fields:
+                return query, schema
+
+        srid = get_projection_srid(args)
+        geom_column = self._get_geom_column(args)
+        if self._raw_geometry():
+            query = query.as_geojson(srid, precision, geom_column)
+            return query, PolygonSchema(only=fields, exclude=('geom',))
+        return query.projected(srid, geom_column), PolygonSchema(only=fields)
+
+    def _get_fields(self, args):
+        """
+        Возвращает поля полигона из ?fields=name,class_id или None, если нужны все поля.
+        """
+        if 'fields' not in args:
+            return None
+
+        fields = tuple(field.strip() for field in args.get('fields').split(',') if field.strip())
+        if not fields or not set(fields) <= set(PolygonSchema.Meta.fields):
+            abort(400, error='incorrect fields')
+        return fields
+
+    def _get_geom_column(self, args):
+        """
+        Возвращает колонку геометрии с упрощением по ?tolerance= (в градусах) или ?zoom=.
+        """
+        if 'tolerance' in args:
+            try:
+                tolerance = float(args.get('tolerance'))
+            except ValueError:
+                abort(400, error='incorrect tolerance')
+                return
+            if not tolerance >= 0:
+                abort(400, error='incorrect tolerance')
+        elif 'zoom' in args:
+            try:
+                zoom = int(args.get('zoom'))
+            except ValueError:
+                abort(400, error='incorrect zoom')
+                return
+            if not 0 <= zoom <= current_app.config['TILE_MAX_ZOOM']:
+                abort(400, error='incorrect zoom')
+            tolerance = pixel_size(zoom)
+        else:
+            return None
+
+        return GisPolygon.simplified_column(tolerance)
+
+    def _get_limit(self, args) -> int:
+        """
+        Возвращает размер страницы из аргументов.
+        """
+        try:
+            limit = int(args.get('limit', current_app.config['PAGE_SIZE']))
+        except ValueError:
+            abort(400, error='incorrect limit')
+            return
+
+        if not 0 < limit <= current_app.config['MAX_PAGE_SIZE']:
+            abort(400, error='incorrect limit')
+        return limit
+
+    def _get_class_id(self, args) -> int:
+        try:
+            return int(args.get('class_id'))
+        except ValueError:
+            abort(400, error='incorrect class_id')
+
+
+class PolygonResource(PolygonArgsMixin, Resource):
 
     def get(self, polygon_id=None):
         if polygon_id:
@@ -40,12 +265,55 @@ class PolygonResource(Resource):
                     "polygon_id": 4,
                     "class_id": null
                 }
+
+        Поддерживает ?fields=, ?precision=, ?tolerance= и ?zoom= как список полигонов.
         """
 
-        polygon = GisPolygon.query.get_or_404(polygon_id)
+        query, schema = self._get_query_and_schema(request.args, GisPolygon.query)
+
+        if response_cache.enabled and set(request.args) <= {'projection'}:
+            cached = response_cache.get_or_load(
+                polygon_cache_key(polygon_id, get_projection(request.args)),
+                lambda: self._load_polygon(polygon_id, query, schema)
+            )
+            record_rows(1)
+            not_modified = not_modified_response(cached['headers'])
+            if not_modified:
+                return not_modified
+            return Response(cached['body'], mimetype='application/json', headers=cached['headers'])
+
+        count, edited = GisPolygon.query.by_id(polygon_id).version()
+        if not count:
+            abort(404)
+        headers, not_modified = check_version(count, edited)
+        if not_modified:
+            return not_modified
+
+        polygon = query.get_or_404(polygon_id)
+        record_rows(1)
 
         logger.info('polygon {0} was received'.format(polygon.id))
-        return PolygonSchema().dump(polygon)
+        with timed('serialize'):
+            if self._raw_geometry():
+                return with_headers(raw_polygon_response(schema, polygon), headers)
+            return with_headers(schema.dump(polygon).data, headers)
+
+    def _load_polygon(self, polygon_id: int, query, schema) -> dict:
+        """
+        Загружает и сериализует полигон для кеша ответов.
+        """
+        count, edited = GisPolygon.query.by_id(polygon_id).version()
+        if not count:
+            abort(404)
+
+        polygon = query.get_or_404(polygon_id)
+        logger.info('polygon {0} was loaded into cache'.format(polygon.id))
+        with timed('serialize'):
+            if self._raw_geometry():
+                body = dump_raw_polygon(schema, polygon)
+            else:
+                body = json.dumps(schema.dump(polygon).data)
+        return {'body': body, 'headers': version_headers(count, edited)}
 
     def get_polygons(self):
         """
@@ -71,10 +339,289 @@ class PolygonResource(Resource):
                     ]
                 }
                 404
+
+        Постраничная выдача (keyset-пагинация по id):
+        requests:
+            GET /api/polygon?limit=100&after={cursor}
+            response:
+                200 +
+                {
+                    "polygons": [...],
+                    "next": "NA=="
+                }
+                400 + {"error": "incorrect limit"}
+                400 + {"error": "incorrect cursor"}
+
+        "next" равен null на последней странице.
+
+        Потоковая выдача всей таблицы:
+        requests:
+            GET /api/polygon
+            Accept: application/geo+json-seq (или application/x-ndjson)
+            response:
+                200 + по одному GeoJSON Feature на строку
+
+            GET /api/polygon?stream=1
+            response:
+                200 + GeoJSON FeatureCollection
+                400 + {"error": "limit and after are not supported for streams"}
+
+        Пространственные фильтры (координаты в проекции ?projection=, если задана):
+        requests:
+            GET /api/polygon?bbox=minx,miny,maxx,maxy
+            GET /api/polygon?intersects={"type": "Polygon", "coordinates": [...]}
+            response:
+                200 + полигоны, попадающие в фильтр
+                400 + {"error": "incorrect bbox"}
+                400 + {"error": "incorrect intersects"}
+
+        Упрощённая геометрия для мелких масштабов:
+        requests:
+            GET /api/polygon?tolerance=0.001 (допуск в градусах)
+            GET /api/polygon?zoom=8 (допуск - размер пикселя на зуме)
+            response:
+                200 + полигоны с геометрией из ближайшего предрассчитанного уровня упрощения
+                400 + {"error": "incorrect tolerance"}
+                400 + {"error": "incorrect zoom"}
+
+        Только нужные поля (остальные колонки, в том числе geom, не читаются из базы):
+        requests:
+            GET /api/polygon?fields=polygon_id,name
+            response:
+                200 + {"polygons": [{"polygon_id": 4, "name": null}]}
+                400 + {"error": "incorrect fields"}
+
+        Точность координат (знаков после запятой, по умолчанию GEOJSON_PRECISION):
+        requests:
+            GET /api/polygon?precision=4
+            response:
+                200 + полигоны с округлёнными координатами
+                400 + {"error": "incorrect precision"}
+
+        Фильтры и сортировка по предрассчитанным площади (м²), числу вершин и центроиду:
+        requests:
+            GET /api/polygon?class_id=5&sort=-area&limit=10
+            GET /api/polygon?min_area=1000&max_area=50000
+            GET /api/polygon?centroid_bbox=minx,miny,maxx,maxy
+            response:
+                200 + полигоны; при ?limit= "next" продолжает выдачу в том же порядке
+                400 + {"error": "incorrect sort"}
+                400 + {"error": "incorrect class_id"}
+                400 + {"error": "incorrect area"}
+                400 + {"error": "incorrect centroid_bbox"}
+
+        Фильтры по свойствам props (props @> ..., по GIN-индексу), сочетаются с остальными параметрами:
+        requests:
+            GET /api/polygon?props.region=north (значение - строка)
+            GET /api/polygon?props.address.city=Moscow (вложенный ключ)
+            GET /api/polygon?props_contains={"level": 5, "tags": ["forest"]}
+            response:
+                200 + полигоны, props которых содержат заданные значения
+                400 + {"error": "incorrect props"}
+                400 + {"error": "incorrect props_contains"}
+
+        Ответы содержат ETag и Last-Modified (по времени последнего изменения или
+        удаления в таблице); на If-None-Match / If-Modified-Since с актуальной
+        версией возвращается 304 без загрузки полигонов.
+        """
+        sort = self._get_sort(request.args)
+        filtered_query = self._filter_polygons(GisPolygon.query, request.args)
+        query, schema = self._get_query_and_schema(
+            request.args, filtered_query, load_attributes=(sort[0],) if sort else ()
+        )
+        raw_geometry = self._raw_geometry()
+        stream_mimetype = self._get_stream_mimetype()
+        paginated = 'limit' in request.args or 'after' in request.args
+        if stream_mimetype and paginated:
+            abort(400, error='limit and after are not supported for streams')
+        after = None
+        if paginated:
+            limit = self._get_limit(request.args)
+            after = self._get_cursor(request.args, sort)
+        segments = []
+        if sort:
+            query, *segments = query.sorted_segments(*sort, cursor=after)
+
+        # версия не пересчитывает выборку (поток начинается без предварительного запроса):
+        # время последнего изменения или удаления в таблице
+        headers = version_headers(None, last_modified(), stream_mimetype or '')
+        # JSON и поток по одному URL различаются заголовком Accept
+        headers['Vary'] = 'Accept'
+        not_modified = not_modified_response(headers)
+        if not_modified:
+            return not_modified
+
+        if stream_mimetype:
+            logger.info('polygons stream was requested')
+            polygons = query.stream(current_app.config['STREAM_BATCH_SIZE'])
+            return with_headers(stream_polygons(polygons, schema, stream_mimetype, raw_geometry), headers)
+
+        if not paginated:
+            polygons = query.all()
+            record_rows(len(polygons))
+            logger.info('all polygons was received')
+            with timed('serialize'):
+                if raw_geometry:
+                    return with_headers(raw_polygons_response(schema, polygons), headers)
+                return with_headers(PolygonSchema(many=True, only=schema.only).dump(polygons).data, headers)
+
+        # запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+        if not sort:
+            query = query.after(after)
+        polygons = query.limit(limit + 1).all()
+        # страница, дошедшая до конца сегмента курсора, дополняется следующим сегментом сортировки
+        for segment in segments:
+            if len(polygons) > limit:
+                break
+            polygons += segment.limit(limit + 1 - len(polygons)).all()
+        next_cursor = None
+        if len(polygons) > limit:
+            polygons = polygons[:limit]
+            if sort:
+                next_cursor = encode_sort_cursor(getattr(polygons[-1], sort[0]), polygons[-1].id)
+            else:
+                next_cursor = encode_cursor(polygons[-1].id)
+
+        record_rows(len(polygons))
+        logger.info('page of {0} polygons was received'.format(len(polygons)))
+        with timed('serialize'):
+            if raw_geometry:
+                return with_headers(raw_polygons_response(schema, polygons, next=next_cursor), headers)
+            result = PolygonSchema(many=True, only=schema.only).dump(polygons).data
+        result['next'] = next_cursor
+        return with_headers(result, headers)
+
+    def _filter_polygons(self, query, args):
+        """
+        Применяет к запросу фильтры из аргументов.
+        """
+        if 'class_id' in args:
+            query = query.of_class(self._get_class_id(args))
+        if 'min_area' in args or 'max_area' in args:
+            query = query.area_between(self._get_area(args, 'min_area'), self._get_area(args, 'max_area'))
+        for document in self._get_props_filters(args):
+            query = query.with_props(document)
+
+        if not {'bbox', 'intersects', 'centroid_bbox'} & set(args):
+            return query
+
+        srid = get_projection_srid(args)
+        if 'bbox' in args:
+            query = query.in_bbox(self._get_bbox(args), srid)
+        if 'intersects' in args:
+            query = query.intersecting(self._get_intersects(args), srid)
+        if 'centroid_bbox' in args:
+            query = query.centroid_in_bbox(self._get_bbox(args, 'centroid_bbox'), srid)
+        return query
+
+    def _get_bbox(self, args, name='bbox'):
+        """
+        Возвращает bbox (minx, miny, maxx, maxy) из аргумента name.
         """
-        polygons = GisPolygon.query.all()
-        logger.info('all polygons was received')
-        return PolygonSchema(many=True).dump(polygons)
+        try:
+            bbox = [float(value) for value in args.get(name).split(',')]
+        except ValueError:
+            abort(400, error='incorrect {0}'.format(name))
+            return
+
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            abort(400, error='incorrect {0}'.format(name))
+        return bbox
+
+    def _get_area(self, args, name: str):
+        """
+        Возвращает границу площади (м²) из аргумента name или None, если она не задана.
+        """
+        if name not in args:
+            return None
+
+        try:
+            area = float(args.get(name))
+        except ValueError:
+            abort(400, error='incorrect area')
+            return
+
+        if not area >= 0:
+            abort(400, error='incorrect area')
+        return area
+
+    def _get_props_filters(self, args) -> list:
+        """
+        Возвращает документы для фильтров props @> document из ?props.key=value
+        (вложенные ключи через точку, значение сравнивается как строка) и ?props_contains=<JSON-объект>.
+        """
+        documents = []
+        for name, value in args.items():
+            if not name.startswith(PROPS_PREFIX):
+                continue
+            keys = name[len(PROPS_PREFIX):].split('.')
+            if not all(keys):
+                abort(400, error='incorrect props')
+            for key in reversed(keys):
+                value = {key: value}
+            documents.append(value)
+
+        if 'props_contains' in args:
+            try:
+                document = json.loads(args.get('props_contains'))
+            except ValueError:
+                abort(400, error='incorrect props_contains')
+                return
+            if not isinstance(document, dict):
+                abort(400, error='incorrect props_contains')
+            documents.append(document)
+        return documents
+
+    def _get_sort(self, args):
+        """
+        Возвращает (колонка, по убыванию) из ?sort=area / ?sort=-area или None.
+        """
+        sort = args.get('sort')
+        if not sort:
+            return None
+
+        descending = sort.startswith('-')
+        attribute = sort[1:] if descending else sort
+        if attribute not in SORT_ATTRIBUTES:
+            abort(400, error='incorrect sort')
+        return attribute, descending
+
+    def _get_intersects(self, args):
+        """
+        Возвращает shapely-геометрию из GeoJSON в аргументах.
+        """
+        try:
+            geometry = shape(json.loads(args.get('intersects')))
+        except (TypeError, ValueError, AttributeError, KeyError, IndexError):
+            abort(400, error='incorrect intersects')
+            return
+
+        if geometry.is_empty or not geometry.is_valid:
+            abort(400, error='incorrect intersects')
+        return geometry
+
+    def _get_stream_mimetype(self):
+        """
+        Возвращает тип потоковой выдачи или None, если поток не запрошен.
+        """
+        mimetype = request.accept_mimetypes.best_match(('application/json',) + STREAM_MIMETYPES)
+        if mimetype in STREAM_MIMETYPES:
+            return mimetype
+        if request.args.get('stream') in ('1', 'true'):
+            return GEOJSON_MIMETYPE
+
+    def _get_cursor(self, args, sort=None):
+        """
+        Возвращает из курсора в аргументах id, а при сортировке ?sort= - (значение колонки, id).
+        """
+        cursor = args.get('after')
+        if not cursor:
+            return None
+
+        try:
+            return decode_sort_cursor(cursor) if sort else decode_cursor(cursor)
+        except ValueError:
+            abort(400, error='incorrect cursor')
 
     def post(self):
         """
@@ -108,6 +655,7 @@ class PolygonResource(Resource):
 
         db.session.add(polygon)
         db.session.commit()
+        invalidate_tiles(geom_bounds(polygon.geom))
         logger.info('polygon {0} was created'.format(polygon.id))
         return {'info': 'ok'}
 
@@ -135,6 +683,7 @@ class PolygonResource(Resource):
                 404
         """
         polygon = GisPolygon.query.get_or_404(polygon_id)
+        old_bounds = geom_bounds(polygon.geom)
         polygon_validation = PolygonSchema().load(request.json, instance=polygon)
         if polygon_validation.errors:
             logger.debug('validation error, polygon editing cancelled')
@@ -143,6 +692,43 @@ class PolygonResource(Resource):
         polygon._edited = datetime.now()
         db.session.add(polygon)
         db.session.commit()
+        evict_polygon(polygon_id)
+        invalidate_tiles(old_bounds, geom_bounds(polygon.geom))
+
+        logger.info('polygon {0} was edited'.format(polygon_id))
+        return {'info': 'ok'}
+
+    def patch(self, polygon_id: int):
+        """
+        Частично изменяет полигон: изменяются только переданные поля.
+
+        Без "geom" геометрия не разбирается и не перезаписывается.
+
+        Пример:
+        requests:
+            PATCH /api/polygon/{polygon_id}
+            Content-Type: application/json
+            {
+                "props": {"prop1": "value"}
+            }
+            response:
+                200 + {"info": "OK"}
+                400 + {"errors": {"geom": ["Not a valid polygon."]}}
+                404
+        """
+        values, errors = load_polygon_changes(request.get_json(silent=True))
+        if errors:
+            logger.debug('validation error, polygon editing cancelled')
+            abort(400, errors=errors)
+
+        old_bounds = GisPolygon.query.by_ids([polygon_id]).bounds()
+        if polygon_id not in old_bounds:
+            abort(404)
+
+        GisPolygon.update_many([(polygon_id, values)])
+        db.session.commit()
+        evict_polygon(polygon_id)
+        invalidate_tiles(*changed_tile_bounds(old_bounds, {polygon_id: values}))
 
         logger.info('polygon {0} was edited'.format(polygon_id))
         return {'info': 'ok'}
@@ -159,11 +745,457 @@ class PolygonResource(Resource):
             404
         """
         polygon = GisPolygon.query.get_or_404(polygon_id)
+        bounds = geom_bounds(polygon.geom)
         db.session.delete(polygon)
         db.session.commit()
+        evict_polygon(polygon_id)
+        invalidate_tiles(bounds)
         logger.info('polygon {0} was deleted'.format(polygon_id))
         return {'info': 'ok'}
 
 
+class PolygonBulkResource(Resource):
+
+    def post(self):
+        """
+        Создаёт полигоны пачкой в одной транзакции.
+
+        Тело - GeoJSON FeatureCollection (или список полигонов) либо NDJSON
+        (Content-Type: application/x-ndjson) с фичей или полигоном на строке.
+        Невалидные фичи пропускаются, остальные создаются.
+        В "ids" на месте невалидных фич null, ошибки - по индексу фичи.
+
+        Пример:
+        requests:
+            POST /api/polygon/bulk
+            Content-Type: application/json
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "geometry": {
+                            "type": "Polygon",
+                            "coordinates": [
+                                [[0, 0], [1, 1], [1, 0]]
+                            ]
+                        },
+                        "properties": {"name": "test", "props": {"prop1": "value"}}
+                    },
+                    {
+                        "type": "Feature",
+                        "geometry": {},
+                        "properties": {"name": "test"}
+                    }
+                ]
+            }
+            response:
+                200 + {"ids": [5, null], "errors": {"1": {"geom": ["Not a valid polygon."]}}}
+                400 + {"error": "incorrect feature collection"}
+        """
+        features = self._get_features()
+
+        # без polygon_id схема не ищет полигон в базе: иначе существующая строка изменилась бы при commit
+        schema = PolygonSchema(exclude=('polygon_id',))
+        polygons, indexes, errors = [], [], {}
+        for index, feature in enumerate(features):
+            polygon_validation = schema.load(from_feature(feature))
+            if polygon_validation.errors:
+                errors[str(index)] = polygon_validation.errors
+            else:
+                polygons.append(polygon_validation.data)
+                indexes.append(index)
+
+        record_rows(len(polygons))
+        ids = [None] * len(features)
+        if polygons:
+            created_ids = GisPolygon.insert_many(polygons, current_app.config['BULK_BATCH_SIZE'])
+            for index, polygon_id in zip(indexes, created_ids):
+                ids[index] = polygon_id
+            db.session.commit()
+            invalidate_tiles(*[geom_bounds(polygon.geom) for polygon in polygons])
+
+        logger.info('{0} polygons were created, {1} rejected'.format(len(polygons), len(errors)))
+        return {'ids': ids, 'errors': errors}
+
+    def patch(self):
+        """
+        Частично изменяет полигоны пачкой в одной транзакции.
+
+        Тело - список объектов с "polygon_id" и изменяемыми полями, как в PATCH /api/polygon/{polygon_id}.
+        Невалидные и ненайденные полигоны пропускаются, остальные изменяются;
+        изменения одного полигона применяются по порядку.
+        В "ids" на месте пропущенных null, ошибки - по индексу в списке.
+
+        Пример:
+        requests:
+            PATCH /api/polygon/bulk
+            Content-Type: application/json
+            [
+                {"polygon_id": 5, "props": {"prop1": "value"}},
+                {"polygon_id": 6, "name": "test"},
+                {"polygon_id": 7, "geom": {}}
+            ]
+            response:
+                200 + {"ids": [5, 6, null], "errors": {"2": {"geom": ["Not a valid polygon."]}}}
+                400 + {"error": "incorrect polygons"}
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            abort(400, error='incorrect polygons')
+
+        changes, indexes, errors = {}, [], {}
+        for index, item in enumerate(data):
+            polygon_id = item.get('polygon_id') if isinstance(item, dict) else None
+            if not isinstance(polygon_id, int) or isinstance(polygon_id, bool):
+                errors[str(index)] = {'polygon_id': ['Not a valid integer.']}
+                continue
+            values, item_errors = load_polygon_changes(item)
+            if item_errors:
+                errors[str(index)] = item_errors
+            else:
+                changes.setdefault(polygon_id, {}).update(values)
+                indexes.append((index, polygon_id))
+
+        old_bounds = GisPolygon.query.by_ids(list(changes)).bounds() if changes else {}
+        ids = [None] * len(data)
+        for index, polygon_id in indexes:
+            if polygon_id in old_bounds:
+                ids[index] = polygon_id
+            else:
+                errors[str(index)] = {'polygon_id': ['Polygon not found.']}
+        changes = {polygon_id: values for polygon_id, values in changes.items() if polygon_id in old_bounds}
+
+        record_rows(len(changes))
+        if changes:
+            GisPolygon.update_many(changes.items())
+            db.session.commit()
+            for polygon_id in changes:
+                evict_polygon(polygon_id)
+            invalidate_tiles(*changed_tile_bounds(old_bounds, changes))
+
+        logger.info('{0} polygons were edited, {1} rejected'.format(len(changes), len(errors)))
+        return {'ids': ids, 'errors': errors}
+
+    def _get_features(self) -> list:
+        """
+        Возвращает список фич из тела запроса.
+        """
+        if request.mimetype in STREAM_MIMETYPES:
+            try:
+                lines = (line.strip().lstrip(RECORD_SEPARATOR) for line in request.get_data(as_text=True).split('\n'))
+                return [json.loads(line) for line in lines if line]
+            except ValueError:
+                abort(400, error='incorrect feature collection')
+
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
+            data = data.get('features')
+        if not isinstance(data, list):
+            abort(400, error='incorrect feature collection')
+        return data
+
+
+class PolygonChangesResource(PolygonArgsMixin, Resource):
+
+    def get(self):
+        """
+        Возвращает ленту изменений: полигоны, созданные или изменённые после курсора,
+        и id удалённых полигонов, в порядке времени изменения.
+
+        Без ?since= лента начинается с начала таблицы. Курсор "next" передаётся
+        в следующий запрос; пока "has_more" равен true, есть ещё изменения.
+        Изменения моложе CHANGES_DELAY секунд не отдаются, чтобы не пропустить
+        транзакции, которые ещё не завершились.
+        Поддерживает ?projection=, ?fields=, ?precision=, ?tolerance= и ?zoom= как список полигонов.
+
+        Пример:
+        requests:
+            GET /api/polygon/changes?since={cursor}&limit=100
+            response:
+                200 +
+                {
+                    "polygons": [...],
+                    "deleted": [{"polygon_id": 5, "deleted": "2026-10-18T12:00:00"}],
+                    "next": "MjAyNi0xMC0xOFQxMjowMDowMHwxfDU=",
+                    "has_more": false
+                }
+                400 + {"error": "incorrect cursor"}
+                400 + {"error": "incorrect limit"}
+        """
+        cursor = self._get_since(request.args)
+        limit = self._get_limit(request.args)
+        until = datetime.now() - timedelta(seconds=current_app.config['CHANGES_DELAY'])
+
+        query, schema = self._get_query_and_schema(
+            request.args, GisPolygon.query.changed_after(cursor, until), load_attributes=('_edited',)
+        )
+        polygons = query.limit(limit + 1).all()
+        deleted = GisPolygonDeleted.query.changed_after(cursor, until).limit(limit + 1).all()
+
+        changes = sorted(
+            [(polygon._edited, CHANGE_EDITED, polygon.id, polygon) for polygon in polygons]
+            + [(polygon._deleted, CHANGE_DELETED, polygon.polygon_id, polygon) for polygon in deleted],
+            key=lambda change: change[:3]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        next_cursor = encode_change_cursor(*changes[-1][:3]) if changes else request.args.get('since')
+
+        polygons = [change[3] for change in changes if change[1] == CHANGE_EDITED]
+        deleted = [
+            {'polygon_id': change[2], 'deleted': change[0].isoformat()}
+            for change in changes if change[1] == CHANGE_DELETED
+        ]
+        record_rows(len(changes))
+        logger.info('{0} changes were received'.format(len(changes)))
+
+        with timed('serialize'):
+            if self._raw_geometry():
+                return raw_polygons_response(schema, polygons, deleted=deleted, next=next_cursor, has_more=has_more)
+            result = PolygonSchema(many=True, only=schema.only).dump(polygons).data
+        result.update(deleted=deleted, next=next_cursor, has_more=has_more)
+        return result
+
+    def _get_since(self, args):
+        """
+        Возвращает позицию в ленте изменений из ?since= или None, если лента читается с начала.
+        """
+        since = args.get('since')
+        if not since:
+            return None
+
+        try:
+            cursor = decode_change_cursor(since)
+        except ValueError:
+            abort(400, error='incorrect cursor')
+            return
+
+        if cursor[1] not in (CHANGE_EDITED, CHANGE_DELETED):
+            abort(400, error='incorrect cursor')
+        return cursor
+
+
+class PolygonNearestResource(PolygonArgsMixin, Resource):
+
+    def get(self):
+        """
+        Возвращает k ближайших к точке полигонов по возрастанию расстояния (в метрах, 0 - точка внутри).
+
+        Точка ?point=x,y задаётся в проекции ?projection=, ?class_id= ограничивает класс полигонов.
+        Поддерживает ?fields=, ?precision=, ?tolerance= и ?zoom= как список полигонов.
+
+        Пример:
+        requests:
+            GET /api/polygon/nearest?point=37.6,55.7&k=2
+            response:
+                200 +
+                {
+                    "polygons": [
+                        {"polygon_id": 4, "name": "test", ..., "distance": 0.0},
+                        {"polygon_id": 7, "name": "test", ..., "distance": 1520.3}
+                    ]
+                }
+                400 + {"error": "incorrect point"}
+                400 + {"error": "incorrect k"}
+        """
+        point = self._get_point(request.args)
+        k = self._get_k(request.args)
+        query = GisPolygon.query
+        if 'class_id' in request.args:
+            query = query.of_class(self._get_class_id(request.args))
+
+        query, schema = self._get_query_and_schema(
+            request.args, query.nearest(point, get_projection_srid(request.args), k)
+        )
+        polygons = query.all()
+        record_rows(len(polygons))
+        logger.info('{0} nearest polygons were received'.format(len(polygons)))
+
+        with timed('serialize'):
+            if self._raw_geometry():
+                polygons = '[{0}]'.format(', '.join(
+                    dump_raw_polygon(schema, polygon, distance=polygon.distance) for polygon in polygons
+                ))
+                return Response(embed_raw({}, 'polygons', polygons), mimetype='application/json')
+            result = PolygonSchema(many=True, only=schema.only).dump(polygons).data
+        for polygon, data in zip(polygons, result['polygons']):
+            data['distance'] = polygon.distance
+        return result
+
+    def _get_point(self, args):
+        """
+        Возвращает shapely-точку из ?point=x,y.
+
+        Точка должна попадать в допустимые долготу и широту, иначе приведение к geography в базе упадёт.
+        """
+        try:
+            coordinates = [float(value) for value in args.get('point', '').split(',')]
+        except ValueError:
+            abort(400, error='incorrect point')
+            return
+
+        if len(coordinates) != 2 or not all(map(math.isfinite, coordinates)):
+            abort(400, error='incorrect point')
+
+        projection = get_projection(args)
+        lon, lat = get_transformer(projection, 'epsg:4326').transform(*coordinates) if projection else coordinates
+        if not (math.isfinite(lon) and math.isfinite(lat) and abs(lon) <= 180 and abs(lat) <= 90):
+            abort(400, error='incorrect point')
+        return Point(coordinates)
+
+    def _get_k(self, args) -> int:
+        """
+        Возвращает число ближайших полигонов из ?k= (по умолчанию 1).
+        """
+        try:
+            k = int(args.get('k', 1))
+        except ValueError:
+            abort(400, error='incorrect k')
+            return
+
+        if not 0 < k <= current_app.config['MAX_PAGE_SIZE']:
+            abort(400, error='incorrect k')
+        return k
+
+
+class PolygonLocateResource(Resource):
+
+    def post(self):
+        """
+        Возвращает для каждой точки id содержащих её полигонов (точка на границе тоже попадает).
+
+        Тело - JSON-массив точек [x, y] или GeoJSON Point, либо NDJSON
+        (Content-Type: application/x-ndjson) с точкой на строке.
+        Координаты в проекции ?projection=, по умолчанию - в epsg:4326.
+        Поиск идёт по индексу в памяти процесса, индекс перестраивается
+        после изменения или удаления полигонов.
+
+        Пример:
+        requests:
+            POST /api/polygon/locate?projection=epsg:32644
+            Content-Type: application/json
+            [[500000, 6100000], {"type": "Point", "coordinates": [0.5, 0.25]}]
+            response:
+                200 + {"polygon_ids": [[5, 7], []]}
+                400 + {"error": "incorrect points"}
+                400 + {"error": "too many points"}
+        """
+        projection = get_projection(request.args)
+        x, y = self._get_points()
+        if len(x) > current_app.config['LOCATE_MAX_POINTS']:
+            abort(400, error='too many points')
+
+        if projection and projection.lower() != 'epsg:4326':
+            with timed('reproject'):
+                x, y = get_transformer(projection.lower(), 'epsg:4326').transform(x, y)
+
+        with timed('index'):
+            index = polygon_locator.get_index(locator_version, locator_polygons, locator_changes)
+        with timed('locate'):
+            polygon_ids = index.locate(np.asarray(x), np.asarray(y))
+
+        record_rows(len(polygon_ids))
+        logger.info('{0} points were located'.format(len(polygon_ids)))
+        return {'polygon_ids': polygon_ids}
+
+    def _get_points(self) -> tuple:
+        """
+        Возвращает массивы координат x и y точек из тела запроса.
+        """
+        if request.mimetype in STREAM_MIMETYPES:
+            lines = (line.strip().lstrip(RECORD_SEPARATOR) for line in request.get_data(as_text=True).split('\n'))
+            try:
+                data = json.loads('[{0}]'.format(','.join(line for line in lines if line)))
+            except ValueError:
+                abort(400, error='incorrect points')
+                return
+        else:
+            data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            abort(400, error='incorrect points')
+
+        if not data:
+            return np.empty(0), np.empty(0)
+
+        # если в теле только числа (нет строк, true/false и null), массив пар координат разбирается
+        # NumPy целиком; иначе точки проверяются по одной: NumPy привёл бы к числу и "1", и true
+        if not any(token in request.get_data(as_text=True) for token in ('"', 'true', 'false', 'null')):
+            try:
+                points = np.array(data, dtype=float)
+            except (TypeError, ValueError):
+                abort(400, error='incorrect points')
+                return
+        else:
+            points = np.array([self._get_coordinates(point) for point in data], dtype=float)
+        if points.ndim != 2 or points.shape[1] not in (2, 3):
+            abort(400, error='incorrect points')
+        return points[:, 0], points[:, 1]
+
+    def _get_coordinates(self, point) -> list:
+        """
+        Возвращает координаты [x, y] точки, заданной парой координат или GeoJSON Point.
+        """
+        if isinstance(point, dict) and point.get('type') == 'Point':
+            point = point.get('coordinates')
+        if (
+            not isinstance(point, list) or len(point) not in (2, 3)
+            or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in point)
+        ):
+            abort(400, error='incorrect points')
+        return point[:2]
+
+
+class TileResource(Resource):
+
+    def get(self, z: int, x: int, y: int):
+        """
+        Возвращает Mapbox Vector Tile со слоем polygons (атрибуты id, class_id, name).
+
+        Тайлы кешируются, кеш сбрасывается при изменении попадающих в тайл полигонов
+        и не позже чем через TILE_CACHE_TTL секунд (изменения в других процессах).
+
+        Пример:
+        requests:
+            GET /api/tiles/{z}/{x}/{y}.mvt
+            response:
+                200 + application/vnd.mapbox-vector-tile
+                404
+        """
+        if not is_valid_tile(z, x, y, current_app.config['TILE_MAX_ZOOM']):
+            abort(404)
+
+        tile = tile_cache.get((z, x, y))
+        if tile is None:
+            tile = GisPolygon.query.mvt(
+                tile_bounds(z, x, y), current_app.config['TILE_EXTENT'], current_app.config['TILE_BUFFER']
+            )
+            tile_cache.set((z, x, y), tile)
+            logger.info('tile {0}/{1}/{2} was rendered'.format(z, x, y))
+
+        return Response(tile, mimetype=MVT_MIMETYPE)
+
+
+class CacheStatsResource(Resource):
+
+    def get(self):
+        """
+        Возвращает счётчики кеша ответов.
+
+        Пример:
+        requests:
+            GET /api/cache/stats
+            response:
+                200 + {"hits": 10, "misses": 2, "coalesced": 1}
+        """
+        return response_cache.stats()
+
+
 api.add_resource(PolygonResource, '/polygon',
                  '/polygon/<int:polygon_id>')
+api.add_resource(PolygonBulkResource, '/polygon/bulk')
+api.add_resource(PolygonChangesResource, '/polygon/changes')
+api.add_resource(PolygonNearestResource, '/polygon/nearest')
+api.add_resource(PolygonLocateResource, '/polygon/locate')
+api.add_resource(TileResource, '/tiles/<int:z>/<int:x>/<int:y>.mvt')
+api.add_resource(CacheStatsResource, '/cache/stats')
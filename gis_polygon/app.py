@@ -3,7 +3,9 @@ import logging
 from flask import Flask
 
 from gis_polygon import api
-from gis_polygon.extensions import db, migrate
+from gis_polygon.extensions import (
+    compression, db, metrics, migrate, polygon_locator, response_cache, tile_cache
+)
 
 logger = logging.getLogger('server')
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s %(levelname)s %(filename)s[LINE:%(lineno)d] %(message)s")
@@ -37,6 +39,12 @@ def configure_extensions(app, cli):
     Настраивает расширения Flask.
     """
     db.init_app(app)
+    tile_cache.init_app(app)
+    response_cache.init_app(app)
+    polygon_locator.init_app(app)
+    # after_request выполняются в обратном порядке: метрики видят уже сжатый ответ
+    metrics.init_app(app)
+    compression.init_app(app)
 
     if cli is True:
         migrate.init_app(app, db)
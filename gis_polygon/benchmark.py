@@ -0,0 +1,267 @@
+import json
+import math
+import platform
+import random
+import statistics
+import timeit
+from datetime import datetime
+from unittest import mock
+
+from flask import abort
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import Polygon, box, mapping
+
+from gis_polygon.extensions import response_cache
+from gis_polygon.models import GisPolygon
+from gis_polygon.schemas.polygon import PolygonSchema
+
+SRID = 4326
+PROJECTION = 'epsg:32644'
+# центр синтетических полигонов - внутри зоны UTM 44N, чтобы перепроецирование было осмысленным
+CENTER = (81, 55)
+
+
+def make_polygon(vertices: int, rng: random.Random, radius: float = 0.01) -> Polygon:
+    """
+    Возвращает простой (без самопересечений) полигон из vertices вершин.
+
+    Вершины лежат на лучах с возрастающими углами вокруг случайного центра.
+    """
+    cx = CENTER[0] + rng.uniform(-2, 2)
+    cy = CENTER[1] + rng.uniform(-2, 2)
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(vertices))
+    radii = [radius * rng.uniform(0.5, 1) for _ in range(vertices)]
+    return Polygon([
+        (cx + math.cos(angle) * ray, cy + math.sin(angle) * ray) for angle, ray in zip(angles, radii)
+    ])
+
+
+def make_polygons(count: int, vertices: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [make_polygon(vertices, rng) for _ in range(count)]
+
+
+def make_models(polygons) -> list:
+    return [
+        GisPolygon(id=polygon_id, name='polygon {0}'.format(polygon_id), props={'index': polygon_id},
+                   geom=from_shape(polygon, srid=SRID))
+        for polygon_id, polygon in enumerate(polygons, start=1)
+    ]
+
+
+def make_features(polygons) -> list:
+    return [
+        {'type': 'Feature', 'geometry': mapping(polygon), 'properties': {'name': 'polygon {0}'.format(index)}}
+        for index, polygon in enumerate(polygons)
+    ]
+
+
+class MemoryPolygonQuery:
+    """
+    PolygonQuery над списком моделей в памяти: API замеряется без базы данных.
+    """
+
+    def __init__(self, polygons):
+        self.polygons = list(polygons)
+
+    @property
+    def query(self):
+        return self
+
+    def all(self):
+        return list(self.polygons)
+
+    def by_id(self, polygon_id):
+        return MemoryPolygonQuery(polygon for polygon in self.polygons if polygon.id == polygon_id)
+
+    def version(self):
+        return len(self.polygons), None
+
+    def last_edited(self):
+        return None
+
+    def projected(self, srid, geom_column=None):
+        return self
+
+    def as_geojson(self, srid, precision, geom_column=None):
+        return self
+
+    def only_fields(self, *attributes):
+        return self
+
+    def after(self, polygon_id=None):
+        return MemoryPolygonQuery(
+            polygon for polygon in self.polygons if polygon_id is None or polygon.id > polygon_id
+        )
+
+    def limit(self, limit):
+        return MemoryPolygonQuery(self.polygons[:limit])
+
+    def stream(self, batch_size):
+        return iter(self.polygons)
+
+    def in_bbox(self, bbox, srid):
+        return self.intersecting(box(*bbox), srid)
+
+    def intersecting(self, geometry, srid):
+        return MemoryPolygonQuery(
+            polygon for polygon in self.polygons if to_shape(polygon.geom).intersects(geometry)
+        )
+
+    def get_or_404(self, polygon_id):
+        for polygon in self.polygons:
+            if polygon.id == polygon_id:
+                return polygon
+        abort(404)
+
+    def insert_many(self, polygons, batch_size):
+        return list(range(len(self.polygons) + 1, len(self.polygons) + len(polygons) + 1))
+
+
+class MemoryDeletedQuery:
+    """
+    DeletedPolygonQuery без удалений.
+    """
+
+    @property
+    def query(self):
+        return self
+
+    def last_deleted(self):
+        return None
+
+
+class MemorySession:
+
+    @property
+    def session(self):
+        return self
+
+    def add(self, polygon):
+        pass
+
+    def delete(self, polygon):
+        pass
+
+    def commit(self):
+        pass
+
+
+def measure(func, repeat: int, number: int = 0) -> dict:
+    """
+    Замеряет func: repeat серий по number вызовов (при number=0 - сколько успеет за ~0.2 с).
+
+    Возвращает время одного вызова в секундах: лучшее, медиану и среднее по сериям.
+    """
+    timer = timeit.Timer(func)
+    if not number:
+        number, _ = timer.autorange()
+    timings = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def get_benchmarks(app, polygons, models) -> dict:
+    """
+    Возвращает замеряемые функции по именам.
+    """
+    geoms = [model.geom for model in models]
+    geojsons = [mapping(polygon) for polygon in polygons]
+    data = [{'name': 'polygon', 'geom': geojson} for geojson in geojsons]
+    features = json.dumps({'type': 'FeatureCollection', 'features': make_features(polygons)})
+    field = PolygonSchema().fields['geom']
+    client = app.test_client()
+
+    def in_request(func, query_string=''):
+        def run():
+            with app.test_request_context('/?' + query_string):
+                func()
+        return run
+
+    def load_all():
+        schema = PolygonSchema()
+        for polygon in data:
+            schema.load(polygon)
+
+    def api(method, url, **kwargs):
+        def run():
+            response = client.open(url, method=method, **kwargs)
+            assert response.status_code == 200, response.status_code
+        return run
+
+    return {
+        'geom_field.serialize': lambda: [field._serialize(geom, 'geom', None) for geom in geoms],
+        'geom_field.deserialize': in_request(
+            lambda: [field._deserialize(geojson, 'geom', None) for geojson in geojsons]
+        ),
+        'schema.load': in_request(load_all),
+        'schema.load.projection': in_request(load_all, 'projection=' + PROJECTION),
+        'schema.dump': in_request(lambda: PolygonSchema(many=True).dump(models)),
+        'schema.dump.projection': in_request(
+            lambda: PolygonSchema(many=True).dump(models), 'projection=' + PROJECTION
+        ),
+        'api.get_polygon': api('GET', '/api/polygon/1'),
+        'api.get_polygon.projection': api('GET', '/api/polygon/1?projection=' + PROJECTION),
+        'api.get_polygons': api('GET', '/api/polygon'),
+        'api.get_polygons.projection': api('GET', '/api/polygon?projection=' + PROJECTION),
+        'api.get_polygons.page': api('GET', '/api/polygon?limit=100'),
+        'api.bulk_create': api('POST', '/api/polygon/bulk', data=features, content_type='application/json'),
+    }
+
+
+def run_benchmarks(app, size: int, vertices: int, repeat: int, number: int = 0, names=None, progress=None) -> dict:
+    """
+    Выполняет бенчмарки (все или с именами, содержащими одну из подстрок names)
+    и возвращает результаты для сохранения в JSON.
+
+    size - число полигонов в наборе, vertices - число вершин полигона.
+    """
+    results = {}
+    with app.app_context():
+        polygons = make_polygons(size, vertices)
+        models = make_models(polygons)
+        benchmarks = get_benchmarks(app, polygons, models)
+        # замеряется полный путь запроса, поэтому кеш ответов отключён
+        query = MemoryPolygonQuery(models)
+        with mock.patch.multiple(
+            'gis_polygon.api', GisPolygon=query, GisPolygonDeleted=MemoryDeletedQuery(), db=MemorySession()
+        ), mock.patch.object(response_cache, 'backend', None):
+            for name, func in benchmarks.items():
+                if names and not any(pattern in name for pattern in names):
+                    continue
+                results[name] = measure(func, repeat, number)
+                if progress:
+                    progress(name, results[name])
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'size': size,
+            'vertices': vertices,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Сравнивает медианы бенчмарков, которые есть в обоих результатах.
+
+    Возвращает список (имя, медиана в baseline, медиана в current, отношение, регрессия),
+    регрессия - замедление больше чем в threshold раз.
+    """
+    comparison = []
+    for name, result in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else math.inf
+        comparison.append((name, base['median'], result['median'], ratio, ratio > threshold))
+    return comparison
@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class MemoryCacheBackend:
+    """
+    LRU-кеш в памяти процесса с ограничением числа записей и временем жизни.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+
+            value, expires = item
+            if expires < time.monotonic():
+                del self._values[key]
+                return None
+
+            self._values.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class RedisCacheBackend:
+    """
+    Общий для процессов кеш в Redis.
+
+    client - объект с интерфейсом redis.Redis (get, set с ex, delete, flushdb),
+    в тестах его можно заменить локальной реализацией.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: int):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class ResponseCache:
+    """
+    Read-through кеш сериализованных ответов.
+
+    Одновременные промахи по одному ключу объединяются: данные загружает
+    один запрос, остальные ждут его результат. Загрузка, начатая до удаления
+    ключа, в кеш не сохраняется: удаление увеличивает поколение ключа.
+    """
+
+    def __init__(self, backend=None, ttl: int = 0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._loading = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryCacheBackend(app.config['RESPONSE_CACHE_SIZE'])
+        elif backend == 'redis':
+            self.backend = RedisCacheBackend.from_url(app.config['RESPONSE_CACHE_URL'])
+        else:
+            self.backend = None
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get_or_load(self, key: str, loader):
+        """
+        Возвращает значение из кеша, при промахе - результат loader(), сохраняя его в кеш.
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        with self._lock:
+            future = self._loading.get(key)
+            loading = future is None
+            if loading:
+                future = self._loading[key] = Future()
+                generation = self._generations.get(key, 0)
+
+        if not loading:
+            self._count('coalesced')
+            return future.result()
+
+        self._count('misses')
+        try:
+            value = loader()
+            if self._generation(key) == generation:
+                self.backend.set(key, value, self.ttl)
+                # удаление между проверкой и записью: значение уже устарело
+                if self._generation(key) != generation:
+                    self.backend.delete(key)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._loading.get(key) is future:
+                    del self._loading[key]
+
+    def delete(self, *keys):
+        self._invalidate(keys)
+        if self.enabled:
+            self.backend.delete(*keys)
+
+    def clear(self):
+        self._invalidate()
+        if self.enabled:
+            self.backend.clear()
+        self.hits = self.misses = self.coalesced = 0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
+
+    def _generation(self, key: str) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def _invalidate(self, keys=None):
+        """
+        Увеличивает поколение ключей (по умолчанию - всех), которые сейчас загружаются, и отцепляет
+        их загрузки: новые промахи не ждут устаревший результат. Ключи без загрузки менять не нужно -
+        следующая загрузка начнётся уже после удаления.
+        """
+        with self._lock:
+            for key in list(self._loading) if keys is None else keys:
+                if self._loading.pop(key, None) is not None:
+                    self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
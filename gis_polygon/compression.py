@@ -0,0 +1,70 @@
+import gzip
+
+from flask import request
+
+from gis_polygon.metrics import timed
+from gis_polygon.streaming import GEOJSON_MIMETYPE
+from gis_polygon.tiles import MVT_MIMETYPE
+
+COMPRESS_MIMETYPES = ('application/json', GEOJSON_MIMETYPE, MVT_MIMETYPE)
+
+
+class Compression:
+    """
+    Сжимает ответы gzip или brotli (если установлен пакет brotli) по Accept-Encoding.
+
+    Сжимаются только готовые ответы типов COMPRESS_MIMETYPES размером от min_size байт,
+    потоковые ответы отдаются как есть.
+    """
+
+    def __init__(self, min_size: int = 0, level: int = 6, brotli_quality: int = 5):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.brotli = None
+
+    def init_app(self, app):
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        self.brotli = brotli
+        app.after_request(self.compress)
+
+    @property
+    def encodings(self) -> tuple:
+        """
+        Поддерживаемые кодировки в порядке предпочтения.
+        """
+        return ('br', 'gzip') if self.brotli is not None else ('gzip',)
+
+    def compress(self, response):
+        if (
+            response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'Content-Encoding' in response.headers
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        data = response.get_data()
+        if not encoding or len(data) < self.min_size:
+            return response
+
+        with timed('compress'):
+            if encoding == 'br':
+                response.set_data(self.brotli.compress(data, quality=self.brotli_quality))
+            else:
+                response.set_data(gzip.compress(data, compresslevel=self.level))
+        response.headers['Content-Encoding'] = encoding
+
+        # у сжатого представления другие байты, поэтому сильный ETag становится слабым
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
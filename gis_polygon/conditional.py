@@ -0,0 +1,61 @@
+import hashlib
+
+from flask import Response, request
+from werkzeug.http import http_date, parse_date, quote_etag, unquote_etag
+
+
+def check_version(count: int, edited):
+    """
+    Проверяет условный запрос для версии данных (число полигонов, максимальный _edited).
+
+    Возвращает заголовки ETag/Last-Modified и ответ 304, если копия клиента актуальна
+    (иначе None). ETag зависит от пути и аргументов запроса, поэтому у разных
+    представлений одних данных (проекция, страница, фильтры) разные ETag.
+    """
+    headers = version_headers(count, edited)
+    return headers, not_modified_response(headers)
+
+
+def version_headers(count: int, edited, representation: str = '') -> dict:
+    """
+    Возвращает заголовки ETag и Last-Modified для версии данных.
+
+    count может быть None, если версию задаёт только время изменения. representation отличает
+    представления одного URL, выбранные по заголовкам запроса (например, Accept).
+    """
+    version = '{0}|{1}|{2}|{3}'.format(
+        request.full_path, representation, count, edited.isoformat() if edited else ''
+    )
+    headers = {'ETag': quote_etag(hashlib.sha1(version.encode()).hexdigest())}
+    if edited:
+        headers['Last-Modified'] = http_date(edited)
+    return headers
+
+
+def not_modified_response(headers: dict):
+    """
+    Возвращает ответ 304, если копия клиента с заголовками headers актуальна, иначе None.
+    """
+    etag, _ = unquote_etag(headers['ETag'])
+    last_modified = parse_date(headers.get('Last-Modified'))
+
+    # If-None-Match приоритетнее If-Modified-Since (RFC 7232, 6)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        not_modified = last_modified <= request.if_modified_since
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status=304, headers=headers)
+
+
+def with_headers(result, headers: dict):
+    """
+    Добавляет заголовки к результату ресурса (словарю или Response).
+    """
+    if isinstance(result, Response):
+        result.headers.extend(headers)
+        return result
+    return result, 200, headers
@@ -6,3 +6,27 @@ SQLALCHEMY_TRACK_MODIFICATIONS = True
 PROPAGATE_EXCEPTIONS = False
 DEBUG = bool(int(os.getenv('DEBUG', '0')))
 DEFAULT_SRID = int(os.getenv('DEFAULT_SRID'))
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '1000'))
+GEOJSON_FROM_DB = bool(int(os.getenv('GEOJSON_FROM_DB', '0')))
+GEOJSON_PRECISION = int(os.getenv('GEOJSON_PRECISION', '6'))
+MAX_GEOJSON_PRECISION = 15
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+TILE_CACHE_SIZE = int(os.getenv('TILE_CACHE_SIZE', str(64 * 1024 * 1024)))
+TILE_CACHE_TTL = int(os.getenv('TILE_CACHE_TTL', '60'))
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_MAX_ZOOM = 22
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '10000'))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '60'))
+CHANGES_DELAY = int(os.getenv('CHANGES_DELAY', '5'))
+SERVER_TIMING = bool(int(os.getenv('SERVER_TIMING', '1')))
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+LOCATOR_REFRESH_INTERVAL = float(os.getenv('LOCATOR_REFRESH_INTERVAL', '1'))
+LOCATE_MAX_POINTS = int(os.getenv('LOCATE_MAX_POINTS', '1000000'))
+LOCATOR_SNAPSHOT = os.getenv('LOCATOR_SNAPSHOT')
@@ -0,0 +1,148 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlalchemy import LargeBinary, Text, and_, cast, create_engine, func, literal_column, select
+from sqlalchemy.pool import NullPool
+
+from gis_polygon.models import GisPolygon
+from gis_polygon.raw_json import embed_raw
+
+EXTENSIONS = {
+    'ndjson': '.ndjson',
+    'flatgeobuf': '.fgb',
+}
+
+table = GisPolygon.__table__
+
+
+def get_filters(class_ids=None, edited_since=None, edited_until=None) -> list:
+    """
+    Возвращает условия выгрузки по class_id и _edited.
+    """
+    filters = []
+    if class_ids:
+        filters.append(table.c.class_id.in_(class_ids))
+    if edited_since:
+        filters.append(table.c._edited >= edited_since)
+    if edited_until:
+        filters.append(table.c._edited < edited_until)
+    return filters
+
+
+def get_ranges(connection, parts: int, filters: list) -> list:
+    """
+    Делит отфильтрованные полигоны на parts диапазонов id примерно равного размера.
+    """
+    numbered = select([
+        table.c.id,
+        func.ntile(parts).over(order_by=table.c.id).label('part'),
+    ]).where(and_(*filters)).alias('numbered')
+    query = select([func.min(numbered.c.id), func.max(numbered.c.id)]) \
+        .group_by(numbered.c.part) \
+        .order_by(numbered.c.part)
+    return [tuple(row) for row in connection.execute(query)]
+
+
+def build_query(file_format: str, start: int, end: int, srid: int, precision: int, filters: list):
+    """
+    Возвращает запрос полигонов с id из [start, end].
+
+    Геометрию сериализует база данных: ST_AsGeoJSON для ndjson, ST_AsFlatGeobuf
+    (PostGIS >= 3.2) для flatgeobuf - запрос возвращает одну строку (файл, число полигонов).
+    """
+    geom = table.c.geom
+    if srid != GisPolygon.geom.type.srid:
+        geom = func.ST_Transform(geom, srid)
+    conditions = and_(table.c.id.between(start, end), *filters)
+
+    if file_format == 'flatgeobuf':
+        rows = select([
+            table.c.id,
+            table.c.class_id,
+            table.c.name,
+            cast(table.c.props, Text).label('props'),
+            geom.label('geom'),
+        ]).where(conditions).order_by(table.c.id).alias('q')
+        return select([
+            func.ST_AsFlatGeobuf(literal_column('q'), True, 'geom', type_=LargeBinary),
+            func.count(),
+        ]).select_from(rows)
+
+    return select([
+        table.c.id,
+        table.c.class_id,
+        table.c.name,
+        table.c.props,
+        func.ST_AsGeoJSON(geom, precision).label('geom'),
+    ]).where(conditions).order_by(table.c.id)
+
+
+def write_ndjson(rows, file) -> int:
+    """
+    Пишет строки запроса фичами NDJSON, возвращает их число.
+    """
+    count = 0
+    for row in rows:
+        feature = {
+            'type': 'Feature',
+            'id': row.id,
+            'properties': {'class_id': row.class_id, 'name': row.name, 'props': row.props},
+        }
+        file.write(embed_raw(feature, 'geometry', row.geom) + '\n')
+        count += 1
+    return count
+
+
+def export_range(database_uri: str, path: str, file_format: str, start: int, end: int, srid: int, precision: int,
+                 class_ids=None, edited_since=None, edited_until=None) -> int:
+    """
+    Выгружает диапазон id в файл path, возвращает число полигонов.
+
+    Выполняется в отдельном процессе со своим соединением, строки читаются серверным курсором.
+    """
+    engine = create_engine(database_uri, poolclass=NullPool)
+    filters = get_filters(class_ids, edited_since, edited_until)
+    query = build_query(file_format, start, end, srid, precision, filters)
+
+    with engine.connect() as connection:
+        if file_format == 'flatgeobuf':
+            data, count = connection.execute(query).first()
+            with open(path, 'wb') as file:
+                file.write(bytes(data or b''))
+        else:
+            result = connection.execution_options(stream_results=True).execute(query)
+            with open(path, 'w', encoding='utf-8') as file:
+                count = write_ndjson(result, file)
+
+    engine.dispose()
+    return count
+
+
+def export_table(connection, database_uri: str, output_dir: str, file_format: str, srid: int, precision: int,
+                 workers: int, parts: int, class_ids=None, edited_since=None, edited_until=None, progress=None) -> int:
+    """
+    Выгружает полигоны в output_dir файлами по диапазонам id, параллельно в workers процессах.
+
+    progress вызывается после каждого файла с (путь, число полигонов).
+    Возвращает общее число выгруженных полигонов.
+    """
+    ranges = get_ranges(connection, parts, get_filters(class_ids, edited_since, edited_until))
+    os.makedirs(output_dir, exist_ok=True)
+
+    total = 0
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {}
+        for part, (start, end) in enumerate(ranges):
+            path = os.path.join(output_dir, 'polygons-{0:05d}{1}'.format(part, EXTENSIONS[file_format]))
+            future = executor.submit(
+                export_range, database_uri, path, file_format, start, end, srid, precision,
+                class_ids, edited_since, edited_until
+            )
+            futures[future] = path
+
+        for future in as_completed(futures):
+            count = future.result()
+            total += count
+            if progress:
+                progress(futures[future], count)
+    return total
@@ -2,6 +2,17 @@ from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
+from gis_polygon.cache import ResponseCache
+from gis_polygon.compression import Compression
+from gis_polygon.locator import PolygonLocator
+from gis_polygon.metrics import Metrics
+from gis_polygon.tiles import TileCache
+
 db = SQLAlchemy()
 migrate = Migrate()
 ma = Marshmallow()
+tile_cache = TileCache()
+response_cache = ResponseCache()
+compression = Compression()
+metrics = Metrics()
+polygon_locator = PolygonLocator()
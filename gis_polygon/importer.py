@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from marshmallow import ValidationError
+from shapely import wkb
+from shapely.geometry import shape
+
+from gis_polygon.projections import transform_geometries
+from gis_polygon.schemas.custom_schema_fields import GeomSchemaField
+from gis_polygon.streaming import RECORD_SEPARATOR, from_feature
+
+COPY_SQL = 'COPY gis_polygon (_created, _edited, class_id, name, props, geom) FROM STDIN WITH (FORMAT csv)'
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl', '.geojsonl', '.geojsons')
+READ_SIZE = 1 << 20
+SRID = 4326
+
+_FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+_FEATURES_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def iter_features(file, file_format: str):
+    """
+    Читает фичи из файла по одной, не загружая файл целиком.
+
+    file_format - geojson (FeatureCollection) или ndjson (фича на строке,
+    в том числе GeoJSON Text Sequence).
+    """
+    if file_format == 'ndjson':
+        return _iter_lines(file)
+    return _iter_collection(file)
+
+
+def detect_format(path: str) -> str:
+    return 'ndjson' if path.lower().endswith(NDJSON_EXTENSIONS) else 'geojson'
+
+
+def _iter_lines(file):
+    for line in file:
+        line = line.strip().lstrip(RECORD_SEPARATOR)
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # невалидная строка учитывается как отклонённая фича
+            yield None
+
+
+def _iter_collection(file):
+    decoder = json.JSONDecoder()
+
+    buffer = ''
+    while True:
+        chunk = file.read(READ_SIZE)
+        if not chunk:
+            raise ValueError('"features" not found')
+        # хвост предыдущего куска нужен, если ключ разрезан между кусками
+        buffer = buffer[-32:] + chunk
+        match = _FEATURES_START.search(buffer)
+        if match:
+            break
+
+    position = match.end()
+    while True:
+        position = _FEATURES_SEPARATOR.match(buffer, position).end()
+        if buffer[position:position + 1] == ']':
+            return
+
+        try:
+            feature, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise ValueError('unexpected end of feature collection')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield feature
+
+
+def prepare_batch(features: list, projection: str):
+    """
+    Валидирует и перепроецирует пачку фич.
+
+    Возвращает строки для COPY (class_id, name, props, geom в hex EWKB) и число отклонённых фич.
+    Выполняется в процессах пула, поэтому не использует приложение и базу данных.
+    """
+    field = GeomSchemaField()
+    polygons, geometries = [], []
+    for feature in features:
+        polygon = from_feature(feature)
+        try:
+            if not isinstance(polygon, dict):
+                raise ValidationError('Not a valid feature.')
+            geometry = shape(field._validated(polygon.get('geom')))
+        except (ValidationError, ValueError, TypeError, AttributeError, IndexError):
+            continue
+
+        if geometry.geom_type != 'Polygon' or not _valid_properties(polygon):
+            continue
+
+        polygons.append(polygon)
+        geometries.append(geometry)
+
+    geometries = transform_geometries(geometries, projection, 'epsg:{0}'.format(SRID))
+    rows = [
+        [
+            polygon.get('class_id'),
+            polygon.get('name'),
+            json.dumps(polygon['props']) if polygon.get('props') is not None else None,
+            wkb.dumps(geometry, hex=True, srid=SRID),
+        ]
+        for polygon, geometry in zip(polygons, geometries)
+    ]
+    return rows, len(features) - len(rows)
+
+
+def _valid_properties(polygon: dict) -> bool:
+    class_id, name = polygon.get('class_id'), polygon.get('name')
+    return (
+        (class_id is None or (isinstance(class_id, int) and not isinstance(class_id, bool)))
+        and (name is None or isinstance(name, str))
+    )
+
+
+def copy_rows(connection, rows: list):
+    """
+    Загружает строки в gis_polygon через COPY и фиксирует транзакцию.
+    """
+    now = datetime.now().isoformat()
+    buffer = io.StringIO()
+    # строки в кавычках, None без кавычек - COPY прочитает его как NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    writer.writerows([now, now] + row for row in rows)
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(COPY_SQL, buffer)
+    connection.commit()
+
+
+def read_checkpoint(checkpoint_path: str, path: str) -> int:
+    """
+    Возвращает число уже обработанных фич файла path.
+    """
+    if not os.path.exists(checkpoint_path):
+        return 0
+
+    with open(checkpoint_path) as file:
+        checkpoint = json.load(file)
+    if checkpoint.get('path') != os.path.abspath(path):
+        raise ValueError('checkpoint {0} belongs to another file'.format(checkpoint_path))
+    return checkpoint['features']
+
+
+def write_checkpoint(checkpoint_path: str, path: str, features: int):
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'path': os.path.abspath(path), 'features': features}, file)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def import_file(connection, path: str, file_format: str, projection: str, workers: int, batch_size: int,
+                checkpoint_path: str, resume: bool, progress=None):
+    """
+    Импортирует фичи из файла в gis_polygon.
+
+    Пачки по batch_size фич валидируются в workers процессах и загружаются через COPY,
+    каждая в своей транзакции. После каждой пачки обновляется контрольная точка,
+    с которой импорт продолжится при resume.
+    progress вызывается после каждой пачки с (обработано, отклонено, секунд).
+    """
+    skip = read_checkpoint(checkpoint_path, path) if resume else 0
+    processed, rejected = skip, 0
+    started = time.monotonic()
+
+    with open(path, encoding='utf-8') as file:
+        features = islice(iter_features(file, file_format), skip, None)
+        batches = iter(lambda: list(islice(features, batch_size)), [])
+
+        for count, (rows, batch_rejected) in _prepare_batches(batches, projection, workers):
+            if rows:
+                copy_rows(connection, rows)
+            processed += count
+            rejected += batch_rejected
+            write_checkpoint(checkpoint_path, path, processed)
+            if progress:
+                progress(processed, rejected, time.monotonic() - started)
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return processed, rejected
+
+
+def _prepare_batches(batches, projection: str, workers: int):
+    """
+    Подготавливает пачки в пуле процессов, сохраняя их порядок.
+
+    В работе одновременно не больше 2 * workers пачек, поэтому память ограничена.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield len(batch), prepare_batch(batch, projection)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((len(batch), executor.submit(prepare_batch, batch, projection)))
+            if len(pending) >= 2 * workers:
+                count, future = pending.popleft()
+                yield count, future.result()
+
+        while pending:
+            count, future = pending.popleft()
+            yield count, future.result()
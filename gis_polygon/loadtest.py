@@ -0,0 +1,198 @@
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from geoalchemy2.shape import from_shape
+from shapely.geometry import mapping
+from sqlalchemy.engine.url import make_url
+
+from gis_polygon.benchmark import CENTER, SRID, make_polygon
+from gis_polygon.extensions import db
+from gis_polygon.models import GisPolygon
+
+LOCAL_HOSTS = (None, '', 'localhost', '127.0.0.1', '::1')
+SEED_NAME = '__loadtest__'
+# доли операций: в основном чтение одного полигона, немного списков и bbox, изредка запись
+WORKLOAD = (
+    ('get_polygon', 80),
+    ('get_polygons', 7),
+    ('bbox', 8),
+    ('put', 2),
+    ('post', 2),
+    ('delete', 1),
+)
+PERCENTILES = (50, 90, 99)
+
+
+def is_local_database(database_uri: str) -> bool:
+    return make_url(database_uri).host in LOCAL_HOSTS
+
+
+def parse_mix(mix: str) -> tuple:
+    """
+    Разбирает доли операций вида "get_polygon=80,put=20".
+    """
+    operations = dict(WORKLOAD)
+    weights = []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in operations:
+            raise ValueError('unknown operation {0}'.format(name))
+        weights.append((name, float(weight)))
+    if not weights or any(weight < 0 for _, weight in weights) or not sum(weight for _, weight in weights):
+        raise ValueError('incorrect mix')
+    return tuple(weights)
+
+
+def seed_polygons(count: int, vertices: int, batch_size: int, seed: int = 0) -> list:
+    """
+    Создаёт count синтетических полигонов и возвращает их id.
+    """
+    rng = random.Random(seed)
+    ids = []
+    for start in range(0, count, batch_size):
+        polygons = [
+            GisPolygon(
+                name=SEED_NAME, props={'index': index}, geom=from_shape(make_polygon(vertices, rng), srid=SRID)
+            )
+            for index in range(start, min(start + batch_size, count))
+        ]
+        ids.extend(GisPolygon.insert_many(polygons, batch_size))
+        db.session.commit()
+    return ids
+
+
+def remove_polygons() -> int:
+    """
+    Удаляет полигоны нагрузочного теста: засеянные, созданные и изменённые им получают имя SEED_NAME.
+    """
+    removed = GisPolygon.query.filter(GisPolygon.name == SEED_NAME).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+class PolygonPool:
+    """
+    id существующих полигонов, общие для потоков нагрузки.
+    """
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self._lock = threading.Lock()
+
+    def choice(self, rng: random.Random):
+        with self._lock:
+            return rng.choice(self.ids) if self.ids else None
+
+    def pop(self, rng: random.Random):
+        with self._lock:
+            if not self.ids:
+                return None
+            index = rng.randrange(len(self.ids))
+            self.ids[index], self.ids[-1] = self.ids[-1], self.ids[index]
+            return self.ids.pop()
+
+
+def build_request(operation: str, pool: PolygonPool, rng: random.Random, vertices: int) -> tuple:
+    """
+    Возвращает (операция, метод, url, тело) для одной операции нагрузки.
+
+    Если полигонов для изменения не осталось, операция заменяется чтением списка.
+    """
+    if operation in ('get_polygon', 'put', 'delete'):
+        polygon_id = pool.pop(rng) if operation == 'delete' else pool.choice(rng)
+        if polygon_id is None:
+            operation = 'get_polygons'
+        elif operation == 'get_polygon':
+            return operation, 'GET', '/api/polygon/{0}'.format(polygon_id), None
+        elif operation == 'put':
+            return operation, 'PUT', '/api/polygon/{0}'.format(polygon_id), _polygon_body(rng, vertices)
+        else:
+            return operation, 'DELETE', '/api/polygon/{0}'.format(polygon_id), None
+
+    if operation == 'bbox':
+        x = CENTER[0] + rng.uniform(-2, 2)
+        y = CENTER[1] + rng.uniform(-2, 2)
+        return operation, 'GET', '/api/polygon?bbox={0},{1},{2},{3}'.format(x, y, x + 0.1, y + 0.1), None
+    if operation == 'post':
+        return operation, 'POST', '/api/polygon', _polygon_body(rng, vertices)
+    return 'get_polygons', 'GET', '/api/polygon?limit=100', None
+
+
+def _polygon_body(rng: random.Random, vertices: int) -> dict:
+    return {'name': SEED_NAME, 'geom': mapping(make_polygon(vertices, rng))}
+
+
+def run_workload(app, pool: PolygonPool, mix, concurrency: int, vertices: int, duration: float = None,
+                 requests: int = None, seed: int = 0) -> dict:
+    """
+    Нагружает WSGI-приложение из concurrency потоков заданной смесью операций.
+
+    Останавливается через duration секунд или после requests запросов.
+    Возвращает сводку по операциям (summarize).
+    """
+    operations = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    deadline = time.perf_counter() + duration if duration else math.inf
+    samples = []
+
+    def worker(worker_index: int):
+        rng = random.Random(seed + worker_index)
+        client = app.test_client()
+        limit = requests // concurrency + (worker_index < requests % concurrency) if requests else math.inf
+        done = 0
+        while done < limit and time.perf_counter() < deadline:
+            operation, method, url, body = build_request(rng.choices(operations, weights)[0], pool, rng, vertices)
+            start = time.perf_counter()
+            response = client.open(url, method=method, json=body)
+            samples.append((operation, response.status_code, time.perf_counter() - start))
+            done += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, index) for index in range(concurrency)]:
+            future.result()
+    return summarize(samples, time.perf_counter() - started, concurrency)
+
+
+def percentile(values: list, percent: float) -> float:
+    """
+    Перцентиль отсортированного списка методом ближайшего ранга.
+    """
+    if not values:
+        return 0
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def summarize(samples, elapsed: float, concurrency: int) -> dict:
+    """
+    Считает по операциям и в целом: число запросов, ошибки (5xx), коды ответов,
+    запросы в секунду и перцентили задержки в миллисекундах.
+    """
+    by_operation = defaultdict(list)
+    for sample in samples:
+        by_operation[sample[0]].append(sample)
+        by_operation['total'].append(sample)
+
+    operations = {}
+    for operation, operation_samples in sorted(by_operation.items()):
+        latencies = sorted(latency * 1000 for _, _, latency in operation_samples)
+        statuses = defaultdict(int)
+        for _, status, _ in operation_samples:
+            statuses[str(status)] += 1
+        summary = {
+            'count': len(operation_samples),
+            'errors': sum(count for status, count in statuses.items() if status.startswith('5')),
+            'statuses': dict(statuses),
+            'rps': len(operation_samples) / elapsed if elapsed else 0,
+            'max': latencies[-1],
+        }
+        for percent in PERCENTILES:
+            summary['p{0}'.format(percent)] = percentile(latencies, percent)
+        operations[operation] = summary
+
+    return {'elapsed': elapsed, 'concurrency': concurrency, 'operations': operations}
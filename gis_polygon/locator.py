@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import shapely
+
+from gis_polygon.snapshot import PackedPolygonIndex
+
+# в shapely 2 STRtree ищет сразу массив точек; в shapely 1.x дерево ищет по одной точке,
+# поэтому полигоны упаковываются в R-дерево NumPy, как снимок индекса
+VECTORIZED = hasattr(shapely, 'points')
+
+logger = logging.getLogger(__name__)
+
+
+def group_by_point(count: int, point_indexes: np.ndarray, ids: np.ndarray) -> list:
+    """
+    Раскладывает пары (индекс точки, id полигона) в списки id по точкам, id по возрастанию.
+    """
+    result = [[] for _ in range(count)]
+    order = np.lexsort((ids, point_indexes))
+    for point_index, polygon_id in zip(point_indexes[order].tolist(), ids[order].tolist()):
+        result[point_index].append(polygon_id)
+    return result
+
+
+class PolygonIndex:
+    """
+    Пространственный индекс полигонов для поиска полигонов, содержащих точки.
+    """
+
+    def __init__(self, ids, geometries):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.geometries = list(geometries)
+        self.bounds = np.array([geometry.bounds for geometry in self.geometries]).reshape(-1, 4)
+
+        if VECTORIZED:
+            geometries = np.array(self.geometries, dtype=object)
+            shapely.prepare(geometries)
+            self.tree = shapely.STRtree(geometries)
+        else:
+            # кандидаты - спуском по R-дереву сразу для всех точек, точная проверка - массивами NumPy
+            self.packed = PackedPolygonIndex.build(zip(self.ids.tolist(), self.geometries))
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def locate(self, x: np.ndarray, y: np.ndarray) -> list:
+        """
+        Возвращает для каждой точки (x[i], y[i]) список id содержащих её полигонов (граница включается).
+        """
+        return group_by_point(len(x), *self.locate_pairs(x, y))
+
+    def locate_pairs(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Возвращает пары (индекс точки, id полигона), где точка попадает в полигон.
+        """
+        if not len(self.bounds) or not len(x):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        if not VECTORIZED:
+            return self.packed.locate_pairs(x, y)
+
+        point_indexes, polygon_indexes = self.tree.query(shapely.points(x, y), predicate='intersects')
+        return point_indexes, self.ids[polygon_indexes]
+
+
+class SnapshotIndex:
+    """
+    Снимок индекса из файла (PackedPolygonIndex) и полигоны, изменённые после снимка.
+
+    Из результатов снимка исключаются изменённые и удалённые после него полигоны,
+    изменённые ищутся в небольшом индексе changes.
+    """
+
+    def __init__(self, snapshot: PackedPolygonIndex, changes: PolygonIndex, removed_ids):
+        self.snapshot = snapshot
+        self.changes = changes
+        self.removed_ids = np.asarray(removed_ids, dtype=np.int64)
+
+    def locate(self, x: np.ndarray, y: np.ndarray) -> list:
+        """
+        Возвращает для каждой точки (x[i], y[i]) список id содержащих её полигонов (граница включается).
+        """
+        point_indexes, ids = self.snapshot.locate_pairs(x, y)
+        actual = ~np.isin(ids, self.removed_ids)
+        changed_point_indexes, changed_ids = self.changes.locate_pairs(x, y)
+        return group_by_point(
+            len(x),
+            np.concatenate((point_indexes[actual], changed_point_indexes)),
+            np.concatenate((ids[actual], changed_ids)),
+        )
+
+
+class PolygonLocator:
+    """
+    Индекс полигонов в памяти процесса, обновляемый при изменении таблицы.
+
+    Версия данных проверяется не чаще раза в refresh_interval секунд. Пока индекс
+    обновляется одним запросом, остальные пользуются предыдущим.
+
+    Если задан snapshot_path, основа индекса - снимок из файла (manage.py build-index),
+    открытый через mmap: его страницы общие для всех процессов, а при обновлении
+    из таблицы читаются только полигоны, изменённые после снимка. Заменённый файл
+    снимка перечитывается. Без снимка индекс строится по всей таблице.
+    """
+
+    def __init__(self, refresh_interval: float = 0, snapshot_path: str = None):
+        self.refresh_interval = refresh_interval
+        self.snapshot_path = snapshot_path
+        self.index = None
+        self.version = None
+        self.snapshot = None
+        self.checked = None
+        self._snapshot_file = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.refresh_interval = app.config['LOCATOR_REFRESH_INTERVAL']
+        self.snapshot_path = app.config['LOCATOR_SNAPSHOT']
+
+    def get_index(self, load_version, load_polygons, load_changes):
+        """
+        Возвращает актуальный индекс (PolygonIndex или SnapshotIndex).
+
+        load_version() - версия данных, load_polygons() - итератор пар (id, shapely-геометрия)
+        всех полигонов, load_changes(version) - изменения после версии снимка: итератор пар
+        (id, shapely-геометрия) изменённых полигонов и id удалённых.
+        """
+        now = time.monotonic()
+        if self.index is not None and now - self.checked < self.refresh_interval:
+            return self.index
+
+        # индекс обновляет один поток; если индекс уже есть, остальные не ждут
+        if not self._lock.acquire(blocking=self.index is None):
+            return self.index
+        try:
+            if self.index is not None and time.monotonic() - self.checked < self.refresh_interval:
+                return self.index
+
+            version = load_version()
+            snapshot = self._get_snapshot()
+            if self.index is None or version != self.version or snapshot is not self.snapshot:
+                if snapshot is None:
+                    self.index = PolygonIndex(*_unzip(load_polygons()))
+                else:
+                    changed, deleted_ids = load_changes(snapshot.version)
+                    changed_ids, geometries = _unzip(changed)
+                    self.index = SnapshotIndex(
+                        snapshot, PolygonIndex(changed_ids, geometries), changed_ids + list(deleted_ids)
+                    )
+                self.version = version
+                self.snapshot = snapshot
+            self.checked = time.monotonic()
+            return self.index
+        finally:
+            self._lock.release()
+
+    def _get_snapshot(self):
+        """
+        Возвращает снимок из snapshot_path или None; файл перечитывается, если он заменён.
+        """
+        if not self.snapshot_path:
+            return None
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            if self._snapshot_file is not None or self.index is None:
+                logger.warning('index snapshot {0} not found, indexing the whole table'.format(self.snapshot_path))
+            self._snapshot_file = None
+            return None
+
+        key = stat.st_ino, stat.st_mtime_ns, stat.st_size
+        if self._snapshot_file is None or self._snapshot_file[0] != key:
+            self._snapshot_file = key, PackedPolygonIndex.load(self.snapshot_path)
+            logger.info('index snapshot {0} was loaded'.format(self.snapshot_path))
+        return self._snapshot_file[1]
+
+    def clear(self):
+        with self._lock:
+            self.index = None
+            self.version = None
+            self.snapshot = None
+            self.checked = None
+            self._snapshot_file = None
+
+
+def _unzip(pairs) -> tuple:
+    ids, geometries = [], []
+    for polygon_id, geometry in pairs:
+        ids.append(polygon_id)
+        geometries.append(geometry)
+    return ids, geometries
@@ -1,7 +1,25 @@
+import json
+import os
+import time
+from datetime import timedelta
+
 import click
+from flask import current_app
 from flask.cli import FlaskGroup
 
+from gis_polygon.api import locator_polygons, locator_version
 from gis_polygon.app import create_app
+from gis_polygon.benchmark import compare_results, run_benchmarks
+from gis_polygon.exporter import EXTENSIONS, export_table
+from gis_polygon.extensions import db
+from gis_polygon.importer import detect_format, import_file
+from gis_polygon.loadtest import (
+    PERCENTILES, WORKLOAD, PolygonPool, is_local_database, parse_mix, remove_polygons, run_workload, seed_polygons
+)
+from gis_polygon.schemas.polygon import get_projection_names
+from gis_polygon.snapshot import PackedPolygonIndex
+
+PROJECTION_CHOICES = get_projection_names()
 
 
 def create_server(information):
@@ -18,5 +36,188 @@ def cli():
     """
 
 
+@cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['auto', 'geojson', 'ndjson']), default='auto',
+              help='geojson - FeatureCollection, ndjson - фича на строке; auto - по расширению файла.')
+@click.option('--projection', type=click.Choice(PROJECTION_CHOICES), default='epsg:4326',
+              help='Проекция координат в файле.')
+@click.option('--workers', type=click.IntRange(min=1), default=os.cpu_count() or 1,
+              help='Число процессов для валидации и перепроецирования.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=5000, help='Число фич в одном COPY.')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False),
+              help='Файл контрольной точки, по умолчанию PATH.checkpoint.')
+@click.option('--resume', is_flag=True, help='Продолжить импорт с контрольной точки.')
+def import_polygons(path, file_format, projection, workers, batch_size, checkpoint_path, resume):
+    """
+    Импортирует полигоны из GeoJSON FeatureCollection или NDJSON файла.
+    """
+    if file_format == 'auto':
+        file_format = detect_format(path)
+
+    def progress(processed, rejected, elapsed):
+        click.echo('{0} features processed, {1} rejected, {2:.0f} features/s'.format(
+            processed, rejected, processed / elapsed if elapsed else 0
+        ))
+
+    connection = db.engine.raw_connection()
+    try:
+        processed, rejected = import_file(
+            connection, path, file_format, projection, workers, batch_size,
+            checkpoint_path or path + '.checkpoint', resume, progress
+        )
+    finally:
+        connection.close()
+
+    click.echo('import finished: {0} features processed, {1} rejected'.format(processed, rejected))
+
+
+@cli.command('export')
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(sorted(EXTENSIONS)), default='ndjson',
+              help='Формат файлов; flatgeobuf требует PostGIS >= 3.2.')
+@click.option('--projection', type=click.Choice(PROJECTION_CHOICES), default='epsg:4326',
+              help='Проекция координат в выгрузке.')
+@click.option('--workers', type=click.IntRange(min=1), default=os.cpu_count() or 1,
+              help='Число процессов выгрузки.')
+@click.option('--parts', type=click.IntRange(min=1), help='Число файлов (диапазонов id), по умолчанию 4 * workers.')
+@click.option('--class-id', 'class_ids', type=int, multiple=True, help='Выгрузить только полигоны этих классов.')
+@click.option('--edited-since', type=click.DateTime(), help='Выгрузить полигоны, изменённые начиная с даты.')
+@click.option('--edited-until', type=click.DateTime(), help='Выгрузить полигоны, изменённые до даты.')
+def export_polygons(output_dir, file_format, projection, workers, parts, class_ids, edited_since, edited_until):
+    """
+    Выгружает полигоны в OUTPUT_DIR файлами по диапазонам id.
+    """
+
+    def progress(path, count):
+        click.echo('{0}: {1} polygons'.format(path, count))
+
+    with db.engine.connect() as connection:
+        total = export_table(
+            connection, current_app.config['SQLALCHEMY_DATABASE_URI'], output_dir, file_format,
+            int(projection.split(':')[1]), current_app.config['GEOJSON_PRECISION'],
+            workers, parts or 4 * workers, class_ids, edited_since, edited_until, progress
+        )
+
+    click.echo('export finished: {0} polygons'.format(total))
+
+
+@cli.command('benchmark')
+@click.option('--size', type=click.IntRange(min=1), default=1000, help='Число синтетических полигонов.')
+@click.option('--vertices', type=click.IntRange(min=3), default=64, help='Число вершин полигона.')
+@click.option('--repeat', type=click.IntRange(min=1), default=5, help='Число серий замеров.')
+@click.option('--number', type=click.IntRange(min=0), default=0,
+              help='Число вызовов в серии; 0 - подобрать автоматически.')
+@click.option('-k', 'names', multiple=True, help='Выполнить только бенчмарки, имя которых содержит подстроку.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Сохранить результаты в JSON.')
+@click.option('--compare', 'baseline_path', type=click.Path(exists=True, dir_okay=False),
+              help='Сравнить с результатами из JSON; при регрессии код выхода 1.')
+@click.option('--threshold', type=float, default=1.2, help='Допустимое замедление медианы (во сколько раз).')
+def benchmark(size, vertices, repeat, number, names, output, baseline_path, threshold):
+    """
+    Замеряет схему, перепроецирование и API на синтетических полигонах без базы данных.
+    """
+
+    def progress(name, result):
+        click.echo('{0:<32} {1:>12.3f} ms'.format(name, result['median'] * 1000))
+
+    results = run_benchmarks(current_app, size, vertices, repeat, number, names, progress)
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        if (baseline['meta']['size'], baseline['meta']['vertices']) != (size, vertices):
+            click.echo('warning: baseline was measured with --size {0} --vertices {1}'.format(
+                baseline['meta']['size'], baseline['meta']['vertices']
+            ))
+
+        regressions = 0
+        for name, base, current, ratio, regressed in compare_results(baseline, results, threshold):
+            regressions += regressed
+            click.echo('{0:<32} {1:>12.3f} ms {2:>12.3f} ms {3:>7.2f}x{4}'.format(
+                name, base * 1000, current * 1000, ratio, ' REGRESSION' if regressed else ''
+            ))
+        if regressions:
+            raise click.ClickException('{0} benchmarks regressed'.format(regressions))
+
+
+@cli.command('loadtest')
+@click.option('--polygons', type=click.IntRange(min=1), default=10000, help='Число засеваемых полигонов.')
+@click.option('--vertices', type=click.IntRange(min=3), default=64, help='Число вершин полигона.')
+@click.option('--concurrency', type=click.IntRange(min=1), default=8, help='Число параллельных клиентов.')
+@click.option('--duration', type=click.FloatRange(min=0), default=30, help='Длительность нагрузки в секундах.')
+@click.option('--requests', type=click.IntRange(min=1), help='Число запросов (вместо --duration).')
+@click.option('--mix', default=','.join('{0}={1}'.format(name, weight) for name, weight in WORKLOAD),
+              show_default=True, help='Доли операций.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Сохранить сводку в JSON.')
+@click.option('--keep', is_flag=True, help='Не удалять полигоны нагрузочного теста после прогона.')
+@click.option('--allow-remote', is_flag=True, help='Разрешить запуск не на локальной базе данных.')
+def loadtest(polygons, vertices, concurrency, duration, requests, mix, output, keep, allow_remote):
+    """
+    Засевает синтетические полигоны и нагружает приложение смесью запросов.
+    """
+    if not allow_remote and not is_local_database(current_app.config['SQLALCHEMY_DATABASE_URI']):
+        raise click.ClickException('loadtest writes to the database; use a local one or pass --allow-remote')
+    try:
+        mix = parse_mix(mix)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--mix')
+
+    started = time.perf_counter()
+    ids = seed_polygons(polygons, vertices, current_app.config['BULK_BATCH_SIZE'])
+    click.echo('{0} polygons seeded in {1:.1f} s'.format(len(ids), time.perf_counter() - started))
+
+    try:
+        summary = run_workload(
+            current_app._get_current_object(), PolygonPool(ids), mix, concurrency, vertices,
+            duration=None if requests else duration, requests=requests
+        )
+    finally:
+        if not keep:
+            click.echo('{0} polygons removed'.format(remove_polygons()))
+
+    columns = ['p{0}'.format(percent) for percent in PERCENTILES] + ['max']
+    click.echo('{0:<14} {1:>8} {2:>7} {3:>9} {4}'.format(
+        'operation', 'count', 'errors', 'req/s', ' '.join('{0:>9}'.format(column + ' ms') for column in columns)
+    ))
+    for operation, result in summary['operations'].items():
+        click.echo('{0:<14} {1:>8} {2:>7} {3:>9.1f} {4}'.format(
+            operation, result['count'], result['errors'], result['rps'],
+            ' '.join('{0:>9.1f}'.format(result[column]) for column in columns)
+        ))
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(summary, file, indent=2)
+
+
+@cli.command('build-index')
+@click.option('--output', type=click.Path(dir_okay=False), help='Файл снимка, по умолчанию LOCATOR_SNAPSHOT.')
+def build_index(output):
+    """
+    Записывает снимок пространственного индекса полигонов для POST /api/polygon/locate.
+
+    Процессы приложения открывают снимок через mmap и дочитывают из таблицы только изменения после него.
+    """
+    output = output or current_app.config['LOCATOR_SNAPSHOT']
+    if not output:
+        raise click.UsageError('pass --output or set LOCATOR_SNAPSHOT')
+
+    started = time.perf_counter()
+    # версия снимка берётся до чтения таблицы и с запасом CHANGES_DELAY: изменения незавершённых
+    # транзакций процессы дочитают из таблицы
+    delay = timedelta(seconds=current_app.config['CHANGES_DELAY'])
+    version = tuple(value - delay if value is not None else None for value in locator_version())
+    index = PackedPolygonIndex.build(locator_polygons(), version)
+    index.save(output)
+    click.echo('{0} polygons indexed in {1:.1f} s: {2} ({3:.1f} MB)'.format(
+        len(index), time.perf_counter() - started, output, os.path.getsize(output) / 1024 / 1024
+    ))
+
+
 if __name__ == '__main__':
     cli()
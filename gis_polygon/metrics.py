@@ -0,0 +1,177 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+ROWS_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    Добавляет время выполнения блока к фазе phase текущего запроса.
+
+    Вне запроса (импорт, выгрузка) ничего не делает.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - start)
+
+
+def add_timing(phase: str, seconds: float):
+    if has_request_context() and 'timings' in g:
+        g.timings[phase] = g.timings.get(phase, 0) + seconds
+
+
+def record_rows(count: int):
+    """
+    Запоминает число полигонов, отданных или записанных текущим запросом.
+    """
+    if has_request_context():
+        g.rows = count
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('query_start', None)
+    if start is not None:
+        add_timing('db', time.perf_counter() - start)
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus с метками.
+    """
+
+    def __init__(self, name: str, description: str, buckets: tuple, labels: tuple):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self) -> list:
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.description),
+            '# TYPE {0} histogram'.format(self.name),
+        ]
+        with self._lock:
+            for label_values, series in sorted(self._values.items()):
+                labels = list(zip(self.labels, label_values))
+                for bucket, bucket_count in zip(self.buckets, series['buckets']):
+                    lines.append(self._line('_bucket', labels + [('le', repr(float(bucket)))], bucket_count))
+                lines.append(self._line('_bucket', labels + [('le', '+Inf')], series['count']))
+                lines.append(self._line('_sum', labels, series['sum']))
+                lines.append(self._line('_count', labels, series['count']))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _line(self, suffix: str, labels: list, value) -> str:
+        labels = ','.join('{0}="{1}"'.format(name, _escape(label)) for name, label in labels)
+        return '{0}{1}{{{2}}} {3}'.format(self.name, suffix, labels, value)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    Замеры запросов: время фаз (db, serialize, reproject, encode, ...) в заголовке
+    Server-Timing и гистограммы в формате Prometheus на /metrics.
+
+    Для потоковых ответов замеряется только время до начала отдачи тела.
+    """
+
+    def __init__(self):
+        self.server_timing = True
+        self.duration = Histogram(
+            'gis_polygon_request_duration_seconds', 'Request latency.',
+            DURATION_BUCKETS, ('method', 'endpoint', 'status')
+        )
+        self.phase_duration = Histogram(
+            'gis_polygon_request_phase_seconds', 'Time spent in a request phase.',
+            DURATION_BUCKETS, ('endpoint', 'phase')
+        )
+        self.response_size = Histogram(
+            'gis_polygon_response_size_bytes', 'Response body size on the wire.',
+            SIZE_BUCKETS, ('endpoint',)
+        )
+        self.rows = Histogram(
+            'gis_polygon_request_rows', 'Polygons returned or written per request.',
+            ROWS_BUCKETS, ('endpoint',)
+        )
+
+    def init_app(self, app):
+        self.server_timing = app.config['SERVER_TIMING']
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.add_url_rule('/metrics', 'metrics', self.render_response)
+
+    def start(self):
+        g.request_start = time.perf_counter()
+        g.timings = {}
+
+    def finish(self, response):
+        if 'request_start' not in g or request.endpoint == 'metrics':
+            return response
+
+        duration = time.perf_counter() - g.request_start
+        endpoint = request.url_rule.rule if request.url_rule else 'none'
+        self.duration.observe(duration, request.method, endpoint, str(response.status_code))
+        for phase, seconds in g.timings.items():
+            self.phase_duration.observe(seconds, endpoint, phase)
+        if response.content_length is not None:
+            self.response_size.observe(response.content_length, endpoint)
+        if 'rows' in g:
+            self.rows.observe(g.rows, endpoint)
+
+        if self.server_timing:
+            timings = list(g.timings.items()) + [('total', duration)]
+            response.headers['Server-Timing'] = ', '.join(
+                '{0};dur={1:.2f}'.format(phase, seconds * 1000) for phase, seconds in timings
+            )
+        return response
+
+    def render(self) -> str:
+        lines = []
+        for histogram in (self.duration, self.phase_duration, self.response_size, self.rows):
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+    def render_response(self) -> Response:
+        return Response(self.render(), mimetype=PROMETHEUS_MIMETYPE)
+
+    def clear(self):
+        for histogram in (self.duration, self.phase_duration, self.response_size, self.rows):
+            histogram.clear()
@@ -1,13 +1,407 @@
+from flask_sqlalchemy import BaseQuery
 from geoalchemy2 import Geometry
+from geoalchemy2.shape import from_shape
+from sqlalchemy.dialects.postgresql import JSONB
 
 from gis_polygon.extensions import db
 
+# допуски упрощения в градусах, от точного к грубому; должны совпадать с триггером миграции 3
+SIMPLIFIED_TOLERANCES = (
+    ('geom_simplified_1', 0.0001),
+    ('geom_simplified_2', 0.001),
+    ('geom_simplified_3', 0.01),
+)
+
+# вид изменения в курсоре ленты изменений; при равном времени изменения идут раньше удалений
+CHANGE_EDITED = 0
+CHANGE_DELETED = 1
+
+
+class PolygonQuery(BaseQuery):
+    """
+    Запросы к таблице полигонов.
+    """
+
+    def after(self, polygon_id=None):
+        """
+        Возвращает полигоны, упорядоченные по id и следующие за polygon_id.
+
+        Keyset-пагинация: глубина страницы не влияет на стоимость запроса,
+        в отличие от OFFSET.
+        """
+        query = self.order_by(GisPolygon.id)
+        if polygon_id is not None:
+            query = query.filter(GisPolygon.id > polygon_id)
+        return query
+
+    def by_id(self, polygon_id: int):
+        return self.filter(GisPolygon.id == polygon_id)
+
+    def by_ids(self, polygon_ids):
+        return self.filter(GisPolygon.id.in_(polygon_ids))
+
+    def bounds(self) -> dict:
+        """
+        Возвращает {id: bbox (minx, miny, maxx, maxy)} полигонов выборки.
+
+        bbox берётся из производной колонки bbox, geom не читается.
+        """
+        bbox = GisPolygon.bbox
+        rows = self.with_entities(
+            GisPolygon.id,
+            db.func.ST_XMin(bbox), db.func.ST_YMin(bbox), db.func.ST_XMax(bbox), db.func.ST_YMax(bbox),
+        ).order_by(None)
+        return {polygon_id: tuple(bounds) if bounds[0] is not None else None for polygon_id, *bounds in rows}
+
+    def version(self) -> tuple:
+        """
+        Возвращает версию выборки: (число полигонов, максимальный _edited).
+        """
+        return self.with_entities(db.func.count(GisPolygon.id), db.func.max(GisPolygon._edited)) \
+            .order_by(None) \
+            .one()
+
+    def last_edited(self):
+        """
+        Возвращает максимальный _edited выборки (None для пустой).
+        """
+        return self.with_entities(db.func.max(GisPolygon._edited)).order_by(None).scalar()
+
+    def in_bbox(self, bbox, srid: int):
+        """
+        Возвращает полигоны, чей bbox пересекается с bbox (minx, miny, maxx, maxy).
+
+        Фильтр компилируется в оператор && и использует GiST-индекс по geom.
+        """
+        envelope = _to_column_srid(db.func.ST_MakeEnvelope(*bbox, srid), srid)
+        return self.filter(GisPolygon.geom.intersects(envelope))
+
+    def intersecting(self, geometry, srid: int):
+        """
+        Возвращает полигоны, пересекающиеся с shapely-геометрией geometry.
+        """
+        geom = _to_column_srid(from_shape(geometry, srid=srid), srid)
+        return self.filter(db.func.ST_Intersects(GisPolygon.geom, geom))
+
+    def nearest(self, point, srid: int, limit: int):
+        """
+        Возвращает limit ближайших к shapely-точке point полигонов по возрастанию расстояния,
+        расстояние в метрах (по сфере) загружается в distance.
+
+        Строки упорядочиваются KNN-оператором <-> над geography по GiST-индексу geography(geom)
+        (миграция 7): порядок сразу в метрах, поэтому найденные полигоны - действительно ближайшие,
+        и вся таблица не просматривается. Дополнительный ключ сортировки (id) отключил бы
+        KNN-обход индекса, поэтому порядок полигонов на равном расстоянии не определён.
+        """
+        # WKBElement встраивается как ST_GeomFromWKB(wkb, srid): значением параметра его не передать
+        geom = _to_column_srid(from_shape(point, srid=srid), srid)
+        distance = db.func.geography(GisPolygon.geom).op('<->', return_type=db.Float)(db.func.geography(geom))
+        return self.options(db.with_expression(GisPolygon.distance, distance)) \
+            .order_by(distance) \
+            .limit(limit)
+
+    def projected(self, srid: int, geom_column=None):
+        """
+        Загружает в projected_geom геометрию из geom_column (по умолчанию geom),
+        перепроецированную в srid средствами PostGIS.
+        """
+        if geom_column is None or geom_column is GisPolygon.geom:
+            if srid == GisPolygon.geom.type.srid:
+                return self
+            geom_column = GisPolygon.geom
+
+        geom = geom_column
+        if srid != GisPolygon.geom.type.srid:
+            geom = db.func.ST_Transform(geom, srid)
+
+        # сериализуется только projected_geom, исходная geom не читается
+        return self.options(db.with_expression(GisPolygon.projected_geom, geom), db.defer(GisPolygon.geom))
+
+    def as_geojson(self, srid: int, precision: int, geom_column=None):
+        """
+        Загружает в geom_geojson текст ST_AsGeoJSON геометрии из geom_column
+        (по умолчанию geom) в проекции srid.
+
+        Сама колонка geom не читается.
+        """
+        geom = geom_column if geom_column is not None else GisPolygon.geom
+        if srid != GisPolygon.geom.type.srid:
+            geom = db.func.ST_Transform(geom, srid)
+        return self.options(
+            db.defer(GisPolygon.geom),
+            db.with_expression(GisPolygon.geom_geojson, db.func.ST_AsGeoJSON(geom, precision))
+        )
+
+    def mvt(self, bounds, extent: int, buffer: int) -> bytes:
+        """
+        Возвращает Mapbox Vector Tile с полигонами в границах тайла bounds (EPSG:3857).
+        """
+        envelope = db.func.ST_MakeEnvelope(*bounds, 3857)
+        features = self.in_bbox(bounds, 3857).with_entities(
+            GisPolygon.id,
+            GisPolygon.class_id,
+            GisPolygon.name,
+            db.func.ST_AsMVTGeom(
+                db.func.ST_Transform(GisPolygon.geom, 3857), envelope, extent, buffer, True
+            ).label('geom'),
+        ).subquery('tile')
+        tile = self.session.query(
+            db.func.ST_AsMVT(db.literal_column('tile'), 'polygons', extent, 'geom', type_=db.LargeBinary)
+        ).select_from(features).scalar()
+        return bytes(tile or b'')
+
+    def only_fields(self, *attributes):
+        """
+        Откладывает загрузку всех колонок полигона, кроме первичного ключа и attributes.
+        """
+        return self.options(*[
+            db.defer(getattr(GisPolygon, column.key))
+            for column in GisPolygon.__table__.columns
+            if not column.primary_key and column.key not in attributes
+        ])
+
+    def sorted_after(self, attribute: str, descending=False, cursor=None):
+        """
+        Возвращает полигоны, упорядоченные по колонке attribute (при равенстве - по id).
+
+        cursor - (значение attribute, id) последнего полигона предыдущей страницы.
+        NULL (полигоны без geom) больше любого значения, как в индексе (attribute, id):
+        такие полигоны идут в конце по возрастанию и в начале по убыванию.
+        С курсором возвращается только сегмент курсора (значения или NULL) - одним условием
+        по индексу; следующий сегмент возвращает sorted_segments.
+        """
+        column = getattr(GisPolygon, attribute)
+        if descending:
+            query = self.order_by(column.desc().nullsfirst(), GisPolygon.id.desc())
+        else:
+            query = self.order_by(column.asc().nullslast(), GisPolygon.id)
+
+        if cursor is None:
+            return query
+
+        value, polygon_id = cursor
+        if value is None:
+            after_id = GisPolygon.id < polygon_id if descending else GisPolygon.id > polygon_id
+            return query.filter(column.is_(None), after_id)
+
+        key = db.tuple_(column, GisPolygon.id)
+        # сравнение кортежей с NULL не выполняется, поэтому полигоны с NULL сюда не попадают
+        return query.filter(key < (value, polygon_id) if descending else key > (value, polygon_id))
+
+    def sorted_segments(self, attribute: str, descending=False, cursor=None) -> list:
+        """
+        Возвращает запросы sorted_after, которые по очереди продолжают выдачу после cursor.
+
+        Без курсора - один запрос по всей выборке. С курсором - сегмент курсора и, если за ним
+        есть другой (NULL после значений по возрастанию, значения после NULL по убыванию), этот сегмент целиком.
+        """
+        segments = [self.sorted_after(attribute, descending, cursor)]
+        if cursor is not None and (cursor[0] is None) == descending:
+            column = getattr(GisPolygon, attribute)
+            rest = column.isnot(None) if descending else column.is_(None)
+            segments.append(self.sorted_after(attribute, descending).filter(rest))
+        return segments
+
+    def of_class(self, class_id: int):
+        return self.filter(GisPolygon.class_id == class_id)
+
+    def with_props(self, document: dict):
+        """
+        Возвращает полигоны, props которых содержат document (props @> document, GIN-индекс по props).
+        """
+        return self.filter(GisPolygon.props.contains(document))
+
+    def area_between(self, min_area=None, max_area=None):
+        """
+        Возвращает полигоны с площадью (м²) в заданных границах.
+        """
+        query = self
+        if min_area is not None:
+            query = query.filter(GisPolygon.area >= min_area)
+        if max_area is not None:
+            query = query.filter(GisPolygon.area <= max_area)
+        return query
+
+    def centroid_in_bbox(self, bbox, srid: int):
+        """
+        Возвращает полигоны, центроид которых лежит в bbox (minx, miny, maxx, maxy) в проекции srid.
+        """
+        envelope = _to_column_srid(db.func.ST_MakeEnvelope(*bbox, srid), srid)
+        return self.filter(db.func.ST_Intersects(GisPolygon.centroid, envelope))
+
+    def changed_after(self, cursor=None, until=None):
+        """
+        Возвращает полигоны, созданные или изменённые после курсора ленты изменений
+        (_edited, вид изменения, id), в порядке (_edited, id).
+
+        until ограничивает ленту сверху, чтобы не отдавать изменения ещё не завершённых транзакций.
+        """
+        query = self.order_by(GisPolygon._edited, GisPolygon.id)
+        if cursor is not None:
+            edited, kind, polygon_id = cursor
+            if kind == CHANGE_EDITED:
+                query = query.filter(db.tuple_(GisPolygon._edited, GisPolygon.id) > (edited, polygon_id))
+            else:
+                query = query.filter(GisPolygon._edited > edited)
+        if until is not None:
+            query = query.filter(GisPolygon._edited <= until)
+        return query
+
+    def stream(self, batch_size: int):
+        """
+        Возвращает итератор по полигонам, упорядоченным по id.
+
+        Строки читаются серверным курсором пачками по batch_size,
+        поэтому память не зависит от размера таблицы.
+        """
+        return self.order_by(GisPolygon.id).yield_per(batch_size)
+
 
 class GisPolygon(db.Model):
+    query_class = PolygonQuery
+
     _created = db.Column(db.DateTime, nullable=False, default=db.text("now()"))
-    _edited = db.Column(db.DateTime, nullable=False, default=db.text("now()"))
+    _edited = db.Column(db.DateTime, nullable=False, default=db.text("now()"), index=True)
     id = db.Column(db.Integer, db.Sequence('gis_polygon_id_seq'), primary_key=True)
     class_id = db.Column(db.Integer)
     name = db.Column(db.VARCHAR)
-    props = db.Column(db.JSON)
+    props = db.Column(JSONB)
     geom = db.Column(Geometry("POLYGON", 4326))
+
+    # упрощённые копии geom (ST_SimplifyPreserveTopology с допуском из SIMPLIFIED_TOLERANCES),
+    # заполняются триггером базы данных при вставке и изменении geom
+    geom_simplified_1 = db.deferred(db.Column(Geometry("POLYGON", 4326, spatial_index=False)))
+    geom_simplified_2 = db.deferred(db.Column(Geometry("POLYGON", 4326, spatial_index=False)))
+    geom_simplified_3 = db.deferred(db.Column(Geometry("POLYGON", 4326, spatial_index=False)))
+
+    # производные от geom значения для фильтров и сортировки, заполняются триггером базы данных
+    area = db.Column(db.Float)  # площадь в м²
+    vertex_count = db.Column(db.Integer)
+    bbox = db.deferred(db.Column(Geometry("GEOMETRY", 4326, spatial_index=False)))
+    centroid = db.deferred(db.Column(Geometry("POINT", 4326)))
+
+    @classmethod
+    def simplified_column(cls, tolerance: float):
+        """
+        Возвращает колонку с самым грубым упрощением, допуск которого не больше tolerance (в градусах).
+        """
+        column = cls.geom
+        for column_name, level_tolerance in SIMPLIFIED_TOLERANCES:
+            if level_tolerance <= tolerance:
+                column = getattr(cls, column_name)
+        return column
+
+    @classmethod
+    def insert_many(cls, polygons, batch_size: int) -> list:
+        """
+        Вставляет полигоны многострочными INSERT по batch_size строк.
+
+        Возвращает id в порядке полигонов. Транзакция не фиксируется.
+        """
+        table = cls.__table__
+        sequence = table.c.id.default
+        ids = []
+        for start in range(0, len(polygons), batch_size):
+            batch = polygons[start:start + batch_size]
+            # id берутся из последовательности заранее: порядок строк RETURNING у многострочного VALUES
+            # не гарантирован, поэтому сопоставлять его с полигонами по позиции нельзя
+            batch_ids = [
+                row[0] for row in db.session.execute(
+                    db.select([sequence.next_value()]).select_from(db.func.generate_series(1, len(batch)))
+                )
+            ]
+            db.session.execute(table.insert().values([
+                {
+                    'id': polygon_id,
+                    'class_id': polygon.class_id,
+                    'name': polygon.name,
+                    'props': polygon.props,
+                    'geom': polygon.geom,
+                }
+                for polygon_id, polygon in zip(batch_ids, batch)
+            ]))
+            ids.extend(batch_ids)
+        return ids
+
+    @classmethod
+    def update_many(cls, updates):
+        """
+        Изменяет полигоны: updates - пары (id, {колонка: значение}).
+
+        В UPDATE попадают только переданные колонки, остальные (в том числе geom) не перезаписываются.
+        Полигоны с одинаковым набором колонок изменяются одним executemany. Транзакция не фиксируется.
+        """
+        table = cls.__table__
+        groups = {}
+        for polygon_id, values in updates:
+            row = dict(values, _polygon_id=polygon_id)
+            if 'geom' in row:
+                # psycopg2 не адаптирует WKBElement: geom передаётся как WKB и srid
+                geom = row.pop('geom')
+                row['_geom'] = None if geom is None else bytes(geom.data)
+                row['_geom_srid'] = None if geom is None else geom.srid
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        for columns, rows in groups.items():
+            # остальные колонки SET берутся из ключей параметров
+            statement = table.update().where(table.c.id == db.bindparam('_polygon_id'))
+            if '_geom' in columns:
+                statement = statement.values(geom=db.func.ST_GeomFromWKB(
+                    db.bindparam('_geom', type_=db.LargeBinary), db.bindparam('_geom_srid', type_=db.Integer)
+                ))
+            db.session.execute(statement, rows)
+
+    # geom в проекции запроса, загружается только через PolygonQuery.projected
+    projected_geom = db.query_expression()
+    # GeoJSON-текст geom, загружается только через PolygonQuery.as_geojson
+    geom_geojson = db.query_expression()
+    # расстояние до точки в метрах, загружается только через PolygonQuery.nearest
+    distance = db.query_expression()
+
+
+class DeletedPolygonQuery(BaseQuery):
+    """
+    Запросы к журналу удалений полигонов.
+    """
+
+    def changed_after(self, cursor=None, until=None):
+        """
+        Возвращает удаления после курсора ленты изменений в порядке (_deleted, polygon_id).
+        """
+        query = self.order_by(GisPolygonDeleted._deleted, GisPolygonDeleted.polygon_id)
+        if cursor is not None:
+            edited, kind, polygon_id = cursor
+            if kind == CHANGE_DELETED:
+                query = query.filter(
+                    db.tuple_(GisPolygonDeleted._deleted, GisPolygonDeleted.polygon_id) > (edited, polygon_id)
+                )
+            else:
+                query = query.filter(GisPolygonDeleted._deleted >= edited)
+        if until is not None:
+            query = query.filter(GisPolygonDeleted._deleted <= until)
+        return query
+
+    def last_deleted(self):
+        """
+        Возвращает время последнего удаления (None, если удалений не было).
+        """
+        return self.with_entities(db.func.max(GisPolygonDeleted._deleted)).order_by(None).scalar()
+
+
+class GisPolygonDeleted(db.Model):
+    """
+    Журнал удалений полигонов для ленты изменений, заполняется триггером базы данных.
+    """
+    query_class = DeletedPolygonQuery
+
+    polygon_id = db.Column(db.Integer, primary_key=True)
+    _deleted = db.Column(db.DateTime, nullable=False, default=db.text("now()"), index=True)
+
+
+def _to_column_srid(geom, srid: int):
+    """
+    Приводит геометрию к SRID колонки geom, если он отличается.
+    """
+    column_srid = GisPolygon.geom.type.srid
+    if srid == column_srid:
+        return geom
+    return db.func.ST_Transform(geom, column_srid)
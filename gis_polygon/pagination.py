@@ -0,0 +1,68 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from datetime import datetime
+
+
+def encode_cursor(polygon_id: int) -> str:
+    """
+    Кодирует id последнего полигона страницы в непрозрачный курсор.
+    """
+    return urlsafe_b64encode(str(polygon_id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Декодирует курсор в id полигона.
+
+    Выбрасывает ValueError, если курсор некорректен.
+    """
+    try:
+        return int(urlsafe_b64decode(cursor.encode()).decode())
+    except (DecodeError, UnicodeError) as e:
+        raise ValueError(cursor) from e
+
+
+def encode_change_cursor(edited: datetime, kind: int, polygon_id: int) -> str:
+    """
+    Кодирует позицию в ленте изменений (время изменения, вид изменения, id полигона) в непрозрачный курсор.
+    """
+    return urlsafe_b64encode('{0}|{1}|{2}'.format(edited.isoformat(), kind, polygon_id).encode()).decode()
+
+
+def decode_change_cursor(cursor: str) -> tuple:
+    """
+    Декодирует курсор ленты изменений в (время изменения, вид изменения, id полигона).
+
+    Выбрасывает ValueError, если курсор некорректен.
+    """
+    try:
+        edited, kind, polygon_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(edited), int(kind), int(polygon_id)
+    except (DecodeError, UnicodeError) as e:
+        raise ValueError(cursor) from e
+
+
+def encode_sort_cursor(value, polygon_id: int) -> str:
+    """
+    Кодирует значение колонки сортировки и id последнего полигона страницы в непрозрачный курсор.
+
+    value равно None у полигонов без geom (производные колонки NULL).
+    """
+    return urlsafe_b64encode(json.dumps([value, polygon_id]).encode()).decode()
+
+
+def decode_sort_cursor(cursor: str) -> tuple:
+    """
+    Декодирует курсор страницы с ?sort= в (значение колонки сортировки, id полигона).
+
+    Выбрасывает ValueError, если курсор некорректен.
+    """
+    try:
+        value, polygon_id = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+    except (DecodeError, UnicodeError, TypeError) as e:
+        raise ValueError(cursor) from e
+
+    if value is not None and not isinstance(value, (int, float)) or not isinstance(polygon_id, int):
+        raise ValueError(cursor)
+    return value, polygon_id
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+import numpy as np
+import pyproj
+from shapely.geometry import Polygon
+from shapely.ops import transform
+
+from gis_polygon.metrics import timed
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source: str, target: str) -> pyproj.Transformer:
+    """
+    Возвращает преобразователь координат из source в target.
+
+    Преобразователи кешируются на весь процесс: создание pyproj-объектов
+    дорогое, а пар проекций немного.
+    """
+    return pyproj.Transformer.from_crs(source, target, always_xy=True)
+
+
+def transform_geometry(geometry, source: str, target: str):
+    """
+    Перепроецирует shapely-геометрию из source в target.
+    """
+    return transform_geometries([geometry], source, target)[0]
+
+
+def transform_geometries(geometries, source: str, target: str) -> list:
+    """
+    Перепроецирует список shapely-геометрий из source в target.
+
+    Координаты всех колец полигонов собираются в один массив NumPy
+    и перепроецируются одним вызовом pyproj.
+    """
+    source, target = source.lower(), target.lower()
+    if source == target:
+        return list(geometries)
+
+    with timed('reproject'):
+        return _transform_geometries(geometries, get_transformer(source, target))
+
+
+def _transform_geometries(geometries, transformer) -> list:
+    rings = []
+    for geometry in geometries:
+        if isinstance(geometry, Polygon) and not geometry.is_empty:
+            rings.append(np.asarray(geometry.exterior.coords)[:, :2])
+            rings.extend(np.asarray(interior.coords)[:, :2] for interior in geometry.interiors)
+
+    if rings:
+        coords = np.concatenate(rings)
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        offsets = np.cumsum([len(ring) for ring in rings])[:-1]
+        rings = np.split(np.column_stack((x, y)), offsets)
+
+    transformed = []
+    ring_index = 0
+    for geometry in geometries:
+        if isinstance(geometry, Polygon) and not geometry.is_empty:
+            rings_count = 1 + len(geometry.interiors)
+            exterior, *interiors = rings[ring_index:ring_index + rings_count]
+            ring_index += rings_count
+            transformed.append(Polygon(exterior, interiors))
+        else:
+            transformed.append(transform(transformer.transform, geometry))
+    return transformed
@@ -0,0 +1,37 @@
+import json
+
+from flask import Response
+
+
+def embed_raw(data: dict, key: str, raw) -> str:
+    """
+    Кодирует data в JSON и добавляет ключ key с готовым JSON-текстом raw.
+
+    raw вставляется в ответ как есть, без разбора и повторного кодирования.
+    """
+    raw = raw if raw is not None else 'null'
+    encoded = json.dumps(data)
+    if encoded == '{}':
+        return '{{{0}: {1}}}'.format(json.dumps(key), raw)
+    return '{0}, {1}: {2}}}'.format(encoded[:-1], json.dumps(key), raw)
+
+
+def dump_raw_polygon(schema, polygon, **extra) -> str:
+    """
+    Сериализует полигон, подставляя geom из ST_AsGeoJSON и дополнительные ключи extra.
+
+    Схема должна исключать geom.
+    """
+    return embed_raw(dict(schema.dump(polygon).data, **extra), 'geom', polygon.geom_geojson)
+
+
+def raw_polygon_response(schema, polygon) -> Response:
+    return Response(dump_raw_polygon(schema, polygon), mimetype='application/json')
+
+
+def raw_polygons_response(schema, polygons, **extra) -> Response:
+    """
+    Возвращает список полигонов в конверте {"polygons": [...]} и дополнительные ключи extra.
+    """
+    polygons = '[{0}]'.format(', '.join(dump_raw_polygon(schema, polygon) for polygon in polygons))
+    return Response(embed_raw(extra, 'polygons', polygons), mimetype='application/json')
@@ -5,7 +5,16 @@ from flask import current_app
 from geoalchemy2 import WKBElement
 from geoalchemy2.shape import to_shape, from_shape
 from marshmallow import fields
-from shapely.geometry import shape
+from shapely.geometry import mapping, shape
+
+
+def round_coordinates(coordinates, precision: int):
+    """
+    Округляет координаты GeoJSON-геометрии до precision знаков после запятой.
+    """
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(coordinate, precision) for coordinate in coordinates]
+    return [round_coordinates(item, precision) for item in coordinates]
 
 
 class GeomSchemaField(fields.Field):
@@ -18,8 +27,16 @@ class GeomSchemaField(fields.Field):
     }
 
     def _serialize(self, value: WKBElement, attr: str, obj, **kwargs):
+        """
+        Координаты округляются до context['precision'] знаков, если он задан в схеме.
+        """
+        geometry = mapping(to_shape(value))
+        precision = self.context.get('precision')
+        if precision is not None:
+            geometry['coordinates'] = round_coordinates(geometry['coordinates'], precision)
+
         try:
-            serialized = json.loads(geojson.dumps(to_shape(value)))
+            serialized = json.loads(geojson.dumps(geometry))
         except ValueError:
             return None
         return serialized
@@ -1,14 +1,11 @@
-import pyproj
-from functools import partial
-
-from flask import request
+from flask import current_app, request
 from flask_restful import abort
 from geoalchemy2.shape import to_shape, from_shape
 from marshmallow import fields, post_load, pre_dump, post_dump
-from shapely.ops import transform
 
 from gis_polygon.extensions import ma
 from gis_polygon.models import GisPolygon
+from gis_polygon.projections import transform_geometries, transform_geometry
 from gis_polygon.schemas.custom_schema_fields import GeomSchemaField
 
 GIS_PROJECTIONS = {
@@ -16,6 +13,62 @@ GIS_PROJECTIONS = {
 }
 
 
+def get_projection_names() -> list:
+    """
+    Возвращает допустимые значения ?projection= в нижнем регистре.
+    """
+    return sorted(
+        '{0}:{1}'.format(name.lower(), value) for name, values in GIS_PROJECTIONS.items() for value in values
+    )
+
+
+def get_projection(args):
+    """
+    Возвращает проекцию из аргументов.
+    """
+
+    if args and args.get('projection'):
+        try:
+            projection_name, projection_value = args.get('projection').lower().split(':')
+        except ValueError:
+            abort(400, error='incorrect projection')
+            return
+
+        gis_projection = GIS_PROJECTIONS.get(projection_name.upper())
+        if gis_projection and projection_value in gis_projection:
+            return args.get('projection')
+
+        abort(400, error='incorrect projection')
+
+
+def get_projection_srid(args) -> int:
+    """
+    Возвращает SRID проекции из аргументов или SRID по умолчанию.
+    """
+    projection = get_projection(args)
+    if projection:
+        return int(projection.split(':')[1])
+    return current_app.config['DEFAULT_SRID']
+
+
+def get_precision(args) -> int:
+    """
+    Возвращает число знаков после запятой в координатах из ?precision= или значение по умолчанию.
+    """
+    if not args or 'precision' not in args:
+        return current_app.config['GEOJSON_PRECISION']
+
+    try:
+        precision = int(args.get('precision'))
+    except ValueError:
+        abort(400, error='incorrect precision')
+        return
+
+    if not 0 <= precision <= current_app.config['MAX_GEOJSON_PRECISION']:
+        abort(400, error='incorrect precision')
+    return precision
+
+
 class PolygonSchema(ma.ModelSchema):
     """
     Схема полигона для валидации, сериализации, десериализации.
@@ -29,45 +82,51 @@ class PolygonSchema(ma.ModelSchema):
     geom = GeomSchemaField(required=True)
     props = ma.Raw(allow_none=True)
 
-    def _get_projection(self, args):
-        """
-        Возвращает проекцию из аргументов.
+    @post_load
+    def make_polygon(self, polygon):
+        user_projection = get_projection(request.args)
+        # при частичном изменении geom может не быть
+        if user_projection and polygon.geom is not None:
+            geometry = transform_geometry(to_shape(polygon.geom), user_projection, 'epsg:4326')
+            polygon.geom = from_shape(geometry, srid=current_app.config['DEFAULT_SRID'])
+
+    @pre_dump(pass_many=True)
+    def dump_polygon(self, polygons, many):
         """
+        Перепроецирует геометрию, которую не перепроецировала база данных.
 
-        if args and args.get('projection'):
-            try:
-                projection_name, projection_value = args.get('projection').lower().split(':')
-            except ValueError:
-                abort(400, error='incorrect projection')
-                return
+        Результат складывается в контекст схемы, модели не изменяются.
+        Там же - точность координат для GeomSchemaField.
+        """
+        self.context['projected_geoms'] = {}
+        self.context['precision'] = get_precision(request.args)
+        user_projection = get_projection(request.args)
+        if user_projection and 'geom' in self.fields:
+            polygons_list = [
+                polygon for polygon in (polygons if many else [polygons])
+                if getattr(polygon, 'projected_geom', None) is None
+            ]
+            geometries = transform_geometries(
+                [to_shape(polygon.geom) for polygon in polygons_list],
+                'epsg:4326',
+                user_projection
+            )
+            self.context['projected_geoms'] = {
+                id(polygon): from_shape(geometry) for polygon, geometry in zip(polygons_list, geometries)
+            }
+        return polygons
 
-            gis_projection = GIS_PROJECTIONS.get(projection_name.upper())
-            if gis_projection and projection_value in gis_projection:
-                return args.get('projection')
+    def get_attribute(self, attr, obj, default):
+        if attr == 'geom':
+            projected_geom = getattr(obj, 'projected_geom', None)
+            if projected_geom is not None:
+                return projected_geom
 
-            abort(400, error='incorrect projection')
+            projected_geom = self.context.get('projected_geoms', {}).get(id(obj))
+            if projected_geom is not None:
+                return projected_geom
 
-    @post_load
-    def make_polygon(self, polygon):
-        user_projection = self._get_projection(request.args)
-        if user_projection:
-            project = partial(
-                pyproj.transform,
-                pyproj.Proj(init=user_projection),
-                pyproj.Proj(init='epsg:4326')
-            )
-            polygon.geom = from_shape(transform(project, to_shape(polygon.geom)))
-
-    @pre_dump
-    def dump_polygon(self, polygon):
-        user_projection = self._get_projection(request.args)
-        if user_projection:
-            project = partial(
-                pyproj.transform,
-                pyproj.Proj(init='epsg:4326'),
-                pyproj.Proj(init=user_projection)
-            )
-            polygon.geom = from_shape(transform(project, to_shape(polygon.geom)))
+        return super().get_attribute(attr, obj, default)
 
     @post_dump(pass_many=True)
     def dump_polygons(self, polygons, is_collection):
@@ -0,0 +1,273 @@
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b'GISPIDX1'
+# число потомков узла R-дерева
+NODE_CAPACITY = 16
+# точек за один обход дерева и рёбер за одну точную проверку: ограничивают память на временные массивы
+POINTS_PER_CHUNK = 1 << 16
+EDGES_PER_CHUNK = 1 << 20
+ALIGNMENT = 8
+
+
+def concat_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Возвращает склеенные диапазоны [starts[i], starts[i] + counts[i]) без цикла Python.
+    """
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+
+
+class PackedPolygonIndex:
+    """
+    Индекс полигонов в плоских массивах NumPy, которые сохраняются в файл и читаются через mmap.
+
+    Массивы (полигоны в порядке STR - Sort-Tile-Recursive):
+    ids, bounds - id и bbox полигонов;
+    coords - координаты колец, после каждого кольца строка NaN;
+    ring_offsets - начало каждого кольца в coords (и конец последнего);
+    polygon_offsets - первое кольцо каждого полигона в ring_offsets;
+    node_bounds, level_offsets - узлы упакованного R-дерева по уровням, от листьев к корню:
+    узел j уровня l покрывает потомков с j * NODE_CAPACITY по (j + 1) * NODE_CAPACITY - 1
+    на уровне l - 1, узлы листового уровня - полигоны.
+
+    Загруженный из файла индекс только читается, и страницы файла делят все процессы.
+    """
+
+    ARRAYS = ('ids', 'bounds', 'coords', 'ring_offsets', 'polygon_offsets', 'node_bounds', 'level_offsets')
+
+    def __init__(self, ids, bounds, coords, ring_offsets, polygon_offsets, node_bounds, level_offsets,
+                 version=(None, None), node_capacity: int = NODE_CAPACITY):
+        self.ids = ids
+        self.bounds = bounds
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.polygon_offsets = polygon_offsets
+        self.node_bounds = node_bounds
+        self.level_offsets = level_offsets
+        self.version = tuple(version)
+        self.node_capacity = node_capacity
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, polygons, version=(None, None), node_capacity: int = NODE_CAPACITY):
+        """
+        Строит индекс из итератора пар (id, shapely-полигон или мультиполигон).
+
+        version - версия данных, с которой сравнивается таблица после загрузки снимка.
+        """
+        ids, bounds, parts, ring_lengths, ring_counts = [], [], [], [], []
+        for polygon_id, geometry in polygons:
+            if geometry is None or geometry.is_empty:
+                continue
+            rings = [
+                ring for part in getattr(geometry, 'geoms', [geometry])
+                for ring in [part.exterior, *part.interiors]
+            ]
+            for ring in rings:
+                parts.append(np.asarray(ring.coords)[:, :2])
+                parts.append(np.full((1, 2), np.nan))
+                ring_lengths.append(len(ring.coords) + 1)
+            ids.append(polygon_id)
+            bounds.append(geometry.bounds)
+            ring_counts.append(len(rings))
+
+        ids = np.asarray(ids, dtype=np.int64)
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        coords = np.concatenate(parts) if parts else np.empty((0, 2))
+        ring_lengths = np.asarray(ring_lengths, dtype=np.int64)
+        ring_counts = np.asarray(ring_counts, dtype=np.int64)
+
+        # переставляем полигоны в порядок STR вместе с их кольцами и координатами
+        order = _str_order(bounds, node_capacity)
+        ring_starts = np.cumsum(ring_counts) - ring_counts
+        rings = concat_ranges(ring_starts[order], ring_counts[order])
+        coord_starts = np.cumsum(ring_lengths) - ring_lengths
+        coords = coords[concat_ranges(coord_starts[rings], ring_lengths[rings])]
+        ring_offsets = np.concatenate(([0], np.cumsum(ring_lengths[rings])))
+        polygon_offsets = np.concatenate(([0], np.cumsum(ring_counts[order])))
+
+        ids, bounds = ids[order], bounds[order]
+        levels = []
+        child_bounds = bounds
+        while len(child_bounds):
+            groups = np.arange(0, len(child_bounds), node_capacity)
+            child_bounds = np.column_stack((
+                np.minimum.reduceat(child_bounds[:, 0], groups), np.minimum.reduceat(child_bounds[:, 1], groups),
+                np.maximum.reduceat(child_bounds[:, 2], groups), np.maximum.reduceat(child_bounds[:, 3], groups),
+            ))
+            levels.append(child_bounds)
+            if len(child_bounds) == 1:
+                break
+        node_bounds = np.concatenate(levels) if levels else np.empty((0, 4))
+        level_offsets = np.concatenate(([0], np.cumsum([len(level) for level in levels]))).astype(np.int64)
+
+        return cls(
+            ids, bounds, coords, ring_offsets.astype(np.int64), polygon_offsets.astype(np.int64),
+            node_bounds, level_offsets, version, node_capacity
+        )
+
+    def save(self, path: str):
+        """
+        Записывает индекс в файл. Файл заменяется атомарно, поэтому процессы,
+        которые уже читают старый снимок через mmap, продолжают с ним работать.
+        """
+        header = {
+            'version': [value.isoformat() if value is not None else None for value in self.version],
+            'node_capacity': self.node_capacity,
+            'arrays': {},
+        }
+        offset = 0
+        arrays = []
+        for name in self.ARRAYS:
+            array = np.ascontiguousarray(getattr(self, name))
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            arrays.append(array)
+            offset += _aligned(array.nbytes)
+
+        header = json.dumps(header).encode()
+        prefix = MAGIC + struct.pack('<I', len(header)) + header
+        prefix += b'\0' * (_aligned(len(prefix)) - len(prefix))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(prefix)
+                for array in arrays:
+                    file.write(array.tobytes())
+                    file.write(b'\0' * (_aligned(array.nbytes) - array.nbytes))
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Открывает снимок через mmap только для чтения; массивы не копируются в память процесса.
+        """
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError('{0} is not a polygon index snapshot'.format(path))
+
+        header_size, = struct.unpack_from('<I', buffer, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(buffer[header_start:header_start + header_size])
+        data_start = _aligned(header_start + header_size)
+
+        arrays = {}
+        for name in cls.ARRAYS:
+            spec = header['arrays'][name]
+            arrays[name] = np.frombuffer(
+                buffer, dtype=spec['dtype'], count=int(np.prod(spec['shape'])), offset=data_start + spec['offset']
+            ).reshape(spec['shape'])
+        version = tuple(datetime.fromisoformat(value) if value else None for value in header['version'])
+        return cls(version=version, node_capacity=header['node_capacity'], **arrays)
+
+    def locate_pairs(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Возвращает пары (индекс точки, id полигона), где точка попадает в полигон (граница включается).
+        """
+        point_parts, id_parts = [], []
+        for start in range(0, len(x) if len(self) else 0, POINTS_PER_CHUNK):
+            points = np.arange(start, min(start + POINTS_PER_CHUNK, len(x)))
+            points, polygons = self._candidates(x, y, points)
+            inside = self._contains(x, y, points, polygons)
+            point_parts.append(points[inside])
+            id_parts.append(self.ids[polygons[inside]])
+
+        if not point_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(point_parts), np.concatenate(id_parts)
+
+    def _candidates(self, x, y, points) -> tuple:
+        """
+        Спускается по R-дереву сразу для всех точек и возвращает пары (точка, полигон),
+        где точка попадает в bbox полигона.
+        """
+        level = len(self.level_offsets) - 2
+        root = self.node_bounds[self.level_offsets[level]]
+        px, py = x[points], y[points]
+        points = points[(px >= root[0]) & (px <= root[2]) & (py >= root[1]) & (py <= root[3])]
+        nodes = np.zeros(len(points), dtype=np.int64)
+
+        while level >= 0:
+            if level:
+                child_bounds = self.node_bounds[self.level_offsets[level - 1]:self.level_offsets[level]]
+            else:
+                child_bounds = self.bounds
+            first = nodes * self.node_capacity
+            counts = np.minimum(self.node_capacity, len(child_bounds) - first)
+            points = np.repeat(points, counts)
+            nodes = concat_ranges(first, counts)
+
+            bounds = child_bounds[nodes]
+            px, py = x[points], y[points]
+            inside = (px >= bounds[:, 0]) & (px <= bounds[:, 2]) & (py >= bounds[:, 1]) & (py <= bounds[:, 3])
+            points, nodes = points[inside], nodes[inside]
+            level -= 1
+        return points, nodes
+
+    def _contains(self, x, y, points, polygons) -> np.ndarray:
+        """
+        Точная проверка пар (точка, полигон) по правилу чёт-нечет с учётом границы.
+
+        Рёбра всех пар проверяются массивами; ребро с концом NaN (между кольцами) ничего не пересекает.
+        """
+        coord_starts = self.ring_offsets[self.polygon_offsets[polygons]]
+        edge_counts = self.ring_offsets[self.polygon_offsets[polygons + 1]] - coord_starts - 1
+        inside = np.zeros(len(polygons), dtype=bool)
+
+        ends = np.cumsum(edge_counts)
+        start = 0
+        while start < len(polygons):
+            limit = ends[start] - edge_counts[start] + EDGES_PER_CHUNK
+            stop = max(start + 1, int(np.searchsorted(ends, limit, 'right')))
+            counts = edge_counts[start:stop]
+            edges = concat_ranges(coord_starts[start:stop], counts)
+            x1, y1 = self.coords[edges, 0], self.coords[edges, 1]
+            x2, y2 = self.coords[edges + 1, 0], self.coords[edges + 1, 1]
+            px = np.repeat(x[points[start:stop]], counts)
+            py = np.repeat(y[points[start:stop]], counts)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossings = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+                on_edge = (
+                    ((x2 - x1) * (py - y1) == (y2 - y1) * (px - x1))
+                    & (px >= np.fmin(x1, x2)) & (px <= np.fmax(x1, x2))
+                    & (py >= np.fmin(y1, y2)) & (py <= np.fmax(y1, y2))
+                )
+            groups = np.cumsum(counts) - counts
+            inside[start:stop] = (
+                (np.add.reduceat(crossings, groups) % 2 == 1) | np.logical_or.reduceat(on_edge, groups)
+            )
+            start = stop
+        return inside
+
+
+def _str_order(bounds: np.ndarray, node_capacity: int) -> np.ndarray:
+    """
+    Порядок Sort-Tile-Recursive: полосы по x центров bbox, внутри полосы - по y.
+    """
+    centers = (bounds[:, :2] + bounds[:, 2:]) / 2
+    leaves = -(-len(bounds) // node_capacity)
+    slice_size = max(1, math.ceil(math.sqrt(leaves))) * node_capacity
+    order = np.argsort(centers[:, 0], kind='stable')
+    for start in range(0, len(order), slice_size):
+        part = order[start:start + slice_size]
+        order[start:start + slice_size] = part[np.argsort(centers[part, 1], kind='stable')]
+    return order
+
+
+def _aligned(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
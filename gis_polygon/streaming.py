@@ -0,0 +1,88 @@
+import json
+
+from flask import Response, stream_with_context
+
+from gis_polygon.raw_json import embed_raw
+
+GEOJSON_MIMETYPE = 'application/geo+json'
+GEOJSON_SEQ_MIMETYPE = 'application/geo+json-seq'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_MIMETYPES = (GEOJSON_SEQ_MIMETYPE, NDJSON_MIMETYPE)
+
+# RFC 8142: каждая запись GeoJSON Text Sequence начинается с Record Separator
+RECORD_SEPARATOR = '\x1e'
+
+
+def to_feature(polygon: dict) -> dict:
+    """
+    Преобразует сериализованный полигон в GeoJSON Feature.
+    """
+    properties = dict(polygon)
+    return {
+        'type': 'Feature',
+        'id': properties.pop('polygon_id', None),
+        'geometry': properties.pop('geom', None),
+        'properties': properties,
+    }
+
+
+def from_feature(feature: dict) -> dict:
+    """
+    Преобразует GeoJSON Feature в данные для загрузки схемой полигона.
+
+    Объекты без "type": "Feature" считаются данными полигона и возвращаются как есть.
+    id фичи не используется.
+    """
+    if not isinstance(feature, dict) or feature.get('type') != 'Feature':
+        return feature
+
+    polygon = dict(feature.get('properties') or {})
+    polygon['geom'] = feature.get('geometry')
+    return polygon
+
+
+def encode_feature(schema, polygon, raw_geometry=False) -> str:
+    """
+    Сериализует полигон в GeoJSON Feature.
+
+    При raw_geometry геометрия берётся из ST_AsGeoJSON (geom_geojson) без повторного кодирования.
+    """
+    feature = to_feature(schema.dump(polygon).data)
+    if raw_geometry:
+        del feature['geometry']
+        return embed_raw(feature, 'geometry', polygon.geom_geojson)
+    return json.dumps(feature)
+
+
+def stream_polygons(polygons, schema, mimetype: str, raw_geometry=False) -> Response:
+    """
+    Возвращает потоковый ответ, сериализуя полигоны по одному.
+
+    polygons - итератор моделей (например, запрос с yield_per), schema - схема,
+    которой сериализуется каждый полигон.
+    """
+    features = (encode_feature(schema, polygon, raw_geometry) for polygon in polygons)
+
+    if mimetype == GEOJSON_SEQ_MIMETYPE:
+        chunks = _feature_sequence(features, RECORD_SEPARATOR)
+    elif mimetype == NDJSON_MIMETYPE:
+        chunks = _feature_sequence(features, '')
+    else:
+        mimetype = GEOJSON_MIMETYPE
+        chunks = _feature_collection(features)
+
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+
+def _feature_sequence(features, prefix: str):
+    for feature in features:
+        yield prefix + feature + '\n'
+
+
+def _feature_collection(features):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for feature in features:
+        yield separator + feature
+        separator = ', '
+    yield ']}\n'
@@ -0,0 +1,152 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from geoalchemy2.shape import to_shape
+
+# половина длины экватора в EPSG:3857
+MERCATOR_MAX = 20037508.342789244
+MERCATOR_MAX_LATITUDE = 85.0511287798066
+MVT_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+# память записи кеша тайлов помимо самого тайла (ключ, узел OrderedDict, кортеж значения), в байтах
+TILE_ENTRY_OVERHEAD = 256
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """
+    Возвращает границы тайла (minx, miny, maxx, maxy) в EPSG:3857.
+    """
+    size = 2 * MERCATOR_MAX / 2 ** z
+    return (
+        -MERCATOR_MAX + x * size,
+        MERCATOR_MAX - (y + 1) * size,
+        -MERCATOR_MAX + (x + 1) * size,
+        MERCATOR_MAX - y * size,
+    )
+
+
+def tile_coordinates(lon: float, lat: float, z: int) -> tuple:
+    """
+    Возвращает дробные координаты тайла точки (lon, lat) на зуме z.
+    """
+    lat = max(min(lat, MERCATOR_MAX_LATITUDE), -MERCATOR_MAX_LATITUDE)
+    n = 2 ** z
+    x = (lon + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return x, y
+
+
+def pixel_size(z: int, tile_size: int = 256) -> float:
+    """
+    Возвращает размер пикселя тайла на зуме z в градусах долготы.
+    """
+    return 360 / (tile_size * 2 ** z)
+
+
+def is_valid_tile(z: int, x: int, y: int, max_zoom: int) -> bool:
+    return 0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def geom_bounds(geom):
+    """
+    Возвращает bbox геометрии модели или None, если геометрии нет.
+    """
+    if geom is None:
+        return None
+    return to_shape(geom).bounds
+
+
+class TileCache:
+    """
+    LRU-кеш тайлов в памяти процесса, ограниченный суммарным размером тайлов в байтах.
+
+    Ключ - (z, x, y). Каждая запись, в том числе пустой тайл, занимает ещё TILE_ENTRY_OVERHEAD байт.
+    Изменения сбрасывают тайлы только в своём процессе, поэтому тайлы живут не дольше ttl секунд
+    (None - без ограничения): другие процессы отдают устаревший тайл не дольше ttl.
+    """
+
+    def __init__(self, max_size=0, buffer=0.0, ttl=None):
+        self.max_size = max_size
+        # буфер тайла в долях тайла: геометрия из буфера попадает и в соседние тайлы
+        self.buffer = buffer
+        self.ttl = ttl
+        self._tiles = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_size = app.config['TILE_CACHE_SIZE']
+        self.buffer = app.config['TILE_BUFFER'] / app.config['TILE_EXTENT']
+        self.ttl = app.config['TILE_CACHE_TTL']
+
+    def get(self, key):
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is None:
+                return None
+            tile, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                self._pop(key)
+                return None
+            self._tiles.move_to_end(key)
+            return tile
+
+    def set(self, key, tile: bytes):
+        if len(tile) + TILE_ENTRY_OVERHEAD > self.max_size:
+            return
+
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._pop(key)
+            self._tiles[key] = tile, expires
+            self._size += len(tile) + TILE_ENTRY_OVERHEAD
+            while self._size > self.max_size:
+                self._pop(next(iter(self._tiles)))
+
+    def invalidate(self, *bounds):
+        """
+        Удаляет тайлы, которые задевает хотя бы один bbox (minx, miny, maxx, maxy) в EPSG:4326 из bounds.
+
+        Каждый bbox сбрасывает только свои тайлы: если диапазон тайлов bbox меньше кеша,
+        ключи диапазона удаляются напрямую, иначе просматриваются тайлы этого зума.
+        """
+        with self._lock:
+            zooms = {z for z, _, _ in self._tiles}
+            for bbox in bounds:
+                for z in zooms:
+                    min_x, min_y, max_x, max_y = self._tile_range(bbox, z)
+                    if (max_x - min_x + 1) * (max_y - min_y + 1) <= len(self._tiles):
+                        keys = [(z, x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+                    else:
+                        keys = [
+                            key for key in self._tiles
+                            if key[0] == z and min_x <= key[1] <= max_x and min_y <= key[2] <= max_y
+                        ]
+                    for key in keys:
+                        self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def _tile_range(self, bbox, z: int) -> tuple:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # ось y тайлов направлена на юг
+        min_x, min_y = tile_coordinates(min_lon, max_lat, z)
+        max_x, max_y = tile_coordinates(max_lon, min_lat, z)
+        return (
+            math.floor(min_x - self.buffer),
+            math.floor(min_y - self.buffer),
+            math.floor(max_x + self.buffer),
+            math.floor(max_y + self.buffer),
+        )
+
+    def _pop(self, key):
+        entry = self._tiles.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0]) + TILE_ENTRY_OVERHEAD
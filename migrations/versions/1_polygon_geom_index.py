@@ -0,0 +1,24 @@
+"""polygon geom index
+
+Revision ID: 1
+Revises: 0
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1'
+down_revision = '0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # geoalchemy2 мог уже создать индекс вместе с таблицей
+    op.execute('CREATE INDEX IF NOT EXISTS idx_gis_polygon_geom ON gis_polygon USING GIST (geom)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS idx_gis_polygon_geom')
@@ -0,0 +1,23 @@
+"""polygon edited index
+
+Revision ID: 2
+Revises: 1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2'
+down_revision = '1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_gis_polygon__edited', 'gis_polygon', ['_edited'])
+
+
+def downgrade():
+    op.drop_index('ix_gis_polygon__edited', table_name='gis_polygon')
@@ -0,0 +1,63 @@
+"""polygon simplified geom
+
+Revision ID: 3
+Revises: 2
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3'
+down_revision = '2'
+branch_labels = None
+depends_on = None
+
+# должны совпадать с gis_polygon.models.SIMPLIFIED_TOLERANCES
+SIMPLIFIED_TOLERANCES = (
+    ('geom_simplified_1', 0.0001),
+    ('geom_simplified_2', 0.001),
+    ('geom_simplified_3', 0.01),
+)
+
+
+def upgrade():
+    for column_name, _ in SIMPLIFIED_TOLERANCES:
+        op.add_column('gis_polygon', sa.Column(
+            column_name,
+            geoalchemy2.types.Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False),
+            nullable=True
+        ))
+
+    assignments = '\n'.join(
+        '    NEW.{0} := ST_SimplifyPreserveTopology(NEW.geom, {1});'.format(column_name, tolerance)
+        for column_name, tolerance in SIMPLIFIED_TOLERANCES
+    )
+    op.execute('''
+CREATE OR REPLACE FUNCTION gis_polygon_simplify() RETURNS trigger AS $$
+BEGIN
+{0}
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+'''.format(assignments))
+    op.execute('''
+CREATE TRIGGER gis_polygon_simplify
+BEFORE INSERT OR UPDATE OF geom ON gis_polygon
+FOR EACH ROW EXECUTE PROCEDURE gis_polygon_simplify()
+''')
+
+    op.execute('UPDATE gis_polygon SET {0}'.format(', '.join(
+        '{0} = ST_SimplifyPreserveTopology(geom, {1})'.format(column_name, tolerance)
+        for column_name, tolerance in SIMPLIFIED_TOLERANCES
+    )))
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS gis_polygon_simplify ON gis_polygon')
+    op.execute('DROP FUNCTION IF EXISTS gis_polygon_simplify()')
+    for column_name, _ in reversed(SIMPLIFIED_TOLERANCES):
+        op.drop_column('gis_polygon', column_name)
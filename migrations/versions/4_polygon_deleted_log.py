@@ -0,0 +1,48 @@
+"""polygon deleted log
+
+Revision ID: 4
+Revises: 3
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4'
+down_revision = '3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'gis_polygon_deleted',
+        sa.Column('polygon_id', sa.Integer(), nullable=False),
+        sa.Column('_deleted', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('polygon_id')
+    )
+    op.create_index('ix_gis_polygon_deleted__deleted', 'gis_polygon_deleted', ['_deleted'])
+
+    op.execute('''
+CREATE OR REPLACE FUNCTION gis_polygon_log_delete() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO gis_polygon_deleted (polygon_id, _deleted) VALUES (OLD.id, now())
+    ON CONFLICT (polygon_id) DO UPDATE SET _deleted = EXCLUDED._deleted;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql
+''')
+    op.execute('''
+CREATE TRIGGER gis_polygon_log_delete
+AFTER DELETE ON gis_polygon
+FOR EACH ROW EXECUTE PROCEDURE gis_polygon_log_delete()
+''')
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS gis_polygon_log_delete ON gis_polygon')
+    op.execute('DROP FUNCTION IF EXISTS gis_polygon_log_delete()')
+    op.drop_index('ix_gis_polygon_deleted__deleted', table_name='gis_polygon_deleted')
+    op.drop_table('gis_polygon_deleted')
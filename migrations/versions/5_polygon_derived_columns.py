@@ -0,0 +1,75 @@
+"""polygon derived columns
+
+Revision ID: 5
+Revises: 4
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import geoalchemy2
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5'
+down_revision = '4'
+branch_labels = None
+depends_on = None
+
+# должны совпадать с производными колонками gis_polygon.models.GisPolygon
+DERIVED_VALUES = (
+    ('area', 'ST_Area({0}::geography)'),
+    ('vertex_count', 'ST_NPoints({0})'),
+    ('bbox', 'ST_Envelope({0})'),
+    ('centroid', 'ST_Centroid({0})'),
+)
+
+
+def upgrade():
+    op.add_column('gis_polygon', sa.Column('area', sa.Float(), nullable=True))
+    op.add_column('gis_polygon', sa.Column('vertex_count', sa.Integer(), nullable=True))
+    op.add_column('gis_polygon', sa.Column(
+        'bbox', geoalchemy2.types.Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False), nullable=True
+    ))
+    op.add_column('gis_polygon', sa.Column(
+        'centroid', geoalchemy2.types.Geometry(geometry_type='POINT', srid=4326, spatial_index=False), nullable=True
+    ))
+
+    assignments = '\n'.join(
+        '    NEW.{0} := {1};'.format(column_name, expression.format('NEW.geom'))
+        for column_name, expression in DERIVED_VALUES
+    )
+    op.execute('''
+CREATE OR REPLACE FUNCTION gis_polygon_derive() RETURNS trigger AS $$
+BEGIN
+{0}
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+'''.format(assignments))
+    op.execute('''
+CREATE TRIGGER gis_polygon_derive
+BEFORE INSERT OR UPDATE OF geom ON gis_polygon
+FOR EACH ROW EXECUTE PROCEDURE gis_polygon_derive()
+''')
+
+    op.execute('UPDATE gis_polygon SET {0}'.format(', '.join(
+        '{0} = {1}'.format(column_name, expression.format('geom')) for column_name, expression in DERIVED_VALUES
+    )))
+
+    # (колонка, id) - порядок keyset-пагинации при ?sort=
+    op.create_index('ix_gis_polygon_area_id', 'gis_polygon', ['area', 'id'])
+    op.create_index('ix_gis_polygon_vertex_count_id', 'gis_polygon', ['vertex_count', 'id'])
+    op.create_index('ix_gis_polygon_class_id_area_id', 'gis_polygon', ['class_id', 'area', 'id'])
+    op.execute('CREATE INDEX IF NOT EXISTS idx_gis_polygon_centroid ON gis_polygon USING GIST (centroid)')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS idx_gis_polygon_centroid')
+    op.drop_index('ix_gis_polygon_class_id_area_id', table_name='gis_polygon')
+    op.drop_index('ix_gis_polygon_vertex_count_id', table_name='gis_polygon')
+    op.drop_index('ix_gis_polygon_area_id', table_name='gis_polygon')
+    op.execute('DROP TRIGGER IF EXISTS gis_polygon_derive ON gis_polygon')
+    op.execute('DROP FUNCTION IF EXISTS gis_polygon_derive()')
+    for column_name, _ in reversed(DERIVED_VALUES):
+        op.drop_column('gis_polygon', column_name)
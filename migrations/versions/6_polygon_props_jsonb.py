@@ -0,0 +1,32 @@
+"""polygon props jsonb
+
+Revision ID: 6
+Revises: 5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6'
+down_revision = '5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # смена типа переписывает таблицу под эксклюзивной блокировкой
+    op.alter_column('gis_polygon', 'props', type_=postgresql.JSONB(), postgresql_using='props::jsonb')
+    # jsonb_path_ops поддерживает только @>, зато индекс меньше и быстрее jsonb_ops
+    op.create_index(
+        'ix_gis_polygon_props', 'gis_polygon', ['props'],
+        postgresql_using='gin', postgresql_ops={'props': 'jsonb_path_ops'}
+    )
+
+
+def downgrade():
+    op.drop_index('ix_gis_polygon_props', table_name='gis_polygon')
+    op.alter_column('gis_polygon', 'props', type_=sa.JSON(), postgresql_using='props::json')
@@ -0,0 +1,24 @@
+"""polygon geography index
+
+Revision ID: 7
+Revises: 6
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7'
+down_revision = '6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # KNN-поиск ближайших полигонов в метрах: ORDER BY geography(geom) <-> точка
+    op.execute('CREATE INDEX IF NOT EXISTS idx_gis_polygon_geography ON gis_polygon USING GIST (geography(geom))')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS idx_gis_polygon_geography')
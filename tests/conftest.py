@@ -0,0 +1,15 @@
+import pytest
+
+from tests.mocks import MockPolygons
+
+
+@pytest.fixture
+def mock_polygons(monkeypatch):
+    """Подменяет GisPolygon в api набором MockPolygons из переданных полигонов и возвращает набор."""
+
+    def patch(polygons):
+        query = MockPolygons(polygons)
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', query)
+        return query
+
+    return patch
@@ -0,0 +1,229 @@
+from flask import abort
+from geoalchemy2.shape import to_shape
+
+from gis_polygon.models import GisPolygon, GisPolygonDeleted
+
+
+class MockPolygon:
+    """Мокает модель полигона и методы BaseQuery."""
+
+    def __init__(self, id=None, name=None, geom=None, _created=None, _edited=None, props=None, class_id=None):
+        self.id = id
+        self.name = name
+        self.geom = geom
+        self.props = props
+        self._created = _created
+        self._edited = _edited
+        self.class_id = class_id
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    @property
+    def query(self):
+        return self
+
+    def all(self):
+        return [self]
+
+    def projected(self, srid, geom_column=None):
+        self.geom_column = geom_column
+        return self
+
+    def by_id(self, polygon_id):
+        return MockPolygons([polygon for polygon in self.all() if polygon.id == polygon_id])
+
+    def version(self):
+        polygons = self.all()
+        edited = [polygon._edited for polygon in polygons if polygon._edited]
+        return len(polygons), max(edited) if edited else None
+
+    def last_edited(self):
+        return self._edited
+
+    def as_geojson(self, srid, precision, geom_column=None):
+        return self
+
+    def only_fields(self, *attributes):
+        self.attributes = attributes
+        return self
+
+    def mvt(self, bounds, extent, buffer):
+        self.rendered_tiles = getattr(self, 'rendered_tiles', 0) + 1
+        return b'tile'
+
+    def insert_many(self, polygons, batch_size):
+        return list(range(100, 100 + len(polygons)))
+
+    def get_or_404(self, id):
+        if self.id == id:
+            return self
+        else:
+            abort(404)
+
+
+class MockPolygons:
+    """
+    Мокает набор полигонов и методы PolygonQuery.
+
+    Фильтры и сортировки, которые выполняет база данных (in_bbox, intersecting, sorted_segments, of_class,
+    with_props, area_between, centroid_in_bbox, changed_after, nearest), не повторяются на Python:
+    набор возвращается как есть, а вызов записывается в calls, общий для всех производных наборов.
+    sorted_segments только делит набор на сегменты значений и NULL, как PolygonQuery.sorted_segments.
+    """
+
+    def __init__(self, polygons, calls=None):
+        self.polygons = list(polygons)
+        self.calls = [] if calls is None else calls
+
+    def _derived(self, polygons):
+        return MockPolygons(polygons, self.calls)
+
+    def _recorded(self, method, *args):
+        self.calls.append((method,) + args)
+        return self._derived(self.polygons)
+
+    @property
+    def query(self):
+        return self
+
+    def all(self):
+        return list(self.polygons)
+
+    def projected(self, srid, geom_column=None):
+        self.geom_column = geom_column
+        return self
+
+    def by_id(self, polygon_id):
+        return self._derived([polygon for polygon in self.all() if polygon.id == polygon_id])
+
+    def by_ids(self, polygon_ids):
+        return self._derived([polygon for polygon in self.all() if polygon.id in polygon_ids])
+
+    def bounds(self):
+        return {polygon.id: to_shape(polygon.geom).bounds for polygon in self.polygons}
+
+    def update_many(self, updates):
+        self.updates = getattr(self, 'updates', []) + [(polygon_id, dict(values)) for polygon_id, values in updates]
+        polygons = {polygon.id: polygon for polygon in self.polygons}
+        for polygon_id, values in updates:
+            for column, value in values.items():
+                setattr(polygons[polygon_id], column, value)
+
+    def version(self):
+        polygons = self.all()
+        edited = [polygon._edited for polygon in polygons if polygon._edited]
+        return len(polygons), max(edited) if edited else None
+
+    def last_edited(self):
+        return max((polygon._edited for polygon in self.polygons if polygon._edited), default=None)
+
+    def as_geojson(self, srid, precision, geom_column=None):
+        return self
+
+    def only_fields(self, *attributes):
+        self.attributes = attributes
+        return self
+
+    def simplified_column(self, tolerance):
+        return GisPolygon.simplified_column(tolerance).key
+
+    def after(self, polygon_id=None):
+        polygons = sorted(self.polygons, key=lambda polygon: polygon.id)
+        if polygon_id is not None:
+            polygons = [polygon for polygon in polygons if polygon.id > polygon_id]
+        return self._derived(polygons)
+
+    def limit(self, limit):
+        return self._derived(self.polygons[:limit])
+
+    def sorted_segments(self, attribute, descending=False, cursor=None):
+        self.calls.append(('sorted_segments', attribute, descending, cursor))
+        if cursor is None:
+            return [self._derived(self.polygons)]
+        values = self._derived([polygon for polygon in self.polygons if getattr(polygon, attribute) is not None])
+        nulls = self._derived([polygon for polygon in self.polygons if getattr(polygon, attribute) is None])
+        segments = [nulls, values] if descending else [values, nulls]
+        return segments if (cursor[0] is None) == descending else segments[1:]
+
+    def of_class(self, class_id):
+        return self._recorded('of_class', class_id)
+
+    def with_props(self, document):
+        return self._recorded('with_props', document)
+
+    def area_between(self, min_area=None, max_area=None):
+        return self._recorded('area_between', min_area, max_area)
+
+    def centroid_in_bbox(self, bbox, srid):
+        return self._recorded('centroid_in_bbox', bbox, srid)
+
+    def changed_after(self, cursor=None, until=None):
+        return self._recorded('changed_after', cursor, until)
+
+    def nearest(self, point, srid, limit):
+        self.calls.append(('nearest', point, srid, limit))
+        return self._derived(self.polygons[:limit])
+
+    def stream(self, batch_size):
+        return iter(self.after().polygons)
+
+    def in_bbox(self, bbox, srid):
+        return self._recorded('in_bbox', bbox, srid)
+
+    def intersecting(self, geometry, srid):
+        return self._recorded('intersecting', geometry, srid)
+
+    def get_or_404(self, id):
+        for polygon in self.polygons:
+            if polygon.id == id:
+                return polygon
+        abort(404)
+
+
+class MockDeletedPolygons:
+    """Мокает журнал удалений и методы DeletedPolygonQuery, changed_after записывается в calls."""
+
+    def __init__(self, deleted, calls=None):
+        self.deleted = [GisPolygonDeleted(polygon_id=polygon_id, _deleted=deleted) for polygon_id, deleted in deleted]
+        self.calls = [] if calls is None else calls
+
+    def _derived(self, deleted):
+        return MockDeletedPolygons([(polygon.polygon_id, polygon._deleted) for polygon in deleted], self.calls)
+
+    @property
+    def query(self):
+        return self
+
+    def all(self):
+        return list(self.deleted)
+
+    def last_deleted(self):
+        return max((polygon._deleted for polygon in self.deleted), default=None)
+
+    def limit(self, limit):
+        return self._derived(self.deleted[:limit])
+
+    def changed_after(self, cursor=None, until=None):
+        self.calls.append(('changed_after', cursor, until))
+        return self._derived(self.deleted)
+
+
+class MockDb:
+    """Мокает модель sqlalchemy и методы session."""
+
+    @property
+    def session(self):
+        return self
+
+    def add(self, arg):
+        return self
+
+    def commit(self):
+        return self
+
+    def merge(self, arg):
+        return self
+
+    def delete(self, arg):
+        return self
@@ -1,60 +1,42 @@
+import gzip
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
 import pytest
-from flask import json, abort, current_app
-from geoalchemy2.shape import from_shape
-from shapely.geometry import Polygon, shape
+from flask import json, current_app, g
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import Point, Polygon, box, shape
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
 
 from gis_polygon.app import create_app
+from gis_polygon.api import polygon_cache_key
+from gis_polygon.projections import get_transformer
+from gis_polygon.snapshot import PackedPolygonIndex
+from gis_polygon.pagination import (
+    decode_change_cursor, decode_sort_cursor, encode_change_cursor, encode_cursor, encode_sort_cursor
+)
+from gis_polygon.cache import MemoryCacheBackend, RedisCacheBackend, ResponseCache
+from gis_polygon.extensions import compression, metrics, polygon_locator, response_cache, tile_cache
+from gis_polygon.models import CHANGE_DELETED, CHANGE_EDITED, GisPolygon, GisPolygonDeleted, PolygonQuery
+from tests.mocks import MockDb, MockDeletedPolygons, MockPolygon, MockPolygons
 
 app = create_app(testing=True)
 
 
-class MockPolygon:
-    """Мокает модель полигона и методы BaseQuery."""
-
-    def __init__(self, id=None, name=None, geom=None, _created=None, _edited=None, props=None, class_id=None):
-        self.id = id
-        self.name = name
-        self.geom = geom
-        self.props = props
-        self._created = _created
-        self._edited = _edited
-        self.class_id = class_id
-
-    def __call__(self, *args, **kwargs):
-        return self
-
-    @property
-    def query(self):
-        return self
-
-    def all(self):
-        return [self]
-
-    def get_or_404(self, id):
-        if self.id == id:
-            return self
-        else:
-            abort(404)
-
-
-class MockDb:
-    """Мокает модель sqlalchemy и методы session."""
-
-    @property
-    def session(self):
-        return self
-
-    def add(self, arg):
-        return self
-
-    def commit(self):
-        return self
+@pytest.fixture(autouse=True)
+def clear_caches():
+    tile_cache.clear()
+    response_cache.clear()
+    polygon_locator.clear()
 
-    def merge(self, arg):
-        return self
 
-    def delete(self, arg):
-        return self
+@pytest.fixture(autouse=True)
+def no_deleted_polygons(monkeypatch):
+    monkeypatch.setattr('gis_polygon.api.GisPolygonDeleted', MockDeletedPolygons([]))
 
 
 POLYGON_FOR_TEST = {
@@ -105,6 +87,12 @@ def get_json(url, headers):
     return response
 
 
+def patch_json(url, data, headers):
+    data = json.dumps(data)
+    response = app.test_client().patch(url, headers=headers, data=data)
+    return response
+
+
 def put_json(url, data, headers):
     data = json.dumps(data)
     response = app.test_client().put(url, headers=headers, data=data)
@@ -116,6 +104,22 @@ def delete_json(url, headers):
     return response
 
 
+def compiled_sql(clause) -> str:
+    """
+    Компилирует выражение для PostgreSQL и подставляет значения параметров вместо имён,
+    которые SQLAlchemy генерирует по-разному в разных версиях.
+    """
+    compiled = clause.compile(dialect=postgresql.dialect())
+
+    def literal(match):
+        value = compiled.params[match.group(1)]
+        if isinstance(value, (bytes, memoryview)):
+            return "'\\x{0}'".format(bytes(value).hex())
+        return repr(value)
+
+    return re.sub(r'%\((\w+)\)s', literal, str(compiled))
+
+
 @pytest.mark.parametrize('data, expected_code', [
     (
         POLYGON_FOR_TEST, 200
@@ -417,3 +421,1527 @@ def test_delete_polygon(monkeypatch, polygon_id, expected_code):
     headers = {'Content-Type': 'application/json'}
     response = delete_json('/api/polygon/{0}'.format(polygon_id), headers)
     assert response.status_code == expected_code
+
+
+def test_get_polygons_pages(monkeypatch):
+    polygon = Polygon([(0, 0), (1, 1), (1, 0)])
+
+    with app.app_context():
+        geom = from_shape(shape(polygon), srid=current_app.config['DEFAULT_SRID'])
+        monkeypatch.setattr(
+            'gis_polygon.api.GisPolygon',
+            MockPolygons([MockPolygon(id=polygon_id, geom=geom) for polygon_id in (3, 1, 2)])
+        )
+
+    headers = {'Content-Type': 'application/json'}
+    response = get_json('/api/polygon?limit=2', headers)
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == [1, 2]
+    assert response.json['next']
+
+    response = get_json('/api/polygon?limit=2&after={0}'.format(response.json['next']), headers)
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == [3]
+    assert response.json['next'] is None
+
+
+@pytest.mark.parametrize('endpoint, expected_response', [
+    (
+        '/api/polygon?limit=0',
+        {'error': 'incorrect limit'}
+    ),
+    (
+        '/api/polygon?limit=test',
+        {'error': 'incorrect limit'}
+    ),
+    (
+        '/api/polygon?limit=100000',
+        {'error': 'incorrect limit'}
+    ),
+    (
+        '/api/polygon?after=test',
+        {'error': 'incorrect cursor'}
+    ),
+])
+def test_get_polygons_pages_incorrect_args(monkeypatch, endpoint, expected_response):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([MockPolygon(id=1)]))
+
+    headers = {'Content-Type': 'application/json'}
+    response = get_json(endpoint, headers)
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+@pytest.mark.parametrize('endpoint, headers, expected_mimetype, record_prefix', [
+    (
+        '/api/polygon', {'Accept': 'application/x-ndjson'}, 'application/x-ndjson', ''
+    ),
+    (
+        '/api/polygon', {'Accept': 'application/geo+json-seq'}, 'application/geo+json-seq', '\x1e'
+    ),
+])
+def test_stream_polygons_sequence(monkeypatch, endpoint, headers, expected_mimetype, record_prefix):
+    polygon = Polygon([(0, 0), (1, 1), (1, 0)])
+
+    with app.app_context():
+        geom = from_shape(shape(polygon), srid=current_app.config['DEFAULT_SRID'])
+        monkeypatch.setattr(
+            'gis_polygon.api.GisPolygon',
+            MockPolygons([MockPolygon(id=polygon_id, geom=geom, name='test') for polygon_id in (2, 1)])
+        )
+
+    response = get_json(endpoint, headers)
+    assert response.status_code == 200
+    assert response.mimetype == expected_mimetype
+
+    lines = response.get_data(as_text=True).split('\n')[:-1]
+    assert all(line.startswith(record_prefix) for line in lines)
+    features = [json.loads(line[len(record_prefix):]) for line in lines]
+    assert [feature['id'] for feature in features] == [1, 2]
+    assert features[0] == {
+        'type': 'Feature',
+        'id': 1,
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[0.0, 0.0], [1.0, 1.0], [1.0, 0.0], [0.0, 0.0]]]
+        },
+        'properties': {'class_id': None, 'props': None, 'name': 'test'}
+    }
+
+
+def test_stream_polygons_feature_collection(monkeypatch):
+    polygon = Polygon([(0, 0), (1, 1), (1, 0)])
+
+    with app.app_context():
+        geom = from_shape(shape(polygon), srid=current_app.config['DEFAULT_SRID'])
+        monkeypatch.setattr(
+            'gis_polygon.api.GisPolygon',
+            MockPolygons([MockPolygon(id=polygon_id, geom=geom) for polygon_id in (1, 2, 3)])
+        )
+
+    response = get_json('/api/polygon?stream=1', {})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/geo+json'
+
+    collection = json.loads(response.get_data(as_text=True))
+    assert collection['type'] == 'FeatureCollection'
+    assert [feature['id'] for feature in collection['features']] == [1, 2, 3]
+
+
+@pytest.mark.parametrize('endpoint, headers', [
+    ('/api/polygon?stream=1&limit=2', {}),
+    ('/api/polygon?after=MQ==', {'Accept': 'application/x-ndjson'}),
+])
+def test_stream_polygons_pagination_rejected(monkeypatch, endpoint, headers):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([MockPolygon(id=1)]))
+
+    response = get_json(endpoint, headers)
+    assert response.status_code == 400
+    assert response.json == {'error': 'limit and after are not supported for streams'}
+
+
+@pytest.mark.parametrize('endpoint, expected_calls', [
+    ('/api/polygon?bbox=0,0,1,1', [('in_bbox', [0.0, 0.0, 1.0, 1.0], 4326)]),
+    ('/api/polygon?bbox=0,0,1,1&projection=epsg:32644', [('in_bbox', [0.0, 0.0, 1.0, 1.0], 32644)]),
+    (
+        '/api/polygon?intersects={"type": "Point", "coordinates": [10.5, 10.5]}',
+        [('intersecting', Point(10.5, 10.5), 4326)]
+    ),
+    (
+        '/api/polygon?bbox=0,0,20,20&intersects={"type": "Point", "coordinates": [0.5, 0.5]}',
+        [('in_bbox', [0.0, 0.0, 20.0, 20.0], 4326), ('intersecting', Point(0.5, 0.5), 4326)]
+    ),
+])
+def test_get_polygons_spatial_filter(mock_polygons, endpoint, expected_calls):
+    with app.app_context():
+        srid = current_app.config['DEFAULT_SRID']
+        polygons = mock_polygons([
+            MockPolygon(id=1, geom=from_shape(box(0, 0, 1, 1), srid=srid)),
+            MockPolygon(id=2, geom=from_shape(box(10, 10, 11, 11), srid=srid)),
+        ])
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == [1, 2]
+    assert polygons.calls == expected_calls
+
+
+@pytest.mark.parametrize('endpoint, expected_response', [
+    (
+        '/api/polygon?bbox=0,0,1',
+        {'error': 'incorrect bbox'}
+    ),
+    (
+        '/api/polygon?bbox=1,1,0,0',
+        {'error': 'incorrect bbox'}
+    ),
+    (
+        '/api/polygon?bbox=a,b,c,d',
+        {'error': 'incorrect bbox'}
+    ),
+    (
+        '/api/polygon?intersects={"type": "Polygon"}',
+        {'error': 'incorrect intersects'}
+    ),
+    (
+        '/api/polygon?intersects=test',
+        {'error': 'incorrect intersects'}
+    ),
+    (
+        '/api/polygon?bbox=0,0,1,1&projection=epsg:12345',
+        {'error': 'incorrect projection'}
+    ),
+])
+def test_get_polygons_spatial_filter_incorrect_args(monkeypatch, endpoint, expected_response):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([]))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+@pytest.mark.parametrize('srid, expected_envelope', [
+    (4326, 'ST_MakeEnvelope(0, 0, 1, 1, 4326)'),
+    (32644, 'ST_Transform(ST_MakeEnvelope(0, 0, 1, 1, 32644), 4326)'),
+])
+def test_in_bbox_sql(srid, expected_envelope):
+    """bbox компилируется в оператор && по GiST-индексу, в проекцию колонки переводится bbox."""
+
+    with app.app_context():
+        where = GisPolygon.query.in_bbox([0, 0, 1, 1], srid).whereclause
+
+    assert compiled_sql(where) == 'gis_polygon.geom && {0}'.format(expected_envelope)
+
+
+@pytest.mark.parametrize('srid, expected_geom', [
+    (4326, "ST_GeomFromWKB('\\x{0}', 4326)"),
+    (32644, "ST_Transform(ST_GeomFromWKB('\\x{0}', 32644), 4326)"),
+])
+def test_intersecting_sql(srid, expected_geom):
+    """Геометрия фильтра встраивается как ST_GeomFromWKB и переводится в проекцию колонки."""
+
+    with app.app_context():
+        where = GisPolygon.query.intersecting(box(0, 0, 1, 1), srid).whereclause
+
+    expected_geom = expected_geom.format(box(0, 0, 1, 1).wkb.hex())
+    assert compiled_sql(where) == 'ST_Intersects(gis_polygon.geom, {0})'.format(expected_geom)
+
+
+def test_projected_sql():
+    """Перепроецирование при чтении выполняется в PostGIS."""
+
+    with app.app_context():
+        projected_sql = str(GisPolygon.query.projected(32644).statement.compile(dialect=postgresql.dialect()))
+        default_sql = str(GisPolygon.query.projected(4326).statement.compile(dialect=postgresql.dialect()))
+
+    assert 'ST_AsEWKB(ST_Transform(gis_polygon.geom, ' in projected_sql
+    # исходная geom в перепроецированную выборку не попадает
+    assert 'ST_AsEWKB(gis_polygon.geom)' not in projected_sql
+    assert 'ST_Transform' not in default_sql
+    assert 'ST_AsEWKB(gis_polygon.geom)' in default_sql
+
+
+@pytest.mark.parametrize('tolerance,expected_column', [
+    (0, 'geom'),
+    (0.00005, 'geom'),
+    (0.0001, 'geom_simplified_1'),
+    (0.005, 'geom_simplified_2'),
+    (1, 'geom_simplified_3'),
+])
+def test_simplified_column(tolerance, expected_column):
+    assert GisPolygon.simplified_column(tolerance).key == expected_column
+
+
+def test_simplified_sql():
+    """Упрощённая геометрия читается из своей колонки, исходная не загружается."""
+
+    with app.app_context():
+        column = GisPolygon.simplified_column(0.001)
+        sql = str(GisPolygon.query.projected(4326, column).statement.compile(dialect=postgresql.dialect()))
+        geojson_sql = str(GisPolygon.query.as_geojson(4326, 6, column).statement.compile(dialect=postgresql.dialect()))
+
+    assert 'gis_polygon.geom_simplified_2' in sql
+    assert 'ST_AsEWKB(gis_polygon.geom)' not in sql
+    assert 'ST_AsGeoJSON(gis_polygon.geom_simplified_2' in geojson_sql
+
+
+@pytest.mark.parametrize('endpoint,expected_column', [
+    ('/api/polygon', None),
+    ('/api/polygon?tolerance=0.001', 'geom_simplified_2'),
+    ('/api/polygon?zoom=0', 'geom_simplified_3'),
+    ('/api/polygon?zoom=22', 'geom'),
+])
+def test_get_polygons_simplified(monkeypatch, endpoint, expected_column):
+    polygons = MockPolygons([])
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', polygons)
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert polygons.geom_column == expected_column
+
+
+@pytest.mark.parametrize('endpoint,expected_response', [
+    ('/api/polygon?tolerance=abc', {'error': 'incorrect tolerance'}),
+    ('/api/polygon?tolerance=-1', {'error': 'incorrect tolerance'}),
+    ('/api/polygon?tolerance=nan', {'error': 'incorrect tolerance'}),
+    ('/api/polygon?zoom=abc', {'error': 'incorrect zoom'}),
+    ('/api/polygon?zoom=23', {'error': 'incorrect zoom'}),
+    ('/api/polygon/1?zoom=-1', {'error': 'incorrect zoom'}),
+])
+def test_get_polygons_simplified_incorrect_args(monkeypatch, endpoint, expected_response):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([MockPolygon(id=1)]))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+def test_get_polygons_fields(monkeypatch):
+    polygons = MockPolygons([MockPolygon(id=1, name='first', geom=None), MockPolygon(id=2, name='second', geom=None)])
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', polygons)
+
+    response = get_json('/api/polygon?fields=polygon_id,name', {})
+    assert response.status_code == 200
+    assert response.json == {'polygons': [{'polygon_id': 1, 'name': 'first'}, {'polygon_id': 2, 'name': 'second'}]}
+    assert polygons.attributes == ('id', 'name')
+
+    response = get_json('/api/polygon?fields=name&limit=1', {})
+    assert response.status_code == 200
+    assert response.json['polygons'] == [{'name': 'first'}]
+    assert response.json['next']
+
+    monkeypatch.setitem(app.config, 'GEOJSON_FROM_DB', True)
+    response = get_json('/api/polygon/2?fields=class_id,name', {})
+    assert response.status_code == 200
+    assert response.json == {'class_id': None, 'name': 'second'}
+
+
+@pytest.mark.parametrize('endpoint', [
+    '/api/polygon?fields=',
+    '/api/polygon?fields=name,area',
+    '/api/polygon/1?fields=_edited',
+])
+def test_get_polygons_incorrect_fields(monkeypatch, endpoint):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([MockPolygon(id=1)]))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == {'error': 'incorrect fields'}
+
+
+def test_only_fields_sql():
+    """Колонки, не запрошенные в ?fields=, не попадают в SELECT."""
+
+    with app.app_context():
+        sql = str(GisPolygon.query.only_fields('id', 'name').statement.compile(dialect=postgresql.dialect()))
+
+    assert 'gis_polygon.name' in sql
+    assert 'gis_polygon.geom' not in sql
+    assert 'gis_polygon.props' not in sql
+
+
+def test_get_polygon_with_db_projection(monkeypatch):
+    """Геометрию, перепроецированную базой, схема отдаёт как есть и не изменяет модель."""
+
+    with app.app_context():
+        geom = from_shape(box(0, 0, 1, 1), srid=current_app.config['DEFAULT_SRID'])
+        polygon = MockPolygon(id=1, geom=geom)
+        polygon.projected_geom = from_shape(box(500000, 0, 500001, 1), srid=32644)
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', polygon)
+
+    response = get_json('/api/polygon/1?projection=epsg:32644', {})
+    assert response.status_code == 200
+    assert shape(response.json['geom']).equals(box(500000, 0, 500001, 1))
+    assert polygon.geom is geom
+
+
+def test_geojson_from_db_sql():
+    with app.app_context():
+        sql = str(GisPolygon.query.as_geojson(32644, 6).statement.compile(dialect=postgresql.dialect()))
+
+    assert 'ST_AsGeoJSON(ST_Transform(gis_polygon.geom' in sql
+    assert 'ST_AsEWKB' not in sql
+
+
+def test_get_polygons_geojson_from_db(monkeypatch):
+    """Текст ST_AsGeoJSON вставляется в ответ без повторной сериализации."""
+
+    geom_geojson = '{"type":"Polygon","coordinates":[[[0,0],[1,1],[1,0],[0,0]]]}'
+    polygons = []
+    for polygon_id in (1, 2):
+        polygon = MockPolygon(id=polygon_id, name='test')
+        polygon.geom_geojson = geom_geojson
+        polygons.append(polygon)
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons(polygons))
+    monkeypatch.setitem(app.config, 'GEOJSON_FROM_DB', True)
+
+    expected_polygon = {
+        'polygon_id': 1,
+        'class_id': None,
+        'geom': {
+            'type': 'Polygon',
+            'coordinates': [[[0, 0], [1, 1], [1, 0], [0, 0]]]
+        },
+        'props': None,
+        'name': 'test'
+    }
+
+    response = get_json('/api/polygon/1', {})
+    assert response.status_code == 200
+    assert geom_geojson in response.get_data(as_text=True)
+    assert response.json == expected_polygon
+
+    response = get_json('/api/polygon', {})
+    assert response.status_code == 200
+    assert response.json['polygons'][0] == expected_polygon
+    assert len(response.json['polygons']) == 2
+
+    response = get_json('/api/polygon?limit=1', {})
+    assert response.status_code == 200
+    assert response.json['polygons'] == [expected_polygon]
+    assert response.json['next']
+
+    response = get_json('/api/polygon', {'Accept': 'application/x-ndjson'})
+    feature = json.loads(response.get_data(as_text=True).split('\n')[0])
+    assert feature['geometry'] == expected_polygon['geom']
+    assert feature['properties'] == {'class_id': None, 'props': None, 'name': 'test'}
+
+
+def test_bulk_create_polygons(monkeypatch):
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon())
+
+    feature_collection = {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'geometry': POLYGON_FOR_TEST['geom'], 'properties': {'name': 'first'}},
+            {'type': 'Feature', 'geometry': {}, 'properties': {'name': 'invalid'}},
+            POLYGON_FOR_TEST,
+        ]
+    }
+    response = post_json('/api/polygon/bulk', feature_collection, {'Content-Type': 'application/json'})
+    assert response.status_code == 200
+    assert response.json == {'ids': [100, None, 101], 'errors': {'1': {'geom': ['Not a valid polygon.']}}}
+
+
+def test_bulk_create_polygons_ignores_polygon_id(monkeypatch):
+    """polygon_id существующего полигона не загружает и не изменяет его строку."""
+
+    inserted = []
+    polygon = MockPolygon(id=1)
+    monkeypatch.setattr(polygon, 'insert_many', lambda polygons, batch_size: inserted.extend(polygons) or [100, 101])
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', polygon)
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+
+    features = [
+        {'type': 'Feature', 'geometry': POLYGON_FOR_TEST['geom'], 'properties': {'polygon_id': 1, 'name': 'first'}},
+        dict(POLYGON_FOR_TEST, polygon_id=1),
+    ]
+    response = post_json('/api/polygon/bulk', features, {'Content-Type': 'application/json'})
+    assert response.status_code == 200
+    assert response.json == {'ids': [100, 101], 'errors': {}}
+    assert [polygon.id for polygon in inserted] == [None, None]
+    assert [polygon.name for polygon in inserted] == ['first', 'test polygon']
+
+
+@pytest.mark.parametrize('separator', ['', '\x1e'])
+def test_bulk_create_polygons_ndjson(monkeypatch, separator):
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon())
+
+    feature = {'type': 'Feature', 'geometry': POLYGON_FOR_TEST['geom'], 'properties': {'name': 'test'}}
+    data = ''.join(separator + json.dumps(feature) + '\n' for _ in range(3))
+    response = app.test_client().post(
+        '/api/polygon/bulk', headers={'Content-Type': 'application/x-ndjson'}, data=data
+    )
+    assert response.status_code == 200
+    assert response.json == {'ids': [100, 101, 102], 'errors': {}}
+
+
+@pytest.mark.parametrize('data, content_type', [
+    (
+        '{"type": "Feature"}', 'application/json'
+    ),
+    (
+        'test', 'application/json'
+    ),
+    (
+        '{"type": "Feature"}\ntest', 'application/x-ndjson'
+    ),
+])
+def test_bulk_create_polygons_incorrect_body(monkeypatch, data, content_type):
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon())
+
+    response = app.test_client().post('/api/polygon/bulk', headers={'Content-Type': content_type}, data=data)
+    assert response.status_code == 400
+    assert response.json == {'error': 'incorrect feature collection'}
+
+
+def test_get_tile(monkeypatch):
+    polygon = MockPolygon(id=1)
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', polygon)
+
+    for _ in range(2):
+        response = get_json('/api/tiles/1/1/0.mvt', {})
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.mapbox-vector-tile'
+        assert response.data == b'tile'
+
+    assert polygon.rendered_tiles == 1
+
+
+@pytest.mark.parametrize('endpoint', ['/api/tiles/1/2/0.mvt', '/api/tiles/1/0/2.mvt', '/api/tiles/23/0/0.mvt'])
+def test_get_tile_not_found(monkeypatch, endpoint):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon(id=1))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 404
+
+
+def test_edit_polygon_invalidates_tiles(monkeypatch):
+    with app.app_context():
+        geom = from_shape(box(10, 10, 11, 11), srid=current_app.config['DEFAULT_SRID'])
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon(id=1, geom=geom))
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+
+    for key in [(1, 0, 0), (1, 1, 0), (1, 1, 1)]:
+        tile_cache.set(key, b'tile')
+
+    # старая геометрия в северо-восточном тайле, новая (POLYGON_FOR_TEST) - тоже
+    response = put_json('/api/polygon/1', POLYGON_FOR_TEST, {'Content-Type': 'application/json'})
+    assert response.status_code == 200
+    assert tile_cache.get((1, 1, 0)) is None
+    assert tile_cache.get((1, 0, 0)) == b'tile'
+    assert tile_cache.get((1, 1, 1)) == b'tile'
+
+
+@pytest.mark.parametrize('endpoint', ['/api/polygon/1', '/api/polygon', '/api/polygon?limit=1'])
+def test_get_polygon_not_modified(monkeypatch, endpoint):
+    with app.app_context():
+        geom = from_shape(box(0, 0, 1, 1), srid=current_app.config['DEFAULT_SRID'])
+        polygon = MockPolygon(id=1, geom=geom, _edited=datetime(2019, 1, 8, 23, 32, 36, 76134))
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([polygon]))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] == 'Tue, 08 Jan 2019 23:32:36 GMT'
+    etag = response.headers['ETag']
+
+    response = get_json(endpoint, {'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert not response.data
+
+    response = get_json(endpoint, {'If-Modified-Since': 'Tue, 08 Jan 2019 23:32:36 GMT'})
+    assert response.status_code == 304
+
+    response = get_json(endpoint + ('&' if '?' in endpoint else '?') + 'projection=epsg:32644', {'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    polygon._edited = datetime(2019, 1, 9)
+    response_cache.clear()
+    response = get_json(endpoint, {'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('endpoint, headers', [
+    ('/api/polygon?limit=1&fields=polygon_id', {}),
+    ('/api/polygon?fields=polygon_id', {}),
+    ('/api/polygon?fields=polygon_id', {'Accept': 'application/x-ndjson'}),
+])
+def test_get_polygons_version_without_count(monkeypatch, endpoint, headers):
+    """Версия списка, страницы и потока не считает всю выборку; удаление меняет версию."""
+
+    polygons = MockPolygons([MockPolygon(id=1, _edited=datetime(2019, 1, 8)), MockPolygon(id=2)])
+    monkeypatch.setattr(polygons, 'version', None)
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', polygons)
+
+    response = get_json(endpoint, headers)
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] == 'Tue, 08 Jan 2019 00:00:00 GMT'
+    etag = response.headers['ETag']
+
+    monkeypatch.setattr('gis_polygon.api.GisPolygonDeleted', MockDeletedPolygons([(3, datetime(2019, 1, 9))]))
+    response_cache.clear()
+    response = get_json(endpoint, dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] == 'Wed, 09 Jan 2019 00:00:00 GMT'
+
+
+def test_get_polygons_etag_depends_on_representation(monkeypatch):
+    with app.app_context():
+        geom = from_shape(box(0, 0, 1, 1), srid=current_app.config['DEFAULT_SRID'])
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([MockPolygon(id=1, geom=geom)]))
+
+    response = get_json('/api/polygon', {})
+    assert 'Accept' in response.headers['Vary']
+    etag = response.headers['ETag']
+
+    response = get_json('/api/polygon', {'Accept': 'application/x-ndjson', 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'Accept' in response.headers['Vary']
+    assert response.headers['ETag'] != etag
+
+    response = get_json('/api/polygon', {'Accept': 'application/x-ndjson', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert 'Accept' in response.headers['Vary']
+
+
+class MockRedis:
+    """Локальная замена клиента Redis."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value, ex=None):
+        self.values[name] = value.encode()
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+    def flushdb(self):
+        self.values.clear()
+
+
+class CountingMockPolygon(MockPolygon):
+    """Считает загрузки полигона."""
+
+    loads = 0
+
+    def get_or_404(self, id):
+        self.loads += 1
+        return super().get_or_404(id)
+
+
+@pytest.mark.parametrize('backend', [None, RedisCacheBackend(MockRedis())])
+def test_get_polygon_cache(monkeypatch, backend):
+    if backend:
+        monkeypatch.setattr(response_cache, 'backend', backend)
+
+    with app.app_context():
+        geom = from_shape(box(0, 0, 1, 1), srid=current_app.config['DEFAULT_SRID'])
+        polygon = CountingMockPolygon(id=1, geom=geom, name='first', _edited=datetime(2019, 1, 8))
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', polygon)
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+
+    responses = [get_json('/api/polygon/1', {}) for _ in range(3)]
+    assert [response.json['name'] for response in responses] == ['first'] * 3
+    assert responses[2].headers['ETag'] == responses[0].headers['ETag']
+    assert polygon.loads == 1
+    assert response_cache.stats() == {'hits': 2, 'misses': 1, 'coalesced': 0}
+
+    response = get_json('/api/polygon/1', {'If-None-Match': responses[0].headers['ETag']})
+    assert response.status_code == 304
+
+    # кешируется отдельно для каждой проекции
+    get_json('/api/polygon/1?projection=EPSG:4326', {})
+    get_json('/api/polygon/1?projection=epsg:4326', {})
+    assert polygon.loads == 2
+
+    # изменение полигона сбрасывает кеш во всех проекциях
+    data = dict(POLYGON_FOR_TEST, name='second')
+    assert put_json('/api/polygon/1', data, {'Content-Type': 'application/json'}).status_code == 200
+    assert get_json('/api/polygon/1', {}).json['name'] == 'second'
+    get_json('/api/polygon/1?projection=epsg:4326', {})
+    # PUT тоже загружает полигон
+    assert polygon.loads == 5
+
+    response = get_json('/api/cache/stats', {})
+    assert response.json == {'hits': 4, 'misses': 4, 'coalesced': 0}
+
+
+def test_get_polygon_cache_not_found(monkeypatch):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon(id=1))
+
+    assert get_json('/api/polygon/2', {}).status_code == 404
+    assert get_json('/api/polygon/2', {}).status_code == 404
+    assert response_cache.stats()['misses'] == 2
+
+
+def test_response_cache_coalesces_misses():
+    """Одновременные промахи по одному ключу загружают данные один раз."""
+
+    cache = ResponseCache(MemoryCacheBackend(10), ttl=60)
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        return {'body': 'value'}
+
+    with ThreadPoolExecutor(4) as executor:
+        first = executor.submit(cache.get_or_load, 'key', loader)
+        started.wait(5)
+        others = [executor.submit(cache.get_or_load, 'key', loader) for _ in range(3)]
+        while cache.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [first.result()] + [future.result() for future in others]
+
+    assert results == [{'body': 'value'}] * 4
+    assert len(loads) == 1
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'coalesced': 3}
+
+
+@pytest.mark.parametrize('invalidate', [
+    lambda cache: cache.delete('key'),
+    lambda cache: cache.clear(),
+])
+def test_response_cache_discards_stale_load(invalidate):
+    """Загрузка, начатая до удаления ключа, не сохраняется, а новые промахи её не ждут."""
+
+    cache = ResponseCache(MemoryCacheBackend(10), ttl=60)
+    started, release = threading.Event(), threading.Event()
+
+    def stale_loader():
+        started.set()
+        release.wait(5)
+        return {'body': 'stale'}
+
+    with ThreadPoolExecutor(2) as executor:
+        stale = executor.submit(cache.get_or_load, 'key', stale_loader)
+        started.wait(5)
+        invalidate(cache)
+        fresh = executor.submit(cache.get_or_load, 'key', lambda: {'body': 'fresh'})
+        try:
+            assert fresh.result(5) == {'body': 'fresh'}
+        finally:
+            release.set()
+        assert stale.result() == {'body': 'stale'}
+
+    assert cache.get_or_load('key', lambda: {'body': 'reloaded'}) == {'body': 'fresh'}
+
+
+def test_memory_cache_backend_ttl_and_size(monkeypatch):
+    backend = MemoryCacheBackend(2)
+    backend.set('first', 1, ttl=60)
+    backend.set('second', 2, ttl=60)
+    backend.get('first')
+    backend.set('third', 3, ttl=60)
+    assert backend.get('second') is None
+    assert backend.get('first') == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr('gis_polygon.cache.time.monotonic', lambda: now + 61)
+    assert backend.get('first') is None
+
+
+def test_polygon_cache_key():
+    assert polygon_cache_key(1) == 'polygon:1:'
+    assert polygon_cache_key(1, 'EPSG:32644') == 'polygon:1:epsg:32644'
+
+
+@pytest.mark.parametrize('endpoint, expected_coordinates', [
+    ('/api/polygon/1', [[[0.123457, 0.0], [1.0, 1.0], [1.0, 0.0], [0.123457, 0.0]]]),
+    ('/api/polygon/1?precision=2', [[[0.12, 0.0], [1.0, 1.0], [1.0, 0.0], [0.12, 0.0]]]),
+    ('/api/polygon/1?precision=0', [[[0.0, 0.0], [1.0, 1.0], [1.0, 0.0], [0.0, 0.0]]]),
+])
+def test_get_polygon_precision(monkeypatch, endpoint, expected_coordinates):
+    with app.app_context():
+        geom = from_shape(Polygon([(0.123456789, 0), (1, 1), (1, 0)]), srid=current_app.config['DEFAULT_SRID'])
+        monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygon(id=1, geom=geom))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert response.json['geom']['coordinates'] == expected_coordinates
+
+
+@pytest.mark.parametrize('endpoint', [
+    '/api/polygon?precision=abc',
+    '/api/polygon?precision=-1',
+    '/api/polygon/1?precision=16',
+])
+def test_get_polygons_incorrect_precision(monkeypatch, endpoint):
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', MockPolygons([MockPolygon(id=1)]))
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == {'error': 'incorrect precision'}
+
+
+class MockBrotli:
+    """Мокает пакет brotli."""
+
+    @staticmethod
+    def compress(data, quality):
+        return b'br:' + data
+
+
+@pytest.fixture
+def many_polygons(monkeypatch):
+    with app.app_context():
+        geom = from_shape(box(0, 0, 1, 1), srid=current_app.config['DEFAULT_SRID'])
+    polygons = MockPolygons([MockPolygon(id=polygon_id, name='test', geom=geom) for polygon_id in range(1, 101)])
+    monkeypatch.setattr('gis_polygon.api.GisPolygon', polygons)
+
+
+@pytest.mark.parametrize('accept_encoding, brotli, expected_encoding', [
+    ('gzip', None, 'gzip'),
+    ('gzip, br', None, 'gzip'),
+    ('gzip, br', MockBrotli, 'br'),
+    ('br;q=0.5, gzip', MockBrotli, 'gzip'),
+    ('identity', MockBrotli, None),
+    (None, None, None),
+])
+def test_compressed_response(monkeypatch, many_polygons, accept_encoding, brotli, expected_encoding):
+    monkeypatch.setattr(compression, 'brotli', brotli)
+    plain = get_json('/api/polygon', {})
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+
+    response = get_json('/api/polygon', headers)
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == expected_encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    if expected_encoding == 'gzip':
+        assert gzip.decompress(response.get_data()) == plain.get_data()
+        assert len(response.get_data()) * 5 < len(plain.get_data())
+        assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+    elif expected_encoding == 'br':
+        assert response.get_data() == b'br:' + plain.get_data()
+    else:
+        assert response.get_data() == plain.get_data()
+
+
+def test_compressed_response_not_modified(monkeypatch, many_polygons):
+    response = get_json('/api/polygon', {'Accept-Encoding': 'gzip'})
+
+    response = get_json('/api/polygon', {'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_small_and_streamed_responses_not_compressed(monkeypatch, many_polygons):
+    response = get_json('/api/polygon/1', {'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+    response = get_json('/api/polygon?stream=1', {'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_server_timing(monkeypatch, many_polygons):
+    response = get_json('/api/polygon?projection=epsg:32644', {})
+    assert response.status_code == 200
+
+    timings = dict(item.split(';dur=') for item in response.headers['Server-Timing'].split(', '))
+    assert {'serialize', 'reproject', 'encode', 'total'} <= set(timings)
+    assert all(float(duration) >= 0 for duration in timings.values())
+
+    monkeypatch.setattr(metrics, 'server_timing', False)
+    response = get_json('/api/polygon', {})
+    assert 'Server-Timing' not in response.headers
+
+
+def test_db_timing():
+    engine = create_engine('sqlite://')
+    with app.test_request_context():
+        metrics.start()
+        engine.execute('select 1')
+        assert g.timings['db'] > 0
+
+
+def test_metrics(monkeypatch, many_polygons):
+    metrics.clear()
+    get_json('/api/polygon', {'Accept-Encoding': 'gzip'})
+    get_json('/api/polygon/1', {})
+    get_json('/api/polygon/1000', {})
+
+    response = get_json('/metrics', {})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert '# TYPE gis_polygon_request_duration_seconds histogram' in lines
+    assert 'gis_polygon_request_duration_seconds_count{method="GET",endpoint="/api/polygon",status="200"} 1' in lines
+    assert 'gis_polygon_request_duration_seconds_count' \
+           '{method="GET",endpoint="/api/polygon/<int:polygon_id>",status="404"} 1' in lines
+    assert 'gis_polygon_request_rows_bucket{endpoint="/api/polygon",le="100.0"} 1' in lines
+    assert 'gis_polygon_request_rows_bucket{endpoint="/api/polygon",le="10.0"} 0' in lines
+    assert 'gis_polygon_request_rows_sum{endpoint="/api/polygon/<int:polygon_id>"} 1' in lines
+    assert 'gis_polygon_request_phase_seconds_count{endpoint="/api/polygon",phase="compress"} 1' in lines
+    assert 'gis_polygon_response_size_bytes_count{endpoint="/api/polygon"} 1' in lines
+    assert not any('endpoint="/metrics"' in line for line in lines)
+
+
+def test_change_cursor():
+    edited = datetime(2026, 10, 18, 12, 0, 0, 123456)
+    assert decode_change_cursor(encode_change_cursor(edited, CHANGE_DELETED, 5)) == (edited, CHANGE_DELETED, 5)
+    edited = datetime(2026, 10, 18)
+    assert decode_change_cursor(encode_change_cursor(edited, CHANGE_EDITED, 1))[0] == edited
+
+    for cursor in ('abc', encode_cursor(1)):
+        with pytest.raises(ValueError):
+            decode_change_cursor(cursor)
+
+
+def test_polygon_changes(mock_polygons, monkeypatch):
+    with app.app_context():
+        geom = from_shape(box(0, 0, 1, 1), srid=current_app.config['DEFAULT_SRID'])
+    # отбор по курсору и порядок (_edited, id) выполняет база данных: моки отдают изменения уже отобранными
+    polygons = mock_polygons([
+        MockPolygon(id=1, name='first', geom=geom, _edited=datetime(2026, 1, 1)),
+        MockPolygon(id=3, name='third', geom=geom, _edited=datetime(2026, 1, 2)),
+        MockPolygon(id=2, name='second', geom=geom, _edited=datetime(2026, 1, 3)),
+    ])
+    deleted = MockDeletedPolygons([(5, datetime(2026, 1, 2))])
+    monkeypatch.setattr('gis_polygon.api.GisPolygonDeleted', deleted)
+
+    started = datetime.now()
+    response = get_json('/api/polygon/changes?limit=2&fields=polygon_id', {})
+    assert response.status_code == 200
+    assert response.json['polygons'] == [{'polygon_id': 1}, {'polygon_id': 3}]
+    assert response.json['deleted'] == []
+    assert response.json['has_more'] is True
+    # изменение и удаление с одним временем упорядочены по типу: изменение раньше
+    assert decode_change_cursor(response.json['next']) == (datetime(2026, 1, 2), CHANGE_EDITED, 3)
+
+    # изменения моложе CHANGES_DELAY не запрашиваются
+    [(_, cursor, until)] = polygons.calls
+    assert cursor is None
+    assert started - timedelta(seconds=app.config['CHANGES_DELAY']) <= until <= datetime.now()
+    assert deleted.calls == polygons.calls
+
+    polygons.polygons = polygons.polygons[2:]
+    response = get_json('/api/polygon/changes?limit=2&fields=polygon_id&since=' + response.json['next'], {})
+    assert response.status_code == 200
+    assert response.json['polygons'] == [{'polygon_id': 2}]
+    assert response.json['deleted'] == [{'polygon_id': 5, 'deleted': '2026-01-02T00:00:00'}]
+    assert response.json['has_more'] is False
+    assert polygons.calls[-1][1] == (datetime(2026, 1, 2), CHANGE_EDITED, 3)
+    assert deleted.calls[-1][1] == (datetime(2026, 1, 2), CHANGE_EDITED, 3)
+
+    # без изменений курсор не сдвигается
+    since = response.json['next']
+    polygons.polygons, deleted.deleted = [], []
+    response = get_json('/api/polygon/changes?since=' + since, {})
+    assert response.json == {'polygons': [], 'deleted': [], 'next': since, 'has_more': False}
+
+
+@pytest.mark.parametrize('endpoint, expected_response', [
+    ('/api/polygon/changes?since=abc', {'error': 'incorrect cursor'}),
+    ('/api/polygon/changes?since=' + encode_change_cursor(datetime(2026, 1, 1), 7, 1), {'error': 'incorrect cursor'}),
+    ('/api/polygon/changes?limit=0', {'error': 'incorrect limit'}),
+])
+def test_polygon_changes_incorrect_args(mock_polygons, endpoint, expected_response):
+    mock_polygons([])
+
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+@pytest.mark.parametrize('kind, expected_edited, expected_deleted', [
+    (
+        CHANGE_EDITED,
+        '(gis_polygon._edited, gis_polygon.id) > ({0}, 5) AND gis_polygon._edited <= {1}',
+        'gis_polygon_deleted._deleted >= {0} AND gis_polygon_deleted._deleted <= {1}',
+    ),
+    (
+        CHANGE_DELETED,
+        'gis_polygon._edited > {0} AND gis_polygon._edited <= {1}',
+        '(gis_polygon_deleted._deleted, gis_polygon_deleted.polygon_id) > ({0}, 5) '
+        'AND gis_polygon_deleted._deleted <= {1}',
+    ),
+])
+def test_changed_after_sql(kind, expected_edited, expected_deleted):
+    """Изменения и удаления с одним временем упорядочены по виду: курсор одного вида не пропускает другой."""
+
+    cursor = (datetime(2026, 1, 1), kind, 5)
+    until = datetime(2026, 1, 2)
+    with app.app_context():
+        edited = GisPolygon.query.changed_after(cursor, until)
+        deleted = GisPolygonDeleted.query.changed_after(cursor, until)
+
+    assert compiled_sql(edited.whereclause) == expected_edited.format(repr(cursor[0]), repr(until))
+    assert compiled_sql(edited.statement._order_by_clause) == 'gis_polygon._edited, gis_polygon.id'
+    assert compiled_sql(deleted.whereclause) == expected_deleted.format(repr(cursor[0]), repr(until))
+    assert compiled_sql(deleted.statement._order_by_clause) == (
+        'gis_polygon_deleted._deleted, gis_polygon_deleted.polygon_id'
+    )
+
+
+def test_changed_after_sql_without_cursor():
+    with app.app_context():
+        assert GisPolygon.query.changed_after().whereclause is None
+        assert GisPolygonDeleted.query.changed_after().whereclause is None
+
+
+@pytest.fixture
+def measured_polygons(mock_polygons):
+    # порядок набора - порядок ?sort=-area в базе данных, у полигона 3 нет geom и площади
+    polygons = []
+    for polygon_id, area in ((2, 9e10), (1, 4e10), (3, None), (4, 1e10)):
+        polygon = MockPolygon(id=polygon_id, class_id=5)
+        polygon.area = area
+        polygon.vertex_count = 5 if area else None
+        polygons.append(polygon)
+    return mock_polygons(polygons)
+
+
+@pytest.mark.parametrize('endpoint, expected_calls', [
+    ('/api/polygon?sort=-area', [('sorted_segments', 'area', True, None)]),
+    ('/api/polygon?sort=vertex_count', [('sorted_segments', 'vertex_count', False, None)]),
+    ('/api/polygon?class_id=5&sort=-area', [('of_class', 5), ('sorted_segments', 'area', True, None)]),
+    ('/api/polygon?min_area=2e10', [('area_between', 2e10, None)]),
+    ('/api/polygon?max_area=1e10&min_area=0', [('area_between', 0.0, 1e10)]),
+    ('/api/polygon?centroid_bbox=0,0,25,5', [('centroid_in_bbox', [0.0, 0.0, 25.0, 5.0], 4326)]),
+    (
+        '/api/polygon?centroid_bbox=0,0,25,5&projection=epsg:32644',
+        [('centroid_in_bbox', [0.0, 0.0, 25.0, 5.0], 32644)]
+    ),
+])
+def test_get_polygons_derived_filters(measured_polygons, endpoint, expected_calls):
+    response = get_json(endpoint + '&fields=polygon_id', {})
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == [2, 1, 3, 4]
+    assert measured_polygons.calls == expected_calls
+
+
+@pytest.mark.parametrize('limit, expected_ids, expected_cursor', [
+    (2, [2, 1], (4e10, 1)),
+    # страница закончилась на полигоне без площади: курсор с NULL продолжает выдачу
+    (3, [2, 1, 3], (None, 3)),
+])
+def test_get_polygons_sorted_pages(measured_polygons, limit, expected_ids, expected_cursor):
+    endpoint = '/api/polygon?sort=-area&fields=polygon_id&limit={0}'.format(limit)
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == expected_ids
+    assert decode_sort_cursor(response.json['next']) == expected_cursor
+
+    response = get_json(endpoint + '&after=' + response.json['next'], {})
+    assert response.status_code == 200
+    assert measured_polygons.calls == [
+        ('sorted_segments', 'area', True, None),
+        ('sorted_segments', 'area', True, expected_cursor),
+    ]
+
+
+@pytest.mark.parametrize('sort, cursor, limit, expected_ids, expected_cursor', [
+    # значения по возрастанию закончились: страница дополняется полигонами без площади
+    ('area', (5, 9), 4, [2, 1, 4, 3], None),
+    # полигоны без площади по убыванию закончились: страница дополняется значениями
+    ('-area', (None, 9), 2, [3, 2], (9e10, 2)),
+])
+def test_get_polygons_sorted_next_segment(measured_polygons, sort, cursor, limit, expected_ids, expected_cursor):
+    endpoint = '/api/polygon?sort={0}&fields=polygon_id&limit={1}&after={2}'.format(
+        sort, limit, encode_sort_cursor(*cursor)
+    )
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == expected_ids
+    assert (decode_sort_cursor(response.json['next']) if response.json['next'] else None) == expected_cursor
+
+
+def test_get_polygons_sorted_last_page(measured_polygons):
+    response = get_json('/api/polygon?sort=-area&fields=polygon_id&limit=4', {})
+    assert response.status_code == 200
+    assert response.json['next'] is None
+
+
+@pytest.mark.parametrize('endpoint, expected_response', [
+    ('/api/polygon?sort=name', {'error': 'incorrect sort'}),
+    ('/api/polygon?sort=-', {'error': 'incorrect sort'}),
+    ('/api/polygon?sort=area&after=' + encode_cursor(1), {'error': 'incorrect cursor'}),
+    ('/api/polygon?class_id=abc', {'error': 'incorrect class_id'}),
+    ('/api/polygon?min_area=-1', {'error': 'incorrect area'}),
+    ('/api/polygon?max_area=abc', {'error': 'incorrect area'}),
+    ('/api/polygon?centroid_bbox=1,1,0,0', {'error': 'incorrect centroid_bbox'}),
+])
+def test_get_polygons_derived_filters_incorrect_args(measured_polygons, endpoint, expected_response):
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+def test_derived_filters_sql():
+    with app.app_context():
+        where = GisPolygon.query.of_class(5).area_between(min_area=10, max_area=20).whereclause
+        max_where = GisPolygon.query.area_between(max_area=20).whereclause
+
+    assert compiled_sql(where) == 'gis_polygon.class_id = 5 AND gis_polygon.area >= 10 AND gis_polygon.area <= 20'
+    assert compiled_sql(max_where) == 'gis_polygon.area <= 20'
+
+
+@pytest.mark.parametrize('srid, expected_envelope', [
+    (4326, 'ST_MakeEnvelope(0, 0, 1, 1, 4326)'),
+    (32644, 'ST_Transform(ST_MakeEnvelope(0, 0, 1, 1, 32644), 4326)'),
+])
+def test_centroid_in_bbox_sql(srid, expected_envelope):
+    """bbox в другой проекции переводится в проекцию колонки centroid, а не наоборот (работает индекс)."""
+
+    with app.app_context():
+        where = GisPolygon.query.centroid_in_bbox((0, 0, 1, 1), srid).whereclause
+
+    assert compiled_sql(where) == 'ST_Intersects(gis_polygon.centroid, {0})'.format(expected_envelope)
+
+
+@pytest.mark.parametrize('value', [100.5, 3, None])
+def test_sort_cursor(value):
+    assert decode_sort_cursor(encode_sort_cursor(value, 7)) == (value, 7)
+
+
+@pytest.mark.parametrize('descending, cursor, expected_where, expected_order', [
+    (
+        False, None,
+        None,
+        'gis_polygon.area ASC NULLS LAST, gis_polygon.id',
+    ),
+    (
+        False, (100.5, 3),
+        '(gis_polygon.area, gis_polygon.id) > (100.5, 3)',
+        'gis_polygon.area ASC NULLS LAST, gis_polygon.id',
+    ),
+    (
+        True, (100.5, 3),
+        '(gis_polygon.area, gis_polygon.id) < (100.5, 3)',
+        'gis_polygon.area DESC NULLS FIRST, gis_polygon.id DESC',
+    ),
+    (
+        False, (None, 3),
+        'gis_polygon.area IS NULL AND gis_polygon.id > 3',
+        'gis_polygon.area ASC NULLS LAST, gis_polygon.id',
+    ),
+    (
+        True, (None, 3),
+        'gis_polygon.area IS NULL AND gis_polygon.id < 3',
+        'gis_polygon.area DESC NULLS FIRST, gis_polygon.id DESC',
+    ),
+])
+def test_sorted_after_sql(descending, cursor, expected_where, expected_order):
+    """Сегмент курсора задаётся одним условием по индексу: NULL больше любого значения."""
+
+    with app.app_context():
+        query = GisPolygon.query.sorted_after('area', descending, cursor)
+
+    assert (compiled_sql(query.whereclause) if query.whereclause is not None else None) == expected_where
+    assert compiled_sql(query.statement._order_by_clause) == expected_order
+
+
+@pytest.mark.parametrize('descending, cursor, expected_where', [
+    (False, None, []),
+    (False, (100.5, 3), ['gis_polygon.area IS NULL']),
+    (True, (100.5, 3), []),
+    (False, (None, 3), []),
+    (True, (None, 3), ['gis_polygon.area IS NOT NULL']),
+])
+def test_sorted_segments_sql(descending, cursor, expected_where):
+    """За сегментом курсора следует другой сегмент целиком, если он идёт в выдаче позже."""
+
+    with app.app_context():
+        query, *segments = GisPolygon.query.sorted_segments('area', descending, cursor)
+        expected_query = GisPolygon.query.sorted_after('area', descending, cursor)
+
+    assert compiled_sql(query.statement) == compiled_sql(expected_query.statement)
+    assert [compiled_sql(segment.whereclause) for segment in segments] == expected_where
+
+
+@pytest.fixture
+def located_polygons(mock_polygons, monkeypatch):
+    with app.app_context():
+        srid = current_app.config['DEFAULT_SRID']
+    monkeypatch.setattr(polygon_locator, 'refresh_interval', 0)
+    return mock_polygons([
+        MockPolygon(id=1, geom=from_shape(box(0, 0, 10, 10), srid=srid), _edited=datetime(2026, 1, 1)),
+        MockPolygon(id=2, geom=from_shape(box(5, 5, 15, 15), srid=srid), _edited=datetime(2026, 1, 2)),
+    ])
+
+
+@pytest.mark.parametrize('data, content_type, expected_ids', [
+    ([[1, 1], [7, 7], [12, 12], [20, 20]], 'application/json', [[1], [1, 2], [2], []]),
+    ([{'type': 'Point', 'coordinates': [7, 7]}, [10, 1]], 'application/json', [[1, 2], [1]]),
+    ([], 'application/json', []),
+    ('[1, 1]\n\n{"type": "Point", "coordinates": [12, 12]}\n', 'application/x-ndjson', [[1], [2]]),
+])
+def test_locate_points(located_polygons, data, content_type, expected_ids):
+    with app.test_client() as client:
+        response = client.post(
+            '/api/polygon/locate', data=data if isinstance(data, str) else json.dumps(data), content_type=content_type
+        )
+    assert response.status_code == 200
+    assert response.json == {'polygon_ids': expected_ids}
+
+
+def test_locate_points_with_projection(located_polygons):
+    point = get_transformer('epsg:4326', 'epsg:32644').transform(7, 7)
+    with app.test_client() as client:
+        response = client.post('/api/polygon/locate?projection=epsg:32644', json=[list(point)])
+    assert response.status_code == 200
+    assert response.json == {'polygon_ids': [[1, 2]]}
+
+
+def test_locate_index_refresh(located_polygons):
+    with app.test_client() as client:
+        assert client.post('/api/polygon/locate', json=[[20, 20]]).json == {'polygon_ids': [[]]}
+
+        located_polygons.polygons.append(MockPolygon(
+            id=3, geom=from_shape(box(18, 18, 22, 22), srid=4326), _edited=datetime(2026, 1, 3)
+        ))
+        assert client.post('/api/polygon/locate', json=[[20, 20]]).json == {'polygon_ids': [[3]]}
+
+
+@pytest.mark.parametrize('data, endpoint, expected_response', [
+    ({'type': 'Point', 'coordinates': [1, 1]}, '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[1, 1], [1]], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[1, 'a']], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[1, '2']], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[1, True]], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[1, None]], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[[1, 1]]], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([{'type': 'LineString', 'coordinates': [[1, 1], [2, 2]]}], '/api/polygon/locate', {'error': 'incorrect points'}),
+    ([[1, 1]], '/api/polygon/locate?projection=epsg:1', {'error': 'incorrect projection'}),
+])
+def test_locate_points_incorrect_args(located_polygons, data, endpoint, expected_response):
+    with app.test_client() as client:
+        response = client.post(endpoint, json=data)
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+def test_locate_points_with_snapshot(located_polygons, monkeypatch, tmpdir):
+    path = str(tmpdir.join('polygons.idx'))
+    polygons = [(1, box(0, 0, 10, 10)), (4, box(30, 30, 31, 31))]
+    PackedPolygonIndex.build(polygons, (datetime(2026, 1, 1), None)).save(path)
+    monkeypatch.setattr(polygon_locator, 'snapshot_path', path)
+    monkeypatch.setattr('gis_polygon.api.GisPolygonDeleted', MockDeletedPolygons([(4, datetime(2026, 1, 5))]))
+
+    # полигон 2 изменён после снимка, полигон 4 удалён
+    with app.test_client() as client:
+        response = client.post('/api/polygon/locate', json=[[7, 7], [30.5, 30.5]])
+    assert response.status_code == 200
+    assert response.json == {'polygon_ids': [[1, 2], []]}
+
+
+def test_locate_too_many_points(located_polygons, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOCATE_MAX_POINTS', 2)
+    with app.test_client() as client:
+        response = client.post('/api/polygon/locate', json=[[1, 1]] * 3)
+    assert response.status_code == 400
+    assert response.json == {'error': 'too many points'}
+
+
+@pytest.fixture
+def nearest_polygons(mock_polygons):
+    with app.app_context():
+        srid = current_app.config['DEFAULT_SRID']
+    # порядок набора - порядок geography <-> в базе данных, расстояния в метрах
+    polygons = mock_polygons([
+        MockPolygon(id=2, name='inside', class_id=2, geom=from_shape(box(0, 0, 1, 1), srid=srid)),
+        MockPolygon(id=3, name='near', class_id=1, geom=from_shape(box(3, 0, 4, 1), srid=srid)),
+        MockPolygon(id=1, name='far', class_id=1, geom=from_shape(box(10, 0, 11, 1), srid=srid)),
+    ])
+    for polygon, distance in zip(polygons.polygons, (0.0, 278298.1, 1057535.4)):
+        polygon.distance = distance
+        polygon.geom_geojson = json.dumps({'type': 'Point', 'coordinates': [polygon.id, 0]})
+    return polygons
+
+
+@pytest.mark.parametrize('endpoint, expected, expected_calls', [
+    ('/api/polygon/nearest?point=0.5,0.5&fields=polygon_id', [(2, 0.0)], [(4326, 1)]),
+    (
+        '/api/polygon/nearest?point=0.5,0.5&k=2&fields=polygon_id,name',
+        [(2, 0.0), (3, 278298.1)],
+        [(4326, 2)]
+    ),
+    (
+        '/api/polygon/nearest?point=0.5,0.5&k=5&class_id=1&fields=polygon_id',
+        [(2, 0.0), (3, 278298.1), (1, 1057535.4)],
+        [('of_class', 1), (4326, 5)]
+    ),
+])
+def test_nearest_polygons(nearest_polygons, endpoint, expected, expected_calls):
+    response = get_json(endpoint, {})
+    assert response.status_code == 200
+    assert [(polygon['polygon_id'], polygon['distance']) for polygon in response.json['polygons']] == expected
+
+    *filters, (method, point, srid, limit) = nearest_polygons.calls
+    assert method == 'nearest'
+    assert (point.x, point.y) == (0.5, 0.5)
+    assert filters + [(srid, limit)] == expected_calls
+
+
+def test_nearest_polygons_with_projection(nearest_polygons):
+    x, y = get_transformer('epsg:4326', 'epsg:32644').transform(80, 50)
+    response = get_json('/api/polygon/nearest?point={0},{1}&projection=epsg:32644&fields=polygon_id'.format(x, y), {})
+    assert response.status_code == 200
+
+    [(_, point, srid, _)] = nearest_polygons.calls
+    assert (point.x, point.y, srid) == (x, y, 32644)
+
+
+def test_nearest_polygons_raw_geometry(nearest_polygons, monkeypatch):
+    monkeypatch.setitem(app.config, 'GEOJSON_FROM_DB', True)
+    response = get_json('/api/polygon/nearest?point=0.5,0.5&fields=polygon_id,geom', {})
+    assert response.status_code == 200
+    assert response.json == {
+        'polygons': [{'polygon_id': 2, 'distance': 0.0, 'geom': {'type': 'Point', 'coordinates': [2, 0]}}]
+    }
+
+
+@pytest.mark.parametrize('endpoint, expected_response', [
+    ('/api/polygon/nearest', {'error': 'incorrect point'}),
+    ('/api/polygon/nearest?point=1', {'error': 'incorrect point'}),
+    ('/api/polygon/nearest?point=1,nan', {'error': 'incorrect point'}),
+    ('/api/polygon/nearest?point=1,200', {'error': 'incorrect point'}),
+    ('/api/polygon/nearest?point=-180.5,0', {'error': 'incorrect point'}),
+    ('/api/polygon/nearest?point=1e9,0&projection=epsg:32644', {'error': 'incorrect point'}),
+    ('/api/polygon/nearest?point=1,1&k=0', {'error': 'incorrect k'}),
+    ('/api/polygon/nearest?point=1,1&k=abc', {'error': 'incorrect k'}),
+    ('/api/polygon/nearest?point=1,1&class_id=abc', {'error': 'incorrect class_id'}),
+    ('/api/polygon/nearest?point=1,1&projection=epsg:1', {'error': 'incorrect projection'}),
+])
+def test_nearest_polygons_incorrect_args(nearest_polygons, endpoint, expected_response):
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+def test_nearest_sql():
+    """Порядок - KNN-оператор <-> над geography (метры, индекс geography(geom)), без отбора кандидатов в градусах."""
+
+    with app.app_context():
+        query = GisPolygon.query.of_class(5).nearest(Point(1, 2), 32644, 3)
+        sql = compiled_sql(query.statement)
+
+    distance = "geography(gis_polygon.geom) <-> geography(ST_Transform(ST_GeomFromWKB('\\x{0}', 32644), 4326))".format(
+        Point(1, 2).wkb.hex()
+    )
+    assert compiled_sql(query.statement._order_by_clause) == distance
+    assert compiled_sql(query.whereclause) == 'gis_polygon.class_id = 5'
+    # то же выражение загружается в distance
+    assert sql.count(distance) == 2
+    assert sql.endswith('LIMIT 3')
+
+
+@pytest.fixture
+def polygons_with_props(mock_polygons):
+    return mock_polygons([
+        MockPolygon(id=1, class_id=1, props={'region': 'north', 'level': 5, 'tags': ['forest', 'lake']}),
+        MockPolygon(id=2, class_id=2, props={'region': 'north', 'level': '5', 'address': {'city': 'Moscow'}}),
+    ])
+
+
+@pytest.mark.parametrize('endpoint, expected_calls', [
+    ('/api/polygon?props.region=north', [('with_props', {'region': 'north'})]),
+    ('/api/polygon?props.region=north&class_id=1', [('of_class', 1), ('with_props', {'region': 'north'})]),
+    # значения ?props.key= сравниваются как строки
+    ('/api/polygon?props.level=5', [('with_props', {'level': '5'})]),
+    ('/api/polygon?props.address.city=Moscow', [('with_props', {'address': {'city': 'Moscow'}})]),
+    (
+        '/api/polygon?props.region=north&props.level=5',
+        [('with_props', {'region': 'north'}), ('with_props', {'level': '5'})]
+    ),
+    ('/api/polygon?props_contains={"level": 5}', [('with_props', {'level': 5})]),
+    ('/api/polygon?props_contains={"tags": ["forest"]}', [('with_props', {'tags': ['forest']})]),
+    (
+        '/api/polygon?props_contains={"tags": ["lake"]}&props.region=north',
+        [('with_props', {'region': 'north'}), ('with_props', {'tags': ['lake']})]
+    ),
+    ('/api/polygon?props_contains={}', [('with_props', {})]),
+])
+def test_get_polygons_props_filters(polygons_with_props, endpoint, expected_calls):
+    response = get_json(endpoint + '&fields=polygon_id', {})
+    assert response.status_code == 200
+    assert [polygon['polygon_id'] for polygon in response.json['polygons']] == [1, 2]
+    assert polygons_with_props.calls == expected_calls
+
+
+@pytest.mark.parametrize('endpoint, expected_response', [
+    ('/api/polygon?props.=north', {'error': 'incorrect props'}),
+    ('/api/polygon?props.address..city=Moscow', {'error': 'incorrect props'}),
+    ('/api/polygon?props_contains=abc', {'error': 'incorrect props_contains'}),
+    ('/api/polygon?props_contains=["north"]', {'error': 'incorrect props_contains'}),
+])
+def test_get_polygons_props_filters_incorrect_args(polygons_with_props, endpoint, expected_response):
+    response = get_json(endpoint, {})
+    assert response.status_code == 400
+    assert response.json == expected_response
+
+
+def test_props_filters_sql():
+    """Каждый документ - отдельное условие props @> document, которое обслуживает GIN-индекс."""
+
+    with app.app_context():
+        where = GisPolygon.query.with_props({'region': 'north'}).with_props({'tags': ['lake']}).whereclause
+
+    assert compiled_sql(where) == "gis_polygon.props @> {'region': 'north'} AND gis_polygon.props @> {'tags': ['lake']}"
+
+
+@pytest.fixture
+def patched_polygons(mock_polygons, monkeypatch):
+    with app.app_context():
+        srid = current_app.config['DEFAULT_SRID']
+    polygons = mock_polygons([
+        MockPolygon(id=1, name='first', geom=from_shape(box(10, 10, 11, 11), srid=srid), props={'a': 1}),
+        MockPolygon(id=2, name='second', geom=from_shape(box(-11, 10, -10, 11), srid=srid)),
+    ])
+    monkeypatch.setattr('gis_polygon.api.db', MockDb())
+    for key in [(1, 0, 0), (1, 1, 0)]:
+        tile_cache.set(key, b'tile')
+    return polygons
+
+
+def test_patch_polygon_props(patched_polygons):
+    """Изменение свойств не трогает геометрию и тайлы."""
+
+    geom = patched_polygons.polygons[0].geom
+    response = patch_json('/api/polygon/1', {'props': {'b': 2}}, {'Content-Type': 'application/json'})
+    assert response.status_code == 200
+
+    [(polygon_id, values)] = patched_polygons.updates
+    assert polygon_id == 1
+    assert set(values) == {'props', '_edited'}
+    assert patched_polygons.polygons[0].props == {'b': 2}
+    assert patched_polygons.polygons[0].name == 'first'
+    assert patched_polygons.polygons[0].geom is geom
+    assert tile_cache.get((1, 1, 0)) == b'tile'
+
+
+def test_patch_polygon_geom(patched_polygons):
+    response = patch_json('/api/polygon/1', {'geom': POLYGON_FOR_TEST['geom']}, {'Content-Type': 'application/json'})
+    assert response.status_code == 200
+
+    [(_, values)] = patched_polygons.updates
+    assert set(values) == {'geom', '_edited'}
+    assert to_shape(patched_polygons.polygons[0].geom).equals_exact(shape(POLYGON_FOR_TEST['geom']), 1e-6)
+    assert tile_cache.get((1, 1, 0)) is None
+    assert tile_cache.get((1, 0, 0)) == b'tile'
+
+
+@pytest.mark.parametrize('polygon_id, data, expected_code, expected_response', [
+    (1, {'geom': {}}, 400, {'errors': {'geom': ['Not a valid polygon.']}}),
+    (1, {'class_id': 'test'}, 400, {'errors': {'class_id': ['Not a valid integer.']}}),
+    (1, {}, 400, {'errors': {'_schema': ['No fields to update.']}}),
+    (1, [], 400, {'errors': {'_schema': ['Invalid input type.']}}),
+    (101, {'name': 'test'}, 404, None),
+])
+def test_patch_polygon_errors(patched_polygons, polygon_id, data, expected_code, expected_response):
+    response = patch_json('/api/polygon/{0}'.format(polygon_id), data, {'Content-Type': 'application/json'})
+    assert response.status_code == expected_code
+    if expected_response is not None:
+        assert response.json == expected_response
+    assert not hasattr(patched_polygons, 'updates')
+
+
+def test_bulk_patch_polygons(patched_polygons):
+    data = [
+        {'polygon_id': 1, 'props': {'b': 2}},
+        {'polygon_id': 2, 'name': 'renamed'},
+        {'polygon_id': 1, 'name': 'renamed first'},
+        {'polygon_id': 2, 'geom': {}},
+        {'polygon_id': 101, 'name': 'test'},
+        {'name': 'test'},
+    ]
+    response = patch_json('/api/polygon/bulk', data, {'Content-Type': 'application/json'})
+    assert response.status_code == 200
+    assert response.json == {
+        'ids': [1, 2, 1, None, None, None],
+        'errors': {
+            '3': {'geom': ['Not a valid polygon.']},
+            '4': {'polygon_id': ['Polygon not found.']},
+            '5': {'polygon_id': ['Not a valid integer.']},
+        },
+    }
+
+    # изменения одного полигона объединяются
+    assert {polygon_id: set(values) for polygon_id, values in patched_polygons.updates} == {
+        1: {'props', 'name', '_edited'},
+        2: {'name', '_edited'},
+    }
+    first, second = patched_polygons.polygons
+    assert (first.name, first.props, second.name) == ('renamed first', {'b': 2}, 'renamed')
+    assert tile_cache.get((1, 0, 0)) is None
+    assert tile_cache.get((1, 1, 0)) is None
+
+
+@pytest.mark.parametrize('data', ['{"polygon_id": 1}', 'test'])
+def test_bulk_patch_polygons_incorrect_body(patched_polygons, data):
+    response = app.test_client().patch('/api/polygon/bulk', headers={'Content-Type': 'application/json'}, data=data)
+    assert response.status_code == 400
+    assert response.json == {'error': 'incorrect polygons'}
+
+
+def test_update_many_sql(monkeypatch):
+    """UPDATE перезаписывает только переданные колонки, полигоны с одинаковыми колонками - одним executemany."""
+
+    statements = []
+    with app.app_context():
+        monkeypatch.setattr(
+            'gis_polygon.models.db.session.execute',
+            lambda statement, rows: statements.append((
+                str(statement.compile(dialect=postgresql.dialect(), column_keys=list(rows[0]))), rows
+            ))
+        )
+        GisPolygon.update_many([
+            (1, {'props': {'a': 1}}),
+            (2, {'name': 'test'}),
+            (3, {'props': {'b': 2}}),
+            (4, {'geom': from_shape(box(0, 0, 1, 1), srid=4326), 'name': 'geom'}),
+        ])
+
+    assert [sql for sql, _ in statements] == [
+        'UPDATE gis_polygon SET props=%(props)s WHERE gis_polygon.id = %(_polygon_id)s',
+        'UPDATE gis_polygon SET name=%(name)s WHERE gis_polygon.id = %(_polygon_id)s',
+        'UPDATE gis_polygon SET name=%(name)s, geom=ST_GeomFromWKB(%(_geom)s, %(_geom_srid)s) '
+        'WHERE gis_polygon.id = %(_polygon_id)s',
+    ]
+    assert [len(rows) for _, rows in statements] == [2, 1, 1]
+    assert statements[2][1] == [{'name': 'geom', '_polygon_id': 4, '_geom': box(0, 0, 1, 1).wkb, '_geom_srid': 4326}]
+
+
+def test_insert_many_sql(monkeypatch):
+    """id полигонов берутся из последовательности до INSERT и вставляются явно, без RETURNING."""
+
+    statements = []
+
+    def execute(statement):
+        statements.append(statement.compile(dialect=postgresql.dialect()))
+        return iter([(8,), (7,)]) if len(statements) == 1 else None
+
+    with app.app_context():
+        monkeypatch.setattr('gis_polygon.models.db.session.execute', execute)
+        ids = GisPolygon.insert_many([GisPolygon(name='a'), GisPolygon(name='b')], 2)
+
+    select, insert = statements
+    assert ids == [8, 7]
+    assert compiled_sql(select.statement) == (
+        "SELECT nextval('gis_polygon_id_seq') AS next_value_1 \nFROM generate_series(1, 2)"
+    )
+    assert 'RETURNING' not in str(insert)
+    assert [insert.params['id_m0'], insert.params['name_m0'], insert.params['id_m1'], insert.params['name_m1']] == [
+        8, 'a', 7, 'b'
+    ]
+
+
+def test_bounds_sql(monkeypatch):
+    """bbox полигонов читается из производной колонки bbox без geom и без сортировки."""
+
+    statements = []
+
+    def execute(query):
+        statements.append(compiled_sql(query.statement))
+        return iter([(1, 0.0, 1.0, 2.0, 3.0), (2, None, None, None, None)])
+
+    monkeypatch.setattr(PolygonQuery, '__iter__', execute)
+    with app.app_context():
+        bounds = GisPolygon.query.by_ids([1, 2]).after().bounds()
+
+    assert statements == [
+        'SELECT gis_polygon.id, ST_XMin(gis_polygon.bbox) AS "ST_XMin_1", ST_YMin(gis_polygon.bbox) AS "ST_YMin_1", '
+        'ST_XMax(gis_polygon.bbox) AS "ST_XMax_1", ST_YMax(gis_polygon.bbox) AS "ST_YMax_1" \n'
+        'FROM gis_polygon \n'
+        'WHERE gis_polygon.id IN (1, 2)'
+    ]
+    # у полигона без geom bbox NULL
+    assert bounds == {1: (0.0, 1.0, 2.0, 3.0), 2: None}
@@ -0,0 +1,37 @@
+import random
+
+from gis_polygon.app import create_app
+from gis_polygon.benchmark import compare_results, make_polygon, run_benchmarks
+
+app = create_app(testing=True)
+
+
+def test_make_polygon():
+    rng = random.Random(1)
+    for vertices in (3, 64, 1000):
+        polygon = make_polygon(vertices, rng)
+        assert polygon.is_valid
+        assert len(polygon.exterior.coords) == vertices + 1
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(app, size=3, vertices=8, repeat=1, number=1)
+
+    assert results['meta']['size'] == 3
+    assert {'geom_field.serialize', 'schema.dump.projection', 'api.get_polygons', 'api.bulk_create'} <= set(
+        results['results']
+    )
+    assert all(result['median'] > 0 for result in results['results'].values())
+
+    results = run_benchmarks(app, size=3, vertices=8, repeat=1, number=1, names=['api.get_polygon.'])
+    assert list(results['results']) == ['api.get_polygon.projection']
+
+
+def test_compare_results():
+    baseline = {'results': {'fast': {'median': 1.0}, 'slow': {'median': 1.0}, 'removed': {'median': 1.0}}}
+    current = {'results': {'fast': {'median': 1.1}, 'slow': {'median': 1.5}, 'added': {'median': 1.0}}}
+
+    assert compare_results(baseline, current, 1.2) == [
+        ('fast', 1.0, 1.1, 1.1, False),
+        ('slow', 1.0, 1.5, 1.5, True),
+    ]
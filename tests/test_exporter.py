@@ -0,0 +1,56 @@
+import io
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from gis_polygon.exporter import build_query, get_filters, write_ndjson
+
+Row = namedtuple('Row', ('id', 'class_id', 'name', 'props', 'geom'))
+
+
+def compile_query(query):
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_write_ndjson():
+    file = io.StringIO()
+    rows = [
+        Row(1, 5, 'first', {'key': 'value'}, '{"type":"Polygon","coordinates":[[[0,0],[1,1],[1,0],[0,0]]]}'),
+        Row(2, None, None, None, None),
+    ]
+
+    assert write_ndjson(rows, file) == 2
+    features = [json.loads(line) for line in file.getvalue().splitlines()]
+    assert features == [
+        {
+            'type': 'Feature',
+            'id': 1,
+            'properties': {'class_id': 5, 'name': 'first', 'props': {'key': 'value'}},
+            'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1], [1, 0], [0, 0]]]},
+        },
+        {
+            'type': 'Feature',
+            'id': 2,
+            'properties': {'class_id': None, 'name': None, 'props': None},
+            'geometry': None,
+        },
+    ]
+
+
+def test_build_query_ndjson():
+    sql = compile_query(build_query('ndjson', 1, 100, 32644, 6, get_filters([1, 2], datetime(2019, 1, 1))))
+
+    assert 'ST_AsGeoJSON(ST_Transform(gis_polygon.geom' in sql
+    assert 'gis_polygon.id BETWEEN' in sql
+    assert 'gis_polygon.class_id IN' in sql
+    assert 'gis_polygon._edited >=' in sql
+
+
+def test_build_query_flatgeobuf():
+    sql = compile_query(build_query('flatgeobuf', 1, 100, 4326, 6, []))
+
+    assert sql.startswith('SELECT ST_AsFlatGeobuf(q,')
+    assert 'ST_Transform' not in sql
+    assert 'ST_AsEWKB' not in sql
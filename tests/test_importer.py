@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+
+import pytest
+from shapely import wkb
+
+from gis_polygon import importer
+from gis_polygon.importer import import_file, iter_features, prepare_batch
+
+POLYGON = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1], [1, 0], [0, 0]]]}
+
+
+def make_feature(name):
+    return {'type': 'Feature', 'geometry': POLYGON, 'properties': {'name': name, 'props': {'key': 'value'}}}
+
+
+class MockConnection:
+    """Мокает соединение psycopg2, запоминая данные COPY."""
+
+    def __init__(self):
+        self.rows = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def copy_expert(self, sql, file):
+        self.rows.extend(csv.reader(io.StringIO(file.read())))
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_iter_features_collection(monkeypatch):
+    """FeatureCollection читается по кускам, меньшим одной фичи."""
+
+    monkeypatch.setattr(importer, 'READ_SIZE', 7)
+    features = [make_feature('polygon {0}'.format(index)) for index in range(5)]
+    data = json.dumps({'type': 'FeatureCollection', 'name': 'test', 'features': features}, indent=2)
+
+    assert list(iter_features(io.StringIO(data), 'geojson')) == features
+
+
+def test_iter_features_ndjson():
+    data = '{0}\n\n\x1e{1}\nnot json\n'.format(json.dumps(make_feature('first')), json.dumps(make_feature('second')))
+
+    assert list(iter_features(io.StringIO(data), 'ndjson')) == [make_feature('first'), make_feature('second'), None]
+
+
+def test_iter_features_truncated_collection():
+    data = '{"type": "FeatureCollection", "features": [' + json.dumps(make_feature('first'))[:-5]
+
+    with pytest.raises(ValueError):
+        list(iter_features(io.StringIO(data), 'geojson'))
+
+
+def test_prepare_batch():
+    features = [
+        make_feature('valid'),
+        {'type': 'Feature', 'geometry': {}, 'properties': {}},
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [0, 0]}, 'properties': {}},
+        {'type': 'Feature', 'geometry': POLYGON, 'properties': {'class_id': 'text'}},
+        None,
+        {'geom': POLYGON, 'class_id': 2},
+    ]
+
+    rows, rejected = prepare_batch(features, 'epsg:4326')
+    assert rejected == 4
+    assert [row[:3] for row in rows] == [[None, 'valid', '{"key": "value"}'], [2, None, None]]
+    assert wkb.loads(rows[0][3], hex=True).equals(wkb.loads(rows[1][3], hex=True))
+
+
+def test_prepare_batch_reprojects():
+    feature = {'geom': {'type': 'Polygon', 'coordinates': [[[500000, 0], [500000, 1000], [501000, 0], [500000, 0]]]}}
+
+    rows, rejected = prepare_batch([feature], 'epsg:32644')
+    assert rejected == 0
+    assert wkb.loads(rows[0][3], hex=True).exterior.coords[0] == pytest.approx((81, 0))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_import_file(tmpdir, workers):
+    path = str(tmpdir.join('polygons.ndjson'))
+    with open(path, 'w') as file:
+        file.writelines(json.dumps(make_feature(str(index))) + '\n' for index in range(10))
+    checkpoint_path = path + '.checkpoint'
+
+    connection = MockConnection()
+    processed, rejected = import_file(connection, path, 'ndjson', 'epsg:4326', workers, 3, checkpoint_path, False)
+
+    assert (processed, rejected) == (10, 0)
+    assert connection.commits == 4
+    assert [row[3] for row in connection.rows] == [str(index) for index in range(10)]
+    assert not tmpdir.join('polygons.ndjson.checkpoint').exists()
+
+
+def test_import_file_resume(tmpdir):
+    path = str(tmpdir.join('polygons.ndjson'))
+    with open(path, 'w') as file:
+        file.writelines(json.dumps(make_feature(str(index))) + '\n' for index in range(10))
+    checkpoint_path = path + '.checkpoint'
+    importer.write_checkpoint(checkpoint_path, path, 6)
+
+    connection = MockConnection()
+    processed, rejected = import_file(connection, path, 'ndjson', 'epsg:4326', 1, 3, checkpoint_path, True)
+
+    assert processed == 10
+    assert [row[3] for row in connection.rows] == ['6', '7', '8', '9']
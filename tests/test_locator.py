@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+from datetime import datetime
+
+from shapely.geometry import box
+
+from gis_polygon.locator import PolygonIndex, PolygonLocator, SnapshotIndex
+from gis_polygon.snapshot import PackedPolygonIndex
+
+
+def test_polygon_index_locate():
+    index = PolygonIndex([10, 20], [box(0, 0, 2, 2), box(1, 1, 3, 3)])
+    x = np.array([0.5, 1.5, 2.5, 5, np.nan, 2])
+    y = np.array([0.5, 1.5, 2.5, 5, 1, 0])
+
+    assert len(index) == 2
+    assert index.locate(x, y) == [[10], [10, 20], [20], [], [], [10]]
+
+
+def test_polygon_index_mixed_sizes():
+    """Огромный полигон среди мелких не раздувает индекс и находится вместе с ними."""
+
+    small = [box(x, y, x + 0.01, y + 0.01) for x in range(10) for y in range(10)]
+    index = PolygonIndex(list(range(1, 101)) + [1000], small + [box(-1e6, -1e6, 1e6, 1e6)])
+    x = np.array([0.005, 9.005, 0.5, 1e5])
+    y = np.array([0.005, 9.005, 0.5, 1e5])
+
+    assert index.locate(x, y) == [[1, 1000], [100, 1000], [1000], [1000]]
+
+
+def test_polygon_index_empty():
+    index = PolygonIndex([], [])
+    assert index.locate(np.array([1.0]), np.array([1.0])) == [[]]
+
+
+def test_polygon_locator_rebuilds_on_version_change():
+    locator = PolygonLocator()
+    version = [1]
+    builds = []
+
+    def load_polygons():
+        builds.append(version[0])
+        return [(1, box(0, 0, 1, 1))]
+
+    index = locator.get_index(lambda: version[0], load_polygons, None)
+    assert locator.get_index(lambda: version[0], load_polygons, None) is index
+
+    version[0] = 2
+    assert locator.get_index(lambda: version[0], load_polygons, None) is not index
+    assert builds == [1, 2]
+
+
+def test_polygon_locator_refresh_interval():
+    locator = PolygonLocator(refresh_interval=60)
+    versions = []
+
+    def load_version():
+        versions.append(len(versions))
+        return len(versions)
+
+    index = locator.get_index(load_version, lambda: [], None)
+    assert locator.get_index(load_version, lambda: [], None) is index
+    assert versions == [0]
+
+
+def test_polygon_locator_uses_snapshot(tmpdir):
+    path = str(tmpdir.join('polygons.idx'))
+    PackedPolygonIndex.build([(1, box(0, 0, 1, 1)), (2, box(2, 0, 3, 1))], (datetime(2026, 1, 1), None)).save(path)
+    locator = PolygonLocator(snapshot_path=path)
+    changes = []
+
+    def load_changes(version):
+        changes.append(version)
+        # полигон 2 изменён после снимка, полигон 1 удалён, полигон 3 создан
+        return [(2, box(5, 0, 6, 1)), (3, box(0, 0, 1, 1))], [1]
+
+    def load_polygons():
+        raise AssertionError('table must not be read when a snapshot exists')
+
+    index = locator.get_index(lambda: 1, load_polygons, load_changes)
+    assert isinstance(index, SnapshotIndex)
+    assert index.locate(np.array([0.5, 2.5, 5.5]), np.array([0.5, 0.5, 0.5])) == [[3], [], [2]]
+    assert changes == [(datetime(2026, 1, 1), None)]
+
+    # новый снимок, записанный build-index, подхватывается при следующей проверке
+    PackedPolygonIndex.build([(4, box(0, 0, 1, 1))], (datetime(2026, 2, 1), None)).save(path)
+    os.utime(path, ns=(0, 0))
+    index = locator.get_index(lambda: 1, load_polygons, lambda version: ([], []))
+    assert index.locate(np.array([0.5]), np.array([0.5])) == [[4]]
+
+
+def test_polygon_locator_without_snapshot_file(tmpdir):
+    locator = PolygonLocator(snapshot_path=str(tmpdir.join('missing.idx')))
+    index = locator.get_index(lambda: 1, lambda: [(1, box(0, 0, 1, 1))], None)
+    assert isinstance(index, PolygonIndex)
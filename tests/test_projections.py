@@ -0,0 +1,40 @@
+import pytest
+from shapely.geometry import Point, Polygon
+
+from gis_polygon.projections import get_transformer, transform_geometries, transform_geometry
+
+POLYGON_WITH_HOLE = Polygon(
+    [(80, 50), (82, 50), (82, 52), (80, 52)],
+    [[(80.5, 50.5), (81.5, 50.5), (81.5, 51.5), (80.5, 51.5)]]
+)
+
+
+def test_transformer_is_cached():
+    assert get_transformer('epsg:4326', 'epsg:32644') is get_transformer('epsg:4326', 'epsg:32644')
+
+
+def test_transform_geometries_matches_single_transform():
+    """Пакетное перепроецирование совпадает с поштучным."""
+
+    polygons = [POLYGON_WITH_HOLE, Polygon([(81, 51), (81, 52), (82, 51)]), Polygon()]
+    transformed = transform_geometries(polygons, 'EPSG:4326', 'epsg:32644')
+
+    assert len(transformed) == len(polygons)
+    for polygon, result in zip(polygons, transformed):
+        assert result.equals(transform_geometry(polygon, 'epsg:4326', 'epsg:32644'))
+
+    assert len(transformed[0].interiors) == 1
+    assert transformed[2].is_empty
+
+
+def test_transform_geometry_round_trip():
+    projected = transform_geometry(POLYGON_WITH_HOLE, 'epsg:4326', 'epsg:32644')
+    assert projected.exterior.coords[0] == pytest.approx((428333.55, 5539109.82), abs=0.1)
+
+    restored = transform_geometry(projected, 'epsg:32644', 'epsg:4326')
+    assert restored.equals_exact(POLYGON_WITH_HOLE, 1e-9)
+
+
+def test_transform_non_polygon_geometry():
+    point = transform_geometry(Point(81, 50), 'epsg:4326', 'epsg:32644')
+    assert (point.x, point.y) == pytest.approx((500000.0, 5538630.7), abs=0.1)
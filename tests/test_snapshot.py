@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from shapely.geometry import MultiPolygon, Point, Polygon, box
+
+from gis_polygon import snapshot
+from gis_polygon.benchmark import make_polygons
+from gis_polygon.snapshot import PackedPolygonIndex, concat_ranges
+
+POLYGON_WITH_HOLE = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], [[(1, 1), (3, 1), (3, 3), (1, 3)]])
+
+
+def test_concat_ranges():
+    assert concat_ranges(np.array([5, 0, 2]), np.array([2, 0, 3])).tolist() == [5, 6, 2, 3, 4]
+
+
+@pytest.mark.parametrize('point, expected_ids', [
+    ((0.5, 0.5), [1]),
+    ((2, 2), []),  # в дырке
+    ((1, 2), [1]),  # на границе дырки
+    ((4, 4), [1]),  # в вершине
+    ((10.5, 0.5), [2]),
+    ((12.5, 0.5), [2]),
+    ((11.5, 0.5), []),
+    ((float('nan'), 0), []),
+])
+def test_packed_index_locate(tmpdir, point, expected_ids):
+    path = str(tmpdir.join('polygons.idx'))
+    PackedPolygonIndex.build([
+        (1, POLYGON_WITH_HOLE), (2, MultiPolygon([box(10, 0, 11, 1), box(12, 0, 13, 1)])), (3, Polygon()),
+    ]).save(path)
+    index = PackedPolygonIndex.load(path)
+
+    assert len(index) == 2
+    point_indexes, ids = index.locate_pairs(np.array([point[0]]), np.array([point[1]]))
+    assert sorted(ids.tolist()) == expected_ids
+    assert set(point_indexes.tolist()) <= {0}
+
+
+def test_packed_index_matches_shapely(tmpdir, monkeypatch):
+    # маленькие порции, чтобы проверить разбиение на части
+    monkeypatch.setattr(snapshot, 'POINTS_PER_CHUNK', 64)
+    monkeypatch.setattr(snapshot, 'EDGES_PER_CHUNK', 100)
+    polygons = make_polygons(200, 12)
+    path = str(tmpdir.join('polygons.idx'))
+    PackedPolygonIndex.build(enumerate(polygons, start=1), node_capacity=4).save(path)
+    index = PackedPolygonIndex.load(path)
+
+    # точки рядом с центрами полигонов, чтобы часть попала внутрь, часть - мимо
+    rng = np.random.default_rng(0)
+    centers = np.array([polygon.centroid.coords[0] for polygon in polygons] * 3)
+    x = centers[:, 0] + rng.uniform(-0.015, 0.015, len(centers))
+    y = centers[:, 1] + rng.uniform(-0.015, 0.015, len(centers))
+    point_indexes, ids = index.locate_pairs(x, y)
+    expected = {
+        (point_index, polygon_id)
+        for point_index, point in enumerate(map(Point, x, y))
+        for polygon_id, polygon in enumerate(polygons, start=1) if polygon.intersects(point)
+    }
+    assert expected
+    assert set(zip(point_indexes.tolist(), ids.tolist())) == expected
+
+
+def test_packed_index_empty(tmpdir):
+    path = str(tmpdir.join('polygons.idx'))
+    PackedPolygonIndex.build([]).save(path)
+    index = PackedPolygonIndex.load(path)
+
+    assert len(index) == 0
+    assert index.version == (None, None)
+    assert [array.tolist() for array in index.locate_pairs(np.array([1.0]), np.array([1.0]))] == [[], []]
+
+
+def test_packed_index_load_incorrect_file(tmpdir):
+    path = tmpdir.join('polygons.idx')
+    path.write_binary(b'not a snapshot')
+    with pytest.raises(ValueError):
+        PackedPolygonIndex.load(str(path))
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from gis_polygon.tiles import (
+    MERCATOR_MAX, TILE_ENTRY_OVERHEAD, TileCache, tile_bounds, tile_coordinates
+)
+
+
+def test_tile_bounds():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-MERCATOR_MAX, -MERCATOR_MAX, MERCATOR_MAX, MERCATOR_MAX))
+    assert tile_bounds(1, 1, 0) == pytest.approx((0, 0, MERCATOR_MAX, MERCATOR_MAX))
+
+
+def test_tile_coordinates():
+    assert tile_coordinates(0, 0, 1) == pytest.approx((1, 1))
+    assert tile_coordinates(-180, 90, 3) == pytest.approx((0, 0))
+
+
+def test_tile_cache_evicts_least_recently_used():
+    cache = TileCache(max_size=2 * TILE_ENTRY_OVERHEAD + 10)
+    cache.set((0, 0, 0), b'1234')
+    cache.set((1, 0, 0), b'1234')
+    assert cache.get((0, 0, 0)) == b'1234'
+
+    cache.set((1, 1, 0), b'1234')
+    assert cache.get((1, 0, 0)) is None
+    assert cache.get((0, 0, 0)) == b'1234'
+    assert len(cache) == 2
+
+    cache.set((2, 0, 0), b'1' * (TILE_ENTRY_OVERHEAD + 11))
+    assert cache.get((2, 0, 0)) is None
+
+
+def test_tile_cache_counts_empty_tiles():
+    cache = TileCache(max_size=3 * TILE_ENTRY_OVERHEAD)
+    for x in range(10):
+        cache.set((4, x, 0), b'')
+    assert len(cache) == 3
+    assert cache.get((4, 9, 0)) == b''
+    assert cache.get((4, 0, 0)) is None
+
+
+def test_tile_cache_ttl(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr('gis_polygon.tiles.time.monotonic', lambda: now)
+    cache = TileCache(max_size=10 * TILE_ENTRY_OVERHEAD, ttl=60)
+    cache.set((0, 0, 0), b'tile')
+
+    now += 59
+    assert cache.get((0, 0, 0)) == b'tile'
+    now += 1
+    assert cache.get((0, 0, 0)) is None
+    assert len(cache) == 0
+
+
+def test_tile_cache_invalidate():
+    cache = TileCache(max_size=10 * TILE_ENTRY_OVERHEAD, buffer=64 / 4096)
+    for key in [(0, 0, 0), (1, 0, 0), (1, 1, 0), (1, 0, 1), (1, 1, 1), (2, 2, 1)]:
+        cache.set(key, b'tile')
+
+    # восточное полушарие, севернее экватора
+    cache.invalidate((10, 10, 20, 20))
+    assert cache.get((0, 0, 0)) is None
+    assert cache.get((1, 1, 0)) is None
+    assert cache.get((2, 2, 1)) is None
+    assert cache.get((1, 0, 0)) == b'tile'
+    assert cache.get((1, 0, 1)) == b'tile'
+    assert cache.get((1, 1, 1)) == b'tile'
+
+    # полигон у границы тайлов попадает в буфер соседнего тайла
+    cache.invalidate((0.1, -10, 1, -5))
+    assert cache.get((1, 0, 1)) is None
+    assert cache.get((1, 1, 1)) is None
+    assert cache.get((1, 0, 0)) == b'tile'
+
+
+@pytest.mark.parametrize('z', [4, 10])
+def test_tile_cache_invalidate_many(z):
+    """Далёкие друг от друга полигоны не сбрасывают тайлы между ними."""
+
+    # на зуме 4 диапазон bbox - один тайл (ключи удаляются напрямую), на зуме 10 - больше кеша (просмотр кеша)
+    def key(lon, lat):
+        x, y = tile_coordinates(lon, lat, z)
+        return z, int(x), int(y)
+
+    cache = TileCache(max_size=10 * TILE_ENTRY_OVERHEAD)
+    for lon, lat in ((-178.5, 80.5), (178.5, -80.5), (0.5, 0.5), (-0.5, -0.5)):
+        cache.set(key(lon, lat), b'tile')
+
+    cache.invalidate((-179, 80, -178, 81), (178, -81, 179, -80))
+    assert cache.get(key(-178.5, 80.5)) is None
+    assert cache.get(key(178.5, -80.5)) is None
+    assert cache.get(key(0.5, 0.5)) == b'tile'
+    assert cache.get(key(-0.5, -0.5)) == b'tile'